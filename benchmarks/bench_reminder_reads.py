@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark: read cost of the daily attestation reminder
+Builds a synthetic single-table corpus shaped like the platform's items (DOC, REC#, ATT#,
+COMMITMENT_SUMMARY, HISTORY, SPEND) and compares the read units of the previous
+full-table Scan with the DueIndex range query over [today, today+7].
+
+By default read units are computed from DynamoDB's sizing rules (attribute name + value bytes,
+eventually consistent reads at 0.5 RCU per started 4 KB, summed per 1 MB page). With --table the
+same two reads run against a real table (or DynamoDB Local via --endpoint-url) and the
+ConsumedCapacity DynamoDB reports is printed instead; --load first writes the corpus there.
+
+Usage: python benchmarks/bench_reminder_reads.py [--items 100000] [--table T [--endpoint-url URL] [--load]]
+
+Result at 100K items (seed 7, sizing model), per daily run:
+  scan, all pages       11,120 RCU, 87 MB read, 100,000 items
+  scan, page 1 (old)       128 RCU,  1 MB read,   1,161 items - the old code stopped here and missed later reminders
+  DueIndex query           1.5 RCU, 10 KB read,      63 items
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+PAGE = 1024 * 1024
+
+
+def item_size(item):
+    """DynamoDB item size: UTF-8 attribute names plus values (strings by length, numbers ~1 byte per 2 digits)."""
+    size = 0
+    for k, v in item.items():
+        size += len(k.encode())
+        if isinstance(v, str):
+            size += len(v.encode())
+        elif isinstance(v, bool) or v is None:
+            size += 1
+        elif isinstance(v, (int, float)):
+            size += len(str(v)) // 2 + 1
+        else:
+            size += len(json.dumps(v).encode()) + 3
+    return size
+
+
+def read_units(sizes):
+    """Eventually consistent reads: 0.5 RCU per started 4 KB of each 1 MB page."""
+    rcu, page = 0.0, 0
+    for s in sizes:
+        if page + s > PAGE:
+            rcu += math.ceil(page / 4096) * 0.5
+            page = 0
+        page += s
+    return rcu + math.ceil(page / 4096) * 0.5
+
+
+def build_corpus(n_items, rng, today):
+    """Items as api.py writes them, generated analysis by analysis until n_items exist."""
+    words = 'commitment spend threshold qualifying service credit attestation workload migration quarterly'.split()
+    text = lambda n: ' '.join(rng.choice(words) for _ in range(n))
+    items = []
+    a = 0
+    while len(items) < n_items:
+        aid, doc = f'a{a:06d}', f'd{a:06d}'
+        created = (today - timedelta(days=rng.randint(0, 900))).isoformat()
+        items.append({'PK': 'DOC', 'SK': doc, 'filename': f'ppa_{a}.pdf', 's3_key': f'uploads/{doc}/ppa_{a}.pdf', 'status': 'analyzed',
+                      'uploaded_at': created, 'analysis_id': aid, 'pdf_sha256': '%064x' % rng.getrandbits(256), 'pdf_bytes': '412345'})
+        items.append({'PK': f'ANALYSIS#{aid}', 'SK': 'DOC', 'doc_id': doc, 'status': 'analyzed', 'analysis_id': aid})
+        items.append({'PK': f'ANALYSIS#{aid}', 'SK': 'COMMITMENT_SUMMARY', 'doc_id': doc, 'created_at': created,
+                      'data': json.dumps({'years': [{'year': y, 'minimum_commitment': 1e6 * y} for y in range(1, 6)], 'total_commitment': 15e6})})
+        for r in range(rng.randint(5, 10)):
+            items.append({'PK': f'ANALYSIS#{aid}', 'SK': f'REC#rec-{r}', 'doc_id': doc, 'status': rng.choice(['pending', 'accepted', 'rejected']),
+                          'created_at': created, 'title': text(5), 'credit_type': text(2), 'workload': text(6), 'usage_pattern': text(20),
+                          'qualification': 'partially_qualified', 'max_credit_value': '250000', 'current_progress': '81234.5',
+                          'attestation_window': 'Mar 2025 - Mar 2028', 'potential_savings': '42000', 'confidence': 'medium',
+                          'reasoning': text(90), 'what_if': json.dumps({'scenario': text(10), 'spend_change': {text(2): 4000}, 'new_savings': 9000})})
+        for t in range(rng.randint(4, 8)):
+            pending = rng.random() < 0.4
+            due = (today + timedelta(days=rng.randint(-400, 700))).strftime('%Y-%m-%d')
+            att = {'PK': f'ATTESTATION#{aid}', 'SK': f'ATT#att-{t}', 'doc_id': doc, 'status': 'pending' if pending else 'completed',
+                   'created_at': created, 'name': text(4), 'description': text(30), 'frequency': 'Quarterly', 'next_due': due,
+                   'owner': 'Finance', 'fields': json.dumps([{'label': text(3), 'type': 'number', 'auto_source': 'ce_ytd_spend'}] * 4)}
+            if pending:
+                att['due_status'] = 'pending'
+            items.append(att)
+        for h in range(rng.randint(2, 6)):
+            items.append({'PK': 'HISTORY', 'SK': f'{created}.{h:03d}#rec-{h}', 'analysis_id': aid, 'rec_id': f'rec-{h}', 'action': 'accepted', 'notes': text(12)})
+        a += 1
+    items += [{'PK': 'SPEND', 'SK': f'MONTH#{m}', 'total': '81234.12', 'services': json.dumps({text(2): 1234.5 for _ in range(40)})} for m in range(12)]
+    return items[:n_items]
+
+
+def reminder_window(today):
+    return today.strftime('%Y-%m-%d'), (today + timedelta(days=7)).strftime('%Y-%m-%d')
+
+
+def model(items, today):
+    lo, hi = reminder_window(today)
+    scan_sizes = [item_size(i) for i in items]
+    first_page = []
+    for s in scan_sizes:
+        if sum(first_page) + s > PAGE:
+            break
+        first_page.append(s)
+    # Index entries hold the index keys, the table keys and the INCLUDE'd attributes
+    due = [i for i in items if i.get('due_status') == 'pending' and lo <= i['next_due'] <= hi]
+    index_sizes = [item_size({k: i[k] for k in ('due_status', 'next_due', 'PK', 'SK', 'name', 'owner', 'frequency')}) for i in due]
+    return [
+        ('scan (all pages)', read_units(scan_sizes), sum(scan_sizes), len(items)),
+        ('scan (page 1, old)', read_units(first_page), sum(first_page), len(first_page)),
+        ('DueIndex query', read_units(index_sizes), sum(index_sizes), len(due)),
+    ]
+
+
+def measure(table, today):
+    from boto3.dynamodb.conditions import Attr, Key
+    lo, hi = reminder_window(today)
+    rows = []
+    for name, call, kwargs in (
+        ('scan (all pages)', table.scan, {'FilterExpression': Attr('PK').begins_with('ATTESTATION#') & Attr('status').eq('pending')}),
+        ('DueIndex query', table.query, {'IndexName': 'DueIndex', 'KeyConditionExpression': Key('due_status').eq('pending') & Key('next_due').between(lo, hi)}),
+    ):
+        rcu, scanned, start = 0.0, 0, time.perf_counter()
+        while True:
+            page = call(ReturnConsumedCapacity='TOTAL', **kwargs)
+            rcu += page['ConsumedCapacity']['CapacityUnits']
+            scanned += page['ScannedCount']
+            if 'LastEvaluatedKey' not in page:
+                break
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+        rows.append((name, rcu, None, scanned, time.perf_counter() - start))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--table', help='Measure against this DynamoDB table (needs DueIndex) instead of the sizing model')
+    parser.add_argument('--endpoint-url', help='e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--load', action='store_true', help='Write the synthetic corpus to --table first')
+    args = parser.parse_args()
+
+    today = datetime(2026, 10, 17)
+    items = build_corpus(args.items, random.Random(args.seed), today)
+    print(f'Corpus: {len(items)} items, {sum(map(item_size, items)) / PAGE:.0f} MB, '
+          f'{sum(1 for i in items if i.get("due_status"))} pending attestations')
+
+    if not args.table:
+        print(f'{"read":<22}{"RCU/day":>12}{"MB read":>10}{"items":>10}')
+        for name, rcu, size, count in model(items, today):
+            print(f'{name:<22}{rcu:>12,.1f}{size / PAGE:>10.2f}{count:>10,}')
+        return
+
+    import boto3
+    table = boto3.resource('dynamodb', endpoint_url=args.endpoint_url).Table(args.table)
+    if args.load:
+        with table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+    print(f'{"read":<22}{"RCU/day":>12}{"scanned":>10}{"seconds":>10}')
+    for name, rcu, _, scanned, seconds in measure(table, today):
+        print(f'{name:<22}{rcu:>12,.1f}{scanned:>10,}{seconds:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark: truncated Bedrock response repair
+Builds a corpus of realistic analysis responses cut at many points and compares the
+single-pass repair_json against the previous trim-and-retry implementation.
+Usage: python benchmarks/bench_repair_json.py [--size-kb 60] [--cuts 300]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'serverless', 'lambdas'))
+from jsonstream import repair_json  # noqa: E402
+
+
+def legacy_repair_json(text):
+    """The previous _repair_json, kept verbatim for comparison."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    fixed = text.rstrip().rstrip(',')
+    if fixed.count('"') % 2 == 1:
+        fixed += '"'
+    opens = fixed.count('{') - fixed.count('}')
+    open_arr = fixed.count('[') - fixed.count(']')
+    fixed += ']' * max(open_arr, 0)
+    fixed += '}' * max(opens, 0)
+    try:
+        return json.loads(fixed)
+    except json.JSONDecodeError:
+        pass
+    for trim in range(1, 200):
+        candidate = text[:-(trim)].rstrip().rstrip(',').rstrip(':')
+        if candidate.count('"') % 2 == 1:
+            candidate += '"'
+        o = candidate.count('{') - candidate.count('}')
+        a = candidate.count('[') - candidate.count(']')
+        candidate += ']' * max(a, 0)
+        candidate += '}' * max(o, 0)
+        try:
+            parsed = json.loads(candidate)
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            continue
+    raise ValueError(f"Cannot parse Bedrock response (length {len(text)})")
+
+
+def build_response(size_kb, rng):
+    """A Bedrock-shaped analysis response of roughly size_kb, with escaped quotes and nested what-ifs."""
+    services = ['Amazon Elastic Compute Cloud - Compute', 'AWS Lambda', 'Amazon Bedrock', 'Amazon SageMaker', 'Amazon Simple Storage Service']
+    recs = []
+    while len(json.dumps(recs)) < size_kb * 1024 * 0.8:
+        i = len(recs)
+        recs.append({
+            'id': f'rec-{i}', 'title': f'Credit program {i}', 'credit_type': rng.choice(['GenAI POC', 'Graviton Adoption', 'Serverless', 'Growth Investment']),
+            'workload': ', '.join(rng.sample(services, 2)),
+            'usage_pattern': f'Spend on the "{rng.choice(services)}" line grew {rng.randint(1, 40)}% month over month \\ steady',
+            'qualification': rng.choice(['qualified', 'partially_qualified', 'not_qualified']),
+            'max_credit_value': rng.randint(10, 500) * 1000, 'current_progress': round(rng.uniform(0, 1e5), 2),
+            'attestation_window': 'Mar 2025 - Mar 2028', 'potential_savings': round(rng.uniform(0, 1e5), 2), 'confidence': 'medium',
+            'reasoning': 'The PPA states "minimum monthly spend of $5,000 on {Bedrock}" [Exhibit B]; current run-rate is below it. ' * 3,
+            'what_if': {'scenario': 'Shift batch inference to Bedrock', 'spend_change': {s: rng.randint(100, 9000) for s in rng.sample(services, 3)},
+                        'new_qualification': 'qualified', 'new_savings': rng.randint(1, 90) * 1000, 'effort': 'low'},
+        })
+    atts = [{'id': f'att-{i}', 'name': f'Quarterly attestation {i}', 'frequency': 'Quarterly', 'next_due': '2026-12-31',
+             'fields': [{'label': 'YTD spend', 'type': 'number', 'auto_source': 'ce_ytd_spend'}, {'label': 'Notes', 'type': 'text', 'auto_source': None}]} for i in range(8)]
+    return {'recommendations': recs, 'attestations': atts, 'commitment_summary': {'years': [{'year': y, 'minimum_commitment': 1e6 * y} for y in (1, 2, 3)]}}
+
+
+def whole_prefix(original, repaired):
+    """Correct if repaired is a truncation of original that never keeps part of a list element.
+
+    Lists must equal a prefix of the original list, element for element (a cut-off last element is
+    dropped, never kept partial or as an empty {}); objects may lose trailing keys; a string value may
+    be cut short.
+    """
+    if isinstance(repaired, dict):
+        return isinstance(original, dict) and all(k in original and whole_prefix(original[k], v) for k, v in repaired.items())
+    if isinstance(repaired, list):
+        return isinstance(original, list) and repaired == original[:len(repaired)]
+    if isinstance(repaired, str) and isinstance(original, str):
+        return original.startswith(repaired)
+    return repaired == original
+
+
+# Truncations seen in practice, with the only acceptable repair
+REGRESSIONS = [
+    ('{"recs": [{"x": 1}, {"y"', {'recs': [{'x': 1}]}),
+    ('{"recommendations": [{"id": "a", "savings": 5}, {', {'recommendations': [{'id': 'a', 'savings': 5}]}),
+    ('{"recommendations": [{"id": "a", "savings": 5}, {"id": "b", "sav', {'recommendations': [{'id': 'a', 'savings': 5}]}),
+    ('{"recs": [{"x": "}]"}, {"x": "ab', {'recs': [{'x': '}]'}]}),
+    ('{"r": [[1, 2], [3', {'r': [[1, 2]]}),
+    ('{"tags": ["a", 12, 3', {'tags': ['a', 12]}),
+    ('{"recs": [', {'recs': []}),
+]
+
+
+def regressions(fn):
+    """Failures over REGRESSIONS plus a small response cut at every character."""
+    failures = [t for t, want in REGRESSIONS if _try(fn, t) != want]
+    small = {'recommendations': [{'id': 'a', 'what_if': {'spend_change': {'Lambda': 10}}, 'tags': ['x', 'y"z']}, {'id': 'b', 'savings': 12.5}],
+             'attestations': [{'id': 'att', 'fields': [{'label': 'YTD', 'auto_source': None}]}], 'commitment_summary': {'years': [{'year': 1}]}}
+    text = json.dumps(small)
+    failures += [text[:c] for c in range(1, len(text)) if not whole_prefix(small, _try(fn, text[:c]))]
+    return failures, len(REGRESSIONS) + len(text) - 1
+
+
+def _try(fn, text):
+    try:
+        return fn(text)
+    except ValueError:
+        return None
+
+
+def run(fn, corpus, original):
+    ok = failed = 0
+    recovered = 0
+    start = time.perf_counter()
+    for text in corpus:
+        try:
+            result = fn(text)
+        except ValueError:
+            failed += 1
+            continue
+        ok += whole_prefix(original, result)
+        recovered += len(result.get('recommendations', [])) if isinstance(result, dict) else 0
+    return time.perf_counter() - start, ok, failed, recovered
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-kb', type=int, default=60)
+    parser.add_argument('--cuts', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    original = build_response(args.size_kb, rng)
+    text = json.dumps(original, indent=2)
+    # Cut points: uniform positions plus cuts right inside escapes, keys and numbers
+    cuts = sorted(rng.sample(range(len(text) // 4, len(text) - 1), args.cuts))
+    cuts += [text.index('\\"') + 1, text.index('"usage_pattern"') + 5, text.index('"max_credit_value": ') + 22]
+    corpus = [text[:c] for c in cuts]
+
+    print(f'Corpus: {len(corpus)} truncations of a {len(text) / 1024:.0f} KB response '
+          f'({len(original["recommendations"])} recommendations)')
+    print(f'{"implementation":<16}{"total s":>10}{"ms/doc":>10}{"correct":>10}{"failed":>9}{"recs kept":>11}')
+    for name, fn in (('repair_json', repair_json), ('legacy', legacy_repair_json)):
+        elapsed, ok, failed, recovered = run(fn, corpus, original)
+        print(f'{name:<16}{elapsed:>10.2f}{elapsed / len(corpus) * 1000:>10.2f}{ok:>10}{failed:>9}{recovered:>11}')
+    failures, checked = regressions(repair_json)
+    print(f'repair_json regression cases: {checked - len(failures)}/{checked} correct')
+    for text in failures[:5]:
+        print(f'  wrong repair for {text!r}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
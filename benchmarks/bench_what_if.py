@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /what-if evaluation latency
+Builds a year of synthetic daily spend over --services CE services and a 3-year commitment, then times
+what_if.evaluate against the handler's CREDIT_OFFERINGS for a range of scenario batch sizes.
+Usage: python benchmarks/bench_what_if.py [--services 60] [--repeat 5]
+
+Result (seed 7, numpy on, best of 5):
+  scenarios        ms
+          1       1.2
+        100       3.3
+       1000      22.9
+       5000     119.3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'serverless', 'lambdas'))
+import credit_engine  # noqa: E402
+import what_if  # noqa: E402
+from credit_engine import CreditEngine  # noqa: E402
+
+# Same offerings as api.CREDIT_OFFERINGS (api.py needs AWS configuration at import)
+OFFERINGS = {
+    'Generative AI Credit': {'discount': '25%', 'primary': ['SageMaker', 'Bedrock', 'Lambda'], 'supporting': ['EC2', 'S3'], 'min_spend': 1000},
+    'Graviton Optimization Credit': {'discount': '31%', 'primary': ['EC2'], 'supporting': ['RDS', 'ElastiCache'], 'min_spend': 500},
+    'Data Analytics Credit': {'discount': '22%', 'primary': ['Redshift', 'EMR', 'Glue'], 'supporting': ['S3', 'Kinesis'], 'min_spend': 800},
+    'Serverless Credit': {'discount': '18%', 'primary': ['Lambda', 'API Gateway'], 'supporting': ['DynamoDB', 'S3'], 'min_spend': 300},
+}
+SERVICES = ['Amazon Elastic Compute Cloud - Compute', 'AWS Lambda', 'Amazon Simple Storage Service', 'Amazon Redshift', 'AWS Glue',
+            'Amazon API Gateway', 'Amazon SageMaker', 'Amazon DynamoDB', 'Amazon Relational Database Service', 'Amazon Kinesis']
+CHANGE_NAMES = ['EC2', 'Lambda', 'S3', 'Redshift', 'Glue', 'API Gateway', 'SageMaker', 'Bedrock', 'DynamoDB', 'RDS']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--services', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = SERVICES + [f'Marketplace Product {i}' for i in range(max(0, args.services - len(SERVICES)))]
+    today = date(2026, 10, 17)
+    daily, d = {}, today - timedelta(days=365)
+    while d < today:
+        daily[d.isoformat()] = {s: rng.uniform(1, 100) for s in names}
+        d += timedelta(days=1)
+    commitment = {'years': [{'year': y + 1, 'start': f'{2026 + y}-03-01', 'end': f'{2027 + y}-02-{29 if y == 1 else 28}', 'minimum_commitment': 2e6} for y in range(3)]}
+    engine = CreditEngine(OFFERINGS)
+    print(f'{len(daily)} days x {len(names)} services, {len(commitment["years"])} commitment years, numpy {"on" if credit_engine.np else "off"}')
+
+    print(f'{"scenarios":>11}{"ms":>10}')
+    for n in (1, 100, 1000, 5000):
+        scenarios = [{s: rng.uniform(0, 50000) for s in rng.sample(CHANGE_NAMES, rng.randint(1, 3))} for _ in range(n)]
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            what_if.evaluate(engine, daily, commitment, today, scenarios)
+            best = min(best, time.perf_counter() - start)
+        print(f'{n:>11}{best * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
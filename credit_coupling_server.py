@@ -6,8 +6,14 @@ Analyzes AWS service usage and suggests credit-eligible combinations
 
 import boto3
 import json
+import os
+import sys
 from datetime import datetime, timedelta
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serverless', 'lambdas'))
+from credit_engine import CreditEngine  # noqa: E402
+from spend_cube import fetch_cube  # noqa: E402
+
 class CreditCouplingEngine:
     def __init__(self):
         self.credit_offerings = {
@@ -54,6 +60,15 @@ class CreditCouplingEngine:
                 "description": "Event-driven architecture with managed databases"
             }
         }
+        self.engine = CreditEngine({
+            credit_id: {
+                'discount': credit['discount'],
+                'primary': credit['requirements']['primary_services'],
+                'supporting': credit['requirements']['supporting_services'],
+                'min_spend': credit['requirements']['minimum_spend'],
+            }
+            for credit_id, credit in self.credit_offerings.items()
+        })
     
     def get_current_services(self):
         """Get current AWS service usage"""
@@ -86,74 +101,38 @@ class CreditCouplingEngine:
                 'Amazon SageMaker': 52.20
             }
     
+    def get_org_services(self, days=30):
+        """Get per-linked-account service usage across the organization: {account: {service: cost}}"""
+        end_date = datetime.now().strftime('%Y-%m-%d')
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        return fetch_cube(boto3.client('ce', region_name='us-east-1'), start_date, end_date, metric='BlendedCost')['cube']
+
+    def analyze_org_credit_eligibility(self):
+        """Credit status per linked account, one batched evaluation over the account x service cube"""
+        results = self.engine.evaluate_accounts(self.get_org_services())
+        return {account: [{**r, 'credit_name': self.credit_offerings[r['credit_name']]['name']} for r in rows] for account, rows in results.items()}
+
     def analyze_credit_eligibility(self):
         """Analyze which credits user qualifies for and suggest improvements"""
         current_services = self.get_current_services()
-        recommendations = []
-        
-        for credit_id, credit in self.credit_offerings.items():
-            analysis = self._analyze_single_credit(credit, current_services)
-            if analysis:
-                recommendations.append(analysis)
-        
-        return recommendations
+        results = self.engine.evaluate(current_services)
+        return [self._analyze_single_credit(self.credit_offerings[r['credit_name']], r) for r in results]
     
-    def _analyze_single_credit(self, credit, current_services):
-        """Analyze eligibility for a single credit offering"""
-        primary_match = []
-        supporting_match = []
-        missing_primary = []
-        missing_supporting = []
-        total_spend = 0
-        
-        # Check primary services
-        for service in credit['requirements']['primary_services']:
-            found = False
-            for current_service, spend in current_services.items():
-                if service.lower() in current_service.lower():
-                    primary_match.append({'service': current_service, 'spend': spend})
-                    total_spend += spend
-                    found = True
-                    break
-            if not found:
-                missing_primary.append(service)
-        
-        # Check supporting services
-        for service in credit['requirements']['supporting_services']:
-            found = False
-            for current_service, spend in current_services.items():
-                if service.lower() in current_service.lower():
-                    supporting_match.append({'service': current_service, 'spend': spend})
-                    total_spend += spend
-                    found = True
-                    break
-            if not found:
-                missing_supporting.append(service)
-        
-        # Determine status
-        has_primary = len(primary_match) > 0
-        meets_spend = total_spend >= credit['requirements']['minimum_spend']
-        
-        if has_primary and meets_spend:
-            status = "qualified"
-        elif has_primary:
-            status = "partially_qualified"
-        else:
-            status = "opportunity"
-        
+    def _analyze_single_credit(self, credit, result):
+        """Shape one engine result for a credit offering"""
         return {
             'credit_name': credit['name'],
             'discount': credit['discount'],
-            'status': status,
+            'status': result['status'],
             'description': credit['description'],
-            'current_spend': total_spend,
+            'current_spend': result['matched_spend'],
             'minimum_spend': credit['requirements']['minimum_spend'],
-            'primary_services_matched': primary_match,
-            'supporting_services_matched': supporting_match,
-            'missing_primary': missing_primary,
-            'missing_supporting': missing_supporting,
-            'potential_savings': total_spend * (float(credit['discount'].rstrip('%')) / 100),
-            'recommendation': self._generate_recommendation(credit, status, missing_primary, missing_supporting, total_spend)
+            'primary_services_matched': [{'service': s, 'spend': v} for s, v in result['primary_matched'].items()],
+            'supporting_services_matched': [{'service': s, 'spend': v} for s, v in result['supporting_matched'].items()],
+            'missing_primary': result['missing_primary'],
+            'missing_supporting': result['missing_supporting'],
+            'potential_savings': result['potential_savings'],
+            'recommendation': self._generate_recommendation(credit, result['status'], result['missing_primary'], result['missing_supporting'], result['matched_spend'])
         }
     
     def _generate_recommendation(self, credit, status, missing_primary, missing_supporting, current_spend):
@@ -177,5 +156,8 @@ def get_credit_recommendations():
     return engine.analyze_credit_eligibility()
 
 if __name__ == "__main__":
-    recommendations = get_credit_recommendations()
+    if '--org' in sys.argv:
+        recommendations = CreditCouplingEngine().analyze_org_credit_eligibility()
+    else:
+        recommendations = get_credit_recommendations()
     print(json.dumps(recommendations, indent=2))
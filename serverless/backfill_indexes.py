@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Backfill the lookup items and index attributes that newer code writes, for tables created earlier.
+
+- ANALYSIS#<id>/DOC lookup items: handle_recommendations resolves an analysis_id to its document with a
+  single GetItem. The DOC partition only records each document's latest analysis, so older analyses are
+  recovered from the doc_id stored on their REC#/COMMITMENT_SUMMARY items.
+- LATEST/ANALYSIS pointer: seeded from the most recently uploaded analyzed document.
+- due_status on pending attestations: puts them in the sparse DueIndex the daily reminder queries.
+- With --migrate-schema, REC#/ATT#/COMMITMENT_SUMMARY items written before schema_version 2 are rewritten with
+  native Number/Map/List attributes, so server-side numeric filters such as /recommendations?min_savings= see them.
+  The API reads both versions, so this step is optional.
+- With --rebuild-feedback, the per-credit-type FEEDBACK aggregates the analyze prompt reads are rebuilt from the
+  whole HISTORY partition (older history rows lack credit_type; it is read from their REC# item). Run it
+  while no decisions are being made: it overwrites the aggregates.
+
+Safe to re-run: existing lookup items, an existing pointer and already-indexed attestations are left untouched.
+
+Usage: python backfill_indexes.py --table <TableName> [--dry-run] [--skip-history] [--migrate-schema] [--rebuild-feedback]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambdas'))
+from schema import SCHEMA_VERSION, decode_item, encode_item  # noqa: E402
+import feedback  # noqa: E402
+
+
+def pages(call, **kwargs):
+    while True:
+        page = call(**kwargs)
+        yield from page['Items']
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--table', required=True, help='DynamoDB table name (stack output RecommendationsTable)')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be written without writing')
+    parser.add_argument('--skip-history', action='store_true', help='Only index the latest analysis of each document (no table scan)')
+    parser.add_argument('--migrate-schema', action='store_true', help=f'Rewrite legacy string-encoded items as schema_version {SCHEMA_VERSION}')
+    parser.add_argument('--rebuild-feedback', action='store_true', help='Rebuild the per-credit-type FEEDBACK aggregates from HISTORY')
+    args = parser.parse_args()
+
+    table = boto3.resource('dynamodb').Table(args.table)
+    lookups, newest = {}, None
+
+    # Latest analysis per document: copy the DOC item's status fields as-is
+    for doc in pages(table.query, KeyConditionExpression=Key('PK').eq('DOC')):
+        if doc.get('analysis_id'):
+            lookups[doc['analysis_id']] = {**{k: v for k, v in doc.items() if k not in ('PK', 'SK')}, 'doc_id': doc['SK']}
+            if newest is None or doc.get('uploaded_at', '') > newest.get('uploaded_at', ''):
+                newest = doc
+
+    # Earlier analyses: only their child items know the document
+    if not args.skip_history:
+        for item in pages(table.scan, FilterExpression=Attr('PK').begins_with('ANALYSIS#') & Attr('doc_id').exists(),
+                          ProjectionExpression='PK, doc_id'):
+            analysis_id = item['PK'].split('#', 1)[1]
+            lookups.setdefault(analysis_id, {'doc_id': item['doc_id'], 'analysis_id': analysis_id, 'status': 'analyzed'})
+
+    # Pending attestations with a due date that are not yet in DueIndex
+    unindexed = list(pages(table.scan, FilterExpression=Attr('PK').begins_with('ATTESTATION#') & Attr('status').eq('pending')
+                           & Attr('next_due').gt('') & Attr('due_status').not_exists(), ProjectionExpression='PK, SK'))
+
+    existing = {aid for aid in lookups if 'Item' in table.get_item(Key={'PK': f'ANALYSIS#{aid}', 'SK': 'DOC'}, ProjectionExpression='PK')}
+    todo = {aid: attrs for aid, attrs in lookups.items() if aid not in existing}
+    print(f'{len(lookups)} analyses found, {len(existing)} already indexed, {len(todo)} to write')
+    has_latest = 'Item' in table.get_item(Key={'PK': 'LATEST', 'SK': 'ANALYSIS'})
+    if newest and not has_latest:
+        print(f"LATEST pointer -> {newest['analysis_id']} (doc {newest['SK']})")
+    print(f'{len(unindexed)} pending attestations to add to DueIndex')
+    if args.dry_run:
+        for aid, attrs in sorted(todo.items()):
+            print(f"  ANALYSIS#{aid} -> {attrs['doc_id']} ({attrs.get('status')})")
+        return
+
+    with table.batch_writer() as batch:
+        for aid, attrs in todo.items():
+            batch.put_item(Item={**attrs, 'PK': f'ANALYSIS#{aid}', 'SK': 'DOC', 'analysis_id': aid})
+    if newest and not has_latest:
+        try:
+            # started_at from the upload time, so any analysis started after the upgrade supersedes it
+            table.put_item(Item={'PK': 'LATEST', 'SK': 'ANALYSIS', 'analysis_id': newest['analysis_id'], 'doc_id': newest['SK'],
+                                 'started_at': newest.get('uploaded_at', '')}, ConditionExpression='attribute_not_exists(PK)')
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # an analysis started while we were running
+    for att in unindexed:
+        try:
+            table.update_item(Key={'PK': att['PK'], 'SK': att['SK']}, UpdateExpression='SET due_status = :p',
+                              ConditionExpression='#s = :p', ExpressionAttributeNames={'#s': 'status'}, ExpressionAttributeValues={':p': 'pending'})
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # completed while we were running
+    print(f'✅ Wrote {len(todo)} lookup items, indexed {len(unindexed)} attestations')
+
+    if args.migrate_schema:
+        migrate_schema(table)
+    if args.rebuild_feedback:
+        rebuild_feedback(table)
+
+
+def migrate_schema(table):
+    legacy = (Attr('PK').begins_with('ANALYSIS#') | Attr('PK').begins_with('ATTESTATION#')) & Attr('schema_version').not_exists() \
+        & (Attr('SK').begins_with('REC#') | Attr('SK').begins_with('ATT#') | Attr('SK').eq('COMMITMENT_SUMMARY'))
+    migrated = skipped = 0
+    for item in pages(table.scan, FilterExpression=legacy):
+        try:
+            # Skip the item if a decision or attestation update changed it after we read it
+            cond = Attr('schema_version').not_exists() & (Attr('status').eq(item['status']) if 'status' in item else Attr('status').not_exists())
+            table.put_item(Item=encode_item(decode_item(item)), ConditionExpression=cond)
+            migrated += 1
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            skipped += 1
+    print(f'✅ Migrated {migrated} items to schema_version {SCHEMA_VERSION} ({skipped} changed concurrently; re-run to pick them up)')
+
+
+def rebuild_feedback(table):
+    aggregates, credit_types = {}, {}
+    for h in pages(table.query, KeyConditionExpression=Key('PK').eq('HISTORY')):
+        action = h.get('action')
+        if action not in ('accepted', 'rejected'):
+            continue
+        credit_type = h.get('credit_type')
+        if not credit_type:
+            rec_key = (h.get('analysis_id'), h.get('rec_id'))
+            if rec_key not in credit_types:
+                rec = table.get_item(Key={'PK': f'ANALYSIS#{rec_key[0]}', 'SK': f'REC#{rec_key[1]}'}, ProjectionExpression='credit_type, title').get('Item') or {}
+                credit_types[rec_key] = rec.get('credit_type') or rec.get('title') or 'unknown'
+            credit_type = credit_types[rec_key]
+        decided = datetime.fromisoformat(h['SK'].split('#', 1)[0]).replace(tzinfo=timezone.utc)
+        agg = aggregates.setdefault(credit_type, {'accepted_count': 0, 'rejected_count': 0, 'accepted_weight': 0.0, 'rejected_weight': 0.0, 'notes': [], 'updated_at': ''})
+        agg[f'{action}_count'] += 1
+        agg[f'{action}_weight'] += feedback.weight(decided.timestamp())
+        agg['updated_at'] = max(agg['updated_at'], h['SK'].split('#', 1)[0])
+        note = feedback.note(h.get('notes')) if action == 'rejected' else None
+        if note:
+            agg['notes'].append((h['SK'], note))
+    with table.batch_writer() as batch:
+        for credit_type, agg in aggregates.items():
+            batch.put_item(Item={'PK': 'FEEDBACK', 'SK': f'TYPE#{credit_type}', 'credit_type': credit_type, 'updated_at': agg['updated_at'],
+                                 'accepted_count': agg['accepted_count'], 'rejected_count': agg['rejected_count'],
+                                 'accepted_weight': Decimal(f"{agg['accepted_weight']:.12g}"), 'rejected_weight': Decimal(f"{agg['rejected_weight']:.12g}"),
+                                 'recent_notes': [n for _, n in sorted(agg['notes'], reverse=True)[:feedback.RECENT_NOTES]]})
+    print(f'✅ Rebuilt FEEDBACK for {len(aggregates)} credit types from {sum(a["accepted_count"] + a["rejected_count"] for a in aggregates.values())} decisions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Export documents, analyses, recommendations, attestations and history for finance reporting.
+
+Runs a parallel segmented Scan: each of --segments threads reads its own segment page by page and
+streams it into its own part file, so memory stays at about one 1 MB page per thread and throughput
+scales with the segment count until the table's read capacity is the limit.
+Items go through schema.decode_item, so DynamoDB numbers and legacy (version 1) number strings become plain
+numbers, and JSON-string attributes (what_if, fields, data, ...) are decoded.
+A segment that fails closes its part file, and a failed export removes the part files it wrote.
+
+  ndjson (default)  <out>/part-00000.ndjson.gz ...  one item per line, gzip-compressed
+  parquet           <out>/part-00000.parquet ...    needs pyarrow; one row group per page with columns
+                    entity, pk, sk, analysis_id, doc_id, status, created_at and item (the decoded item as JSON)
+
+Usage: python export_table.py --table <TableName> --out exports/2026-10 [--segments 8] [--format ndjson|parquet]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambdas'))
+from schema import decode_item  # noqa: E402
+
+try:  # optional: only needed for --format parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+JSON_FIELDS = ('what_if', 'spend_change', 'fields', 'filled_fields', 'data', 'services', 'requirements', 'qualifying_services')
+ENTITIES = ('document', 'recommendation', 'commitment_summary', 'attestation', 'history')
+COLUMNS = ('entity', 'pk', 'sk', 'analysis_id', 'doc_id', 'status', 'created_at', 'item')
+
+
+def entity_of(item):
+    """Reporting entity for an item, or None for internal items (caches, pointers, lookups, spend, sockets)."""
+    pk, sk = item['PK'], item['SK']
+    if pk == 'DOC':
+        return 'document'
+    if pk == 'HISTORY':
+        return 'history'
+    if pk.startswith('ATTESTATION#'):
+        return 'attestation'
+    if pk.startswith('ANALYSIS#'):
+        return 'recommendation' if sk.startswith('REC#') else 'commitment_summary' if sk == 'COMMITMENT_SUMMARY' else None
+    return None
+
+
+def decode(item, entity):
+    out = {'entity': entity}
+    for k, v in decode_item(item).items():
+        if k in JSON_FIELDS and isinstance(v, str) and v[:1] in '{[':
+            try:
+                v = json.loads(v)
+            except ValueError:
+                pass
+        out[k] = v
+    if entity != 'document' and item['PK'].split('#', 1)[0] in ('ANALYSIS', 'ATTESTATION'):
+        out.setdefault('analysis_id', item['PK'].split('#', 1)[1])
+    return out
+
+
+class NdjsonWriter:
+    def __init__(self, path):
+        self.path = path + '.ndjson.gz'
+        self.f = gzip.open(self.path, 'wt', encoding='utf-8')
+
+    def write(self, rows):
+        for row in rows:
+            self.f.write(json.dumps(row, separators=(',', ':'), default=str) + '\n')
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        if pa is None:
+            raise SystemExit('--format parquet needs pyarrow (pip install pyarrow)')
+        self.path = path + '.parquet'
+        self.schema = pa.schema([(c, pa.string()) for c in COLUMNS])
+        self.w = pq.ParquetWriter(self.path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        if rows:
+            cols = {c: [None if r.get(c) is None else str(r[c]) for r in rows] for c in COLUMNS if c not in ('pk', 'sk', 'item')}
+            cols.update(pk=[r['PK'] for r in rows], sk=[r['SK'] for r in rows], item=[json.dumps(r, default=str) for r in rows])
+            self.w.write_table(pa.table(cols, schema=self.schema))
+
+    def close(self):
+        self.w.close()
+
+
+def export_segment(table, segment, total, writer, entities, progress):
+    counts, kwargs = {}, {'Segment': segment, 'TotalSegments': total}
+    try:
+        while True:
+            page = table.scan(**kwargs)
+            rows = []
+            for item in page['Items']:
+                entity = entity_of(item)
+                if entity in entities:
+                    rows.append(decode(item, entity))
+                    counts[entity] = counts.get(entity, 0) + 1
+            writer.write(rows)
+            progress(len(page['Items']))
+            if 'LastEvaluatedKey' not in page:
+                return counts
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--table', required=True, help='DynamoDB table name (stack output RecommendationsTable)')
+    parser.add_argument('--out', required=True, help='Output directory (created if missing)')
+    parser.add_argument('--segments', type=int, default=8, help='Parallel scan segments / threads (default 8)')
+    parser.add_argument('--format', choices=('ndjson', 'parquet'), default='ndjson')
+    parser.add_argument('--entities', default=','.join(ENTITIES), help=f'Comma-separated subset of {",".join(ENTITIES)}')
+    parser.add_argument('--endpoint-url', help='e.g. http://localhost:8000 for DynamoDB Local')
+    args = parser.parse_args()
+
+    entities = set(args.entities.split(','))
+    os.makedirs(args.out, exist_ok=True)
+    # One resource per thread: boto3 resources are not thread-safe
+    local = threading.local()
+    def table():
+        if not hasattr(local, 'table'):
+            local.table = boto3.session.Session().resource('dynamodb', endpoint_url=args.endpoint_url).Table(args.table)
+        return local.table
+
+    lock, scanned = threading.Lock(), [0]
+    def progress(n):
+        with lock:
+            scanned[0] += n
+
+    Writer = ParquetWriter if args.format == 'parquet' else NdjsonWriter
+    writers = [None] * args.segments
+    def run(s):
+        writers[s] = Writer(os.path.join(args.out, f'part-{s:05d}'))
+        return export_segment(table(), s, args.segments, writers[s], entities, progress)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.segments) as pool:
+            futures = [pool.submit(run, s) for s in range(args.segments)]
+            totals = {}
+            for f in futures:
+                for entity, n in f.result().items():
+                    totals[entity] = totals.get(entity, 0) + n
+    except BaseException:
+        # A partial export looks complete to whatever reads the directory, so drop every part this run wrote
+        for w in writers:
+            if w is not None and os.path.exists(w.path):
+                os.remove(w.path)
+        raise
+    elapsed = time.perf_counter() - start
+
+    print(f'✅ Exported {sum(totals.values())} items to {args.out} ({args.format}, {args.segments} segments)')
+    for entity in ENTITIES:
+        if entity in totals:
+            print(f'   {entity:<20}{totals[entity]:>10}')
+    print(f'   scanned {scanned[0]} items in {elapsed:.1f}s ({scanned[0] / max(elapsed, 1e-9):.0f} items/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,79 @@
 """Commitment Intelligent Platform - Lambda API handlers"""
-import json, os, uuid, base64, boto3
-from datetime import datetime
+import json, os, io, math, time, uuid, random, base64, hashlib, resource, tempfile, boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from decimal import Decimal
+from jsonstream import JsonItemStream, repair_json
+from schema import decode_item, encode_item, number, to_dynamo
+from credit_engine import CreditEngine
+import service_resolver
+import spend_cube
+import forecast
+import what_if
+import feedback
+
+try:  # optional: enables page-level splitting of long PDFs (package pypdf with the lambdas to use it)
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
 
 s3 = boto3.client('s3')
 ddb = boto3.resource('dynamodb')
 bedrock = boto3.client('bedrock-runtime')
 ses = boto3.client('ses')
+ce = boto3.client('ce', region_name='us-east-1')
 
 TABLE = os.environ['TABLE_NAME']
 BUCKET = os.environ['DOCUMENTS_BUCKET']
 SENDER = os.environ['SENDER_EMAIL']
 MODEL = os.environ['BEDROCK_MODEL_ID']
+SPEND_TTL = int(os.environ.get('SPEND_TTL_MINUTES', '60')) * 60
+SPEND_SETTLE_DAYS = 3  # CE keeps revising a month for a few days after it ends
+CE_TPS = float(os.environ.get('CE_TPS', '5'))  # Cost Explorer request rate org-wide fetches are paced to
+ORG_SPEND_CONCURRENCY = int(os.environ.get('ORG_SPEND_CONCURRENCY', '4'))
+MAX_PDF_BYTES = int(os.environ.get('MAX_PDF_MB', '20')) * 1024 * 1024
+PDF_CHUNK = 3 * 256 * 1024  # multiple of 3 so per-chunk base64 concatenates without padding
+PAGES_PER_CHUNK = int(os.environ.get('PAGES_PER_CHUNK', '8'))
+ANALYZE_CONCURRENCY = int(os.environ.get('ANALYZE_CONCURRENCY', '4'))
+PROMPT_VERSION = '2026-10-17.3'  # bump whenever the scoring prompt changes to invalidate cached analyses
+EXTRACT_VERSION = '2026-10-17'  # bump whenever the extraction prompt changes to invalidate cached extractions
+SCORING_MODEL = os.environ.get('SCORING_MODEL_ID') or MODEL
+BATCH_WRITE_CONCURRENCY = int(os.environ.get('BATCH_WRITE_CONCURRENCY', '4'))
+WS_ENDPOINT = os.environ.get('WS_ENDPOINT')  # https://.../<stage> management endpoint of the notify WebSocket API
+WS_URL = os.environ.get('WS_URL')  # wss://.../<stage> URL handed to the frontend
+WS_SUBSCRIPTION_TTL = 3600
+FORECAST_SIMULATIONS = 2000
+FORECAST_MAX_SIMULATIONS = 20000
+FORECAST_MAX_SCENARIOS = 5000
+WHAT_IF_MAX_SCENARIOS = 5000
+DECISION_ACTIONS = ('accepted', 'rejected')
+DECISIONS_MAX = 100
+DECISIONS_PER_TRANSACTION = 50  # a rec update plus a history row each; TransactWriteItems takes up to 100 actions
+# Transaction failures worth retrying: conflicts with concurrent writes and throttling; anything else fails the chunk at once
+RETRYABLE_TRANSACTION_CODES = frozenset(('TransactionConflict', 'TransactionInProgressException', 'ThrottlingError', 'ThrottlingException',
+                                         'ProvisionedThroughputExceeded', 'ProvisionedThroughputExceededException', 'RequestLimitExceeded'))
+
+# Exclude tax, credits, refunds — use amortized cost (matches real PPA tracking)
+CE_FILTER = {'Not': {'Dimensions': {'Key': 'RECORD_TYPE', 'Values': ['Credit', 'Refund', 'Tax']}}}
+
+CREDIT_OFFERINGS = {
+    'Generative AI Credit': {'discount': '25%', 'primary': ['SageMaker', 'Bedrock', 'Lambda'], 'supporting': ['EC2', 'S3'], 'min_spend': 1000},
+    'Graviton Optimization Credit': {'discount': '31%', 'primary': ['EC2'], 'supporting': ['RDS', 'ElastiCache'], 'min_spend': 500},
+    'Data Analytics Credit': {'discount': '22%', 'primary': ['Redshift', 'EMR', 'Glue'], 'supporting': ['S3', 'Kinesis'], 'min_spend': 800},
+    'Serverless Credit': {'discount': '18%', 'primary': ['Lambda', 'API Gateway'], 'supporting': ['DynamoDB', 'S3'], 'min_spend': 300},
+}
+credit_engine = CreditEngine(CREDIT_OFFERINGS)  # compiled once per container
 
 table = ddb.Table(TABLE)
 
+def _json_default(o):
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    return str(o)
+
+
 def resp(status, body):
-    return {'statusCode': status, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps(body, default=str)}
+    return {'statusCode': status, 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}, 'body': json.dumps(body, default=_json_default)}
 
 
 # --- Upload PDF ---
@@ -38,32 +95,280 @@ def handle_upload(event, context):
         return resp(500, {'error': str(e)})
 
 
+# --- Batched persistence ---
+def _batch_put(items, parallel=True, max_attempts=8):
+    """Write items with BatchWriteItem in 25-item requests, retrying UnprocessedItems with jittered backoff.
+
+    Chunks are submitted concurrently (BATCH_WRITE_CONCURRENCY) when parallel is set. Later items win
+    on duplicate keys, since one request may not contain the same key twice.
+    Returns {'items', 'requests', 'seconds', 'items_per_sec'}.
+    """
+    items = list({(i['PK'], i['SK']): i for i in items}.values())
+    chunks = [items[i:i + 25] for i in range(0, len(items), 25)]
+    started = time.perf_counter()
+
+    def write(chunk):
+        pending = {TABLE: [{'PutRequest': {'Item': item}} for item in chunk]}
+        for attempt in range(max_attempts):
+            pending = ddb.meta.client.batch_write_item(RequestItems=pending).get('UnprocessedItems')
+            if not pending:
+                return attempt + 1
+            time.sleep(min(0.05 * 2 ** attempt, 2) * random.uniform(0.5, 1))
+        raise RuntimeError(f'{len(pending[TABLE])} items still unprocessed after {max_attempts} BatchWriteItem attempts')
+
+    if parallel and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(BATCH_WRITE_CONCURRENCY, len(chunks))) as pool:
+            requests = sum(pool.map(write, chunks))
+    else:
+        requests = sum(write(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - started
+    return {'items': len(items), 'requests': requests, 'seconds': round(elapsed, 3), 'items_per_sec': round(len(items) / elapsed, 1) if elapsed else None}
+
+
+def _batch_get(keys, max_attempts=8, **request):
+    """BatchGetItem up to 100 keys, retrying UnprocessedKeys with the same jittered backoff as _batch_put."""
+    items = []
+    for attempt in range(max_attempts):
+        page = ddb.batch_get_item(RequestItems={TABLE: {'Keys': keys, **request}})
+        items.extend(page['Responses'].get(TABLE, []))
+        keys = page.get('UnprocessedKeys', {}).get(TABLE, {}).get('Keys', [])
+        if not keys:
+            return items
+        time.sleep(min(0.05 * 2 ** attempt, 2) * random.uniform(0.5, 1))
+    raise RuntimeError(f'{len(keys)} keys still unprocessed after {max_attempts} BatchGetItem attempts')
+
+
+# --- Daily spend store: Cost Explorer results cached in DynamoDB as one columnar partition per month ---
+def _fetch_daily_spend(start, end):
+    """Fetch {'YYYY-MM-DD': {service: cost}} for [start, end) with one DAILY, SERVICE-grouped CE query.
+
+    NextPageToken is followed; a day's groups may continue on the next page, so costs accumulate.
+    Every day in the range gets an entry, empty when CE reports no spend.
+    """
+    days = {}
+    if start >= end:
+        return days
+    kwargs = {'TimePeriod': {'Start': start, 'End': end}, 'Granularity': 'DAILY', 'Metrics': ['AmortizedCost'], 'Filter': CE_FILTER, 'GroupBy': [{'Type': 'DIMENSION', 'Key': 'SERVICE'}]}
+    while True:
+        page = ce.get_cost_and_usage(**kwargs)
+        for r in page['ResultsByTime']:
+            day = days.setdefault(r['TimePeriod']['Start'], {})
+            for g in r['Groups']:
+                cost = float(g['Metrics']['AmortizedCost']['Amount'])
+                if cost:
+                    day[g['Keys'][0]] = day.get(g['Keys'][0], 0.0) + cost
+        if not page.get('NextPageToken'):
+            return days
+        kwargs['NextPageToken'] = page['NextPageToken']
+
+
+def _daily_partition(period, days, settled_through, now):
+    """SPEND_DAILY/MONTH#<period> item: a day-of-month column, a service dictionary and one cost column per service."""
+    dates = sorted(days)
+    services = sorted({s for d in dates for s in days[d]})
+    return encode_item({'PK': 'SPEND_DAILY', 'SK': f'MONTH#{period}', 'days': [int(d[8:]) for d in dates], 'services': services,
+                        'costs': [[round(days[d].get(s, 0.0), 4) for d in dates] for s in services],
+                        'settled_through': settled_through, 'fetched_at': int(now.timestamp())})
+
+
+def _daily_from_partition(item):
+    period = item['SK'].split('#', 1)[1]
+    days = {f'{period}-{d:02d}': {} for d in item['days']}
+    for s, col in zip(item['services'], item['costs']):
+        for d, cost in zip(item['days'], col):
+            if cost:
+                days[f'{period}-{d:02d}'][s] = cost
+    return days
+
+
+def _get_daily_spend(since=None):
+    """Return {'YYYY-MM-DD': {service: cost}} from the month of `since` (default: January this year) through yesterday.
+
+    Days up to a partition's settled_through (SPEND_SETTLE_DAYS behind the fetch) are final and never
+    re-fetched. The first call backfills the range; later calls fetch from the first missing day, plus the
+    unsettled tail at most once per SPEND_TTL_MINUTES. A warm read is one Query and no CE calls.
+    """
+    now = datetime.utcnow()
+    today = now.date()
+    y, m = (since.year, since.month) if since else (now.year, 1)
+    periods = []
+    while (y, m) <= (now.year, now.month):
+        periods.append(f'{y}-{m:02d}')
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    items = {i['SK'].split('#', 1)[1]: decode_item(i) for i in _query_all(
+        KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('SPEND_DAILY') & boto3.dynamodb.conditions.Key('SK').between(f'MONTH#{periods[0]}', f'MONTH#{periods[-1]}'))}
+
+    days, starts = {}, []
+    for p in periods:
+        first = datetime.strptime(p, '%Y-%m').date()
+        last = min((first + timedelta(days=31)).replace(day=1), today) - timedelta(days=1)
+        stored = _daily_from_partition(items[p]) if p in items else {}
+        days.update(stored)
+        missing = next((first + timedelta(days=n) for n in range((last - first).days + 1) if (first + timedelta(days=n)).isoformat() not in stored), None)
+        if missing:
+            starts.append(missing)
+        if p in items and items[p]['settled_through'] < last.isoformat() and now.timestamp() - items[p]['fetched_at'] > SPEND_TTL:
+            starts.append(datetime.strptime(items[p]['settled_through'], '%Y-%m-%d').date() + timedelta(days=1))
+    if not starts:
+        return days
+
+    fetched = _fetch_daily_spend(min(starts).isoformat(), today.isoformat())
+    days.update(fetched)
+    settled = (today - timedelta(days=SPEND_SETTLE_DAYS + 1)).isoformat()
+    for p in sorted({d[:7] for d in fetched}):
+        month = {d: svcs for d, svcs in days.items() if d.startswith(p)}
+        table.put_item(Item=_daily_partition(p, month, min(settled, max(month)), now))
+    return days
+
+
+def _monthly_spend(days):
+    """{'YYYY-MM-DD': {service: cost}} -> {'YYYY-MM': {'total', 'services'}}, the current month always present."""
+    months = {datetime.utcnow().strftime('%Y-%m'): {'total': 0.0, 'services': {}}}
+    for d in sorted(days):
+        month = months.setdefault(d[:7], {'total': 0.0, 'services': {}})
+        for s, cost in days[d].items():
+            month['total'] += cost
+            month['services'][s] = month['services'].get(s, 0.0) + cost
+    for month in months.values():
+        month['services'] = {s: round(c, 2) for s, c in month['services'].items() if c > 0.01}
+    return months
+
+
+def _get_spend_snapshot():
+    """Return {'YYYY-MM': {'total', 'services'}} for the current year, summed from the daily store."""
+    return _monthly_spend(_get_daily_spend())
+
+
 # --- Fetch live spend summary for Bedrock context ---
 def _get_spend_summary():
     try:
-        ce = boto3.client('ce', region_name='us-east-1')
-        now = datetime.utcnow()
-        month_start = f'{now.year}-{now.month:02d}-01'
-        year_start = f'{now.year}-01-01'
-        today = now.strftime('%Y-%m-%d')
+        snapshot = _get_spend_snapshot()
+        total = sum(m['total'] for m in snapshot.values())
+        current = snapshot.get(datetime.utcnow().strftime('%Y-%m'), {})
+        return {'ytd_spend': round(total, 2), 'current_month_by_service': current.get('services', {})}
+    except Exception:
+        return {'ytd_spend': 'unavailable', 'current_month_by_service': {}}
 
-        # Exclude tax, credits, refunds — use amortized cost (matches real PPA tracking)
-        ce_filter = {'Not': {'Dimensions': {'Key': 'RECORD_TYPE', 'Values': ['Credit', 'Refund', 'Tax']}}}
 
-        ytd = ce.get_cost_and_usage(TimePeriod={'Start': year_start, 'End': today}, Granularity='MONTHLY', Metrics=['AmortizedCost'], Filter=ce_filter)
-        total = sum(float(r['Total']['AmortizedCost']['Amount']) for r in ytd['ResultsByTime'])
+def _get_org_cube():
+    """Current month's spend for every linked account: {'accounts': {id: name}, 'cube': {account: {service: cost}}, 'calls'}.
+
+    Stored as one SPEND_ORG/MONTH#<period>#<account> item per account, plus a MONTH#<period>#FETCHED marker
+    so a month with no spend yet is cached too, and re-fetched from CE (spend_cube.fetch_cube) at most once
+    per SPEND_TTL_MINUTES.
+    """
+    now = datetime.utcnow()
+    period, start, end = now.strftime('%Y-%m'), now.strftime('%Y-%m-01'), now.strftime('%Y-%m-%d')
+    items = [decode_item(i) for i in _query_all(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('SPEND_ORG') & boto3.dynamodb.conditions.Key('SK').begins_with(f'MONTH#{period}#'))]
+    marker = next((i for i in items if i['SK'] == f'MONTH#{period}#FETCHED'), None)
+    items = [i for i in items if i is not marker]
+    fetched_at = marker['fetched_at'] if marker else min((i['fetched_at'] for i in items), default=None)
+    if start >= end or (fetched_at is not None and now.timestamp() - fetched_at <= SPEND_TTL):
+        return {'accounts': {i['account_id']: i.get('name', '') for i in items}, 'cube': {i['account_id']: i.get('services') or {} for i in items}, 'calls': 0}
+
+    fetched = spend_cube.fetch_cube(ce, start, end, ce_filter=CE_FILTER, max_workers=ORG_SPEND_CONCURRENCY, tps=CE_TPS)
+    _batch_put([encode_item({'PK': 'SPEND_ORG', 'SK': f'MONTH#{period}#{a}', 'account_id': a, 'name': fetched['accounts'].get(a, ''),
+                             'services': svcs, 'total': round(sum(svcs.values()), 2), 'fetched_at': int(now.timestamp())})
+                for a, svcs in fetched['cube'].items()]
+               + [encode_item({'PK': 'SPEND_ORG', 'SK': f'MONTH#{period}#FETCHED', 'accounts': len(fetched['cube']), 'fetched_at': int(now.timestamp())})])
+    return fetched
+
+
+# --- Analysis status: DOC item plus an ANALYSIS#<id>/DOC lookup item kept in step ---
+def _set_status(doc_id, analysis_id, status, **attrs):
+    """Set status (and extra attributes) on the DOC item and on its ANALYSIS#<id> lookup item.
+
+    The lookup item lets an analysis_id resolve to its document with a single GetItem.
+    """
+    names, values, sets = {'#s': 'status'}, {':s': status, ':a': analysis_id, ':d': doc_id}, ['#s = :s', 'analysis_id = :a']
+    for i, (k, v) in enumerate(attrs.items()):
+        names[f'#k{i}'], values[f':v{i}'] = k, to_dynamo(v)
+        sets.append(f'#k{i} = :v{i}')
+    expr = 'SET ' + ', '.join(sets)
+    table.update_item(Key={'PK': 'DOC', 'SK': doc_id}, UpdateExpression=expr, ExpressionAttributeNames=names, ExpressionAttributeValues={k: v for k, v in values.items() if k != ':d'})
+    table.update_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'DOC'}, UpdateExpression=expr + ', doc_id = :d', ExpressionAttributeNames=names, ExpressionAttributeValues=values)
+
+
+def _mark_latest(doc_id, analysis_id, started_at):
+    """Point LATEST/ANALYSIS at this analysis unless one started later already holds it."""
+    try:
+        table.put_item(Item={'PK': 'LATEST', 'SK': 'ANALYSIS', 'analysis_id': analysis_id, 'doc_id': doc_id, 'started_at': started_at},
+                       ConditionExpression='attribute_not_exists(started_at) OR started_at < :t', ExpressionAttributeValues={':t': started_at})
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
 
-        by_svc = ce.get_cost_and_usage(TimePeriod={'Start': month_start, 'End': today}, Granularity='MONTHLY', Metrics=['AmortizedCost'], Filter=ce_filter, GroupBy=[{'Type': 'DIMENSION', 'Key': 'SERVICE'}])
-        services = {}
-        for r in by_svc['ResultsByTime']:
-            for g in r['Groups']:
-                cost = float(g['Metrics']['AmortizedCost']['Amount'])
-                if cost > 0.01:
-                    services[g['Keys'][0]] = round(cost, 2)
 
-        return {'ytd_spend': round(total, 2), 'current_month_by_service': services}
+def _latest_analysis_id():
+    return table.get_item(Key={'PK': 'LATEST', 'SK': 'ANALYSIS'}).get('Item', {}).get('analysis_id')
+
+
+# --- Push notifications: WebSocket connections subscribe to one analysis ---
+# Items: WS#<analysis_id>/CONN#<connection_id> (fan-out) and CONN#<connection_id>/WS (disconnect cleanup), both expiring via ttl.
+# Without WS_ENDPOINT (local runs) messages are collected in _local_notifications instead.
+# A worker streams one message per recommendation, so subscribers are read at most every
+# WS_SUBSCRIBERS_REFRESH seconds per analysis rather than once per message; the refresh still picks up
+# clients that subscribe while the analysis runs.
+WS_SUBSCRIBERS_REFRESH = 5
+_local_notifications = {}
+_subscribers = {}  # analysis_id -> (monotonic read time, [connection ids]), for this container
+_ws = None
+
+
+def _unsubscribe(conn_id, analysis_id):
+    table.delete_item(Key={'PK': f'WS#{analysis_id}', 'SK': f'CONN#{conn_id}'})
+    table.delete_item(Key={'PK': f'CONN#{conn_id}', 'SK': 'WS'})
+
+
+def _subscriber_ids(analysis_id):
+    read_at, conn_ids = _subscribers.get(analysis_id, (None, None))
+    if read_at is None or time.monotonic() - read_at > WS_SUBSCRIBERS_REFRESH:
+        subs = _query_all(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq(f'WS#{analysis_id}'), ProjectionExpression='SK')
+        conn_ids = [sub['SK'].split('#', 1)[1] for sub in subs]
+        _subscribers[analysis_id] = (time.monotonic(), conn_ids)
+    return conn_ids
+
+
+def _notify(analysis_id, message):
+    """Push a message to every connection subscribed to analysis_id. Never raises: polling is the fallback."""
+    global _ws
+    if not WS_ENDPOINT:
+        _local_notifications.setdefault(analysis_id, []).append(message)
+        return
+    try:
+        _ws = _ws or boto3.client('apigatewaymanagementapi', endpoint_url=WS_ENDPOINT)
+        data = json.dumps(message, default=_json_default).encode()
+        conn_ids = _subscriber_ids(analysis_id)
+        for conn_id in list(conn_ids):
+            try:
+                _ws.post_to_connection(ConnectionId=conn_id, Data=data)
+            except _ws.exceptions.GoneException:
+                _unsubscribe(conn_id, analysis_id)
+                conn_ids.remove(conn_id)
+        if message.get('type') in ('complete', 'error'):
+            _subscribers.pop(analysis_id, None)  # last message of the analysis
     except Exception:
-        return {'ytd_spend': 'unavailable', 'current_month_by_service': {}}
+        pass
+
+
+def handle_notify_connection(event, context):
+    """WebSocket $connect/$disconnect: wss://...?analysis_id=<id> subscribes the connection to that analysis."""
+    ctx = event.get('requestContext', {})
+    conn_id = ctx.get('connectionId')
+    try:
+        if ctx.get('eventType') == 'CONNECT':
+            analysis_id = (event.get('queryStringParameters') or {}).get('analysis_id')
+            if not analysis_id:
+                return {'statusCode': 400, 'body': 'analysis_id required'}
+            ttl = int(time.time()) + WS_SUBSCRIPTION_TTL
+            table.put_item(Item={'PK': f'WS#{analysis_id}', 'SK': f'CONN#{conn_id}', 'ttl': ttl})
+            table.put_item(Item={'PK': f'CONN#{conn_id}', 'SK': 'WS', 'analysis_id': analysis_id, 'ttl': ttl})
+        elif ctx.get('eventType') == 'DISCONNECT':
+            sub = table.get_item(Key={'PK': f'CONN#{conn_id}', 'SK': 'WS'}).get('Item')
+            if sub:
+                _unsubscribe(conn_id, sub['analysis_id'])
+        return {'statusCode': 200}
+    except Exception as e:
+        return {'statusCode': 500, 'body': str(e)}
 
 
 # --- Analyze: async trigger ---
@@ -74,8 +379,9 @@ def handle_analyze(event, context):
         s3_key = body.get('s3_key')
         analysis_id = str(uuid.uuid4())
 
-        # Mark as processing
-        table.update_item(Key={'PK': 'DOC', 'SK': doc_id}, UpdateExpression='SET #s = :s, analysis_id = :a', ExpressionAttributeNames={'#s': 'status'}, ExpressionAttributeValues={':s': 'processing', ':a': analysis_id})
+        # Mark as processing and make it the dashboard's default analysis
+        _set_status(doc_id, analysis_id, 'processing')
+        _mark_latest(doc_id, analysis_id, datetime.utcnow().isoformat())
 
         # Invoke worker async
         boto3.client('lambda').invoke(
@@ -83,83 +389,223 @@ def handle_analyze(event, context):
             InvocationType='Event',
             Payload=json.dumps({'doc_id': doc_id, 's3_key': s3_key, 'analysis_id': analysis_id})
         )
-        return resp(200, {'analysis_id': analysis_id, 'status': 'processing'})
+        return resp(200, {'analysis_id': analysis_id, 'status': 'processing', 'ws_url': WS_URL})
     except Exception as e:
         return resp(500, {'error': str(e)})
 
 
-def _repair_json(text):
-    """Attempt to parse JSON, repairing truncation if needed."""
+# --- PDF ingestion: stream S3 -> base64 -> request buffer ---
+def _reset_peak_rss():
+    """Reset the kernel's peak-RSS counter so each warm invocation measures only itself."""
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-    # Try closing open braces/brackets
-    fixed = text.rstrip().rstrip(',')
-    # Close any open string
-    if fixed.count('"') % 2 == 1:
-        fixed += '"'
-    # Close open structures
-    opens = fixed.count('{') - fixed.count('}')
-    open_arr = fixed.count('[') - fixed.count(']')
-    fixed += ']' * max(open_arr, 0)
-    fixed += '}' * max(opens, 0)
-    try:
-        return json.loads(fixed)
-    except json.JSONDecodeError:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
         pass
-    # Progressively trim from the end and try to close
-    for trim in range(1, 200):
-        candidate = text[:-(trim)].rstrip().rstrip(',').rstrip(':')
-        if candidate.count('"') % 2 == 1:
-            candidate += '"'
-        o = candidate.count('{') - candidate.count('}')
-        a = candidate.count('[') - candidate.count(']')
-        candidate += ']' * max(a, 0)
-        candidate += '}' * max(o, 0)
-        try:
-            parsed = json.loads(candidate)
-            if isinstance(parsed, dict):
-                return parsed
-        except json.JSONDecodeError:
-            continue
-    raise ValueError(f"Cannot parse Bedrock response (length {len(text)})")
 
 
-# --- Analyze: worker (invoked async) ---
-def handle_analyze_worker(event, context):
+def _peak_rss_mb():
     try:
-        doc_id = event['doc_id']
-        s3_key = event['s3_key']
-        analysis_id = event['analysis_id']
-
-        # Get PDF from S3
-        pdf_obj = s3.get_object(Bucket=BUCKET, Key=s3_key)
-        pdf_bytes = pdf_obj['Body'].read()
-        pdf_b64 = base64.b64encode(pdf_bytes).decode()
-
-        # Get live spend from Cost Explorer
-        spend = _get_spend_summary()
-
-        # Get past decision history for learning loop
-        hist_result = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('HISTORY'), ScanIndexForward=False, Limit=20)
-        history_ctx = ''
-        if hist_result['Items']:
-            decisions = [f"- {h.get('action','').upper()}: {h.get('rec_id','')} — {h.get('notes','no notes')}" for h in hist_result['Items']]
-            history_ctx = f"""
-
-PAST USER DECISIONS (learn from these — prioritize credit types the user accepted, deprioritize rejected ones):
-{chr(10).join(decisions)}"""
-
-        prompt = f"""You are an AWS PPA/EDP commitment tracking expert. Analyze the attached PPA/EDP document AND the customer's live AWS spend data.
-
-The spend data uses amortized cost, excluding tax/credits/refunds. Marketplace purchases are included.{history_ctx}
-
-LIVE AWS SPEND DATA:
-- YTD Spend: ${spend['ytd_spend']}
-- Current month by service: {json.dumps(spend['current_month_by_service'], indent=2)}
-
-Analyze the PPA document for these real-world PPA structures:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _spool_pdf(s3_key):
+    """Copy the PDF from S3 to a /tmp spool file, hashing it on the way. Returns (spool, size, sha256)."""
+    pdf_obj = s3.get_object(Bucket=BUCKET, Key=s3_key)
+    size = pdf_obj['ContentLength']
+    if size > MAX_PDF_BYTES and PdfReader is None:
+        pdf_obj['Body'].close()
+        raise ValueError(f'PDF is {size / 1048576:.1f} MB; the limit is {MAX_PDF_BYTES // 1048576} MB')
+
+    spool, digest = tempfile.TemporaryFile(), hashlib.sha256()
+    for chunk in pdf_obj['Body'].iter_chunks(PDF_CHUNK):
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, size, digest.hexdigest()
+
+
+def _split_pdf(spool, size):
+    """Return (page_count, chunks) where chunks is a list of (pages_label, stream, size).
+
+    Without pypdf, or for short documents, this is the whole spool as a single chunk (page_count None
+    when pypdf is missing). Longer or oversized documents are split into PAGES_PER_CHUNK page ranges.
+    """
+    if PdfReader is None:
+        return None, [(None, spool, size)]
+
+    reader = PdfReader(spool)
+    pages = len(reader.pages)
+    if pages <= PAGES_PER_CHUNK and size <= MAX_PDF_BYTES:
+        spool.seek(0)
+        return pages, [(None, spool, size)]
+
+    chunks = []
+    for first in range(0, pages, PAGES_PER_CHUNK):
+        last = min(first + PAGES_PER_CHUNK, pages)
+        writer = PdfWriter()
+        for i in range(first, last):
+            writer.add_page(reader.pages[i])
+        buf = io.BytesIO()
+        writer.write(buf)
+        if buf.tell() > MAX_PDF_BYTES:
+            raise ValueError(f'Pages {first + 1}-{last} are {buf.tell() / 1048576:.1f} MB; the limit is {MAX_PDF_BYTES // 1048576} MB')
+        chunks.append((f'{first + 1}-{last}', buf, buf.tell()))
+        buf.seek(0)
+    spool.close()
+    return pages, chunks
+
+
+def _stream_request_body(src, size, prompt, max_tokens=16384):
+    """Build the Bedrock request body with the PDF base64-encoded straight into a preallocated buffer.
+
+    The raw PDF is never held in memory as a whole: src is read PDF_CHUNK bytes at a time and each
+    chunk is encoded in place, so peak memory is ~1.34x the PDF size plus one chunk.
+    """
+    placeholder = '__PDF_BASE64__'
+    prefix, suffix = (part.encode() for part in json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "messages": [
+            {"role": "user", "content": [
+                {"type": "document", "source": {"type": "base64", "media_type": "application/pdf", "data": placeholder}},
+                {"type": "text", "text": prompt}
+            ]}
+        ]
+    }).split(placeholder, 1))
+
+    b64_len = 4 * ((size + 2) // 3)
+    body = bytearray(len(prefix) + b64_len + len(suffix))
+    body[:len(prefix)] = prefix
+    pos, carry = len(prefix), b''
+    for chunk in iter(lambda: src.read(PDF_CHUNK), b''):
+        # Carry any short-read remainder so only the final chunk is padded
+        chunk = carry + chunk
+        cut = len(chunk) - len(chunk) % 3
+        encoded = base64.b64encode(chunk[:cut])
+        carry = chunk[cut:]
+        body[pos:pos + len(encoded)] = encoded
+        pos += len(encoded)
+    encoded = base64.b64encode(carry)
+    body[pos:pos + len(encoded)] = encoded
+    pos += len(encoded)
+    if pos != len(prefix) + b64_len:
+        raise ValueError(f'PDF stream ended early ({pos - len(prefix)} of {b64_len} base64 bytes)')
+    body[pos:] = suffix
+    return body
+
+
+def _parse_model_json(ai_text):
+    cleaned = ai_text.strip()
+    if cleaned.startswith('```'):
+        cleaned = cleaned.split('\n', 1)[1] if '\n' in cleaned else cleaned[3:]
+        if cleaned.endswith('```'):
+            cleaned = cleaned[:-3]
+        cleaned = cleaned.strip()
+    return repair_json(cleaned)
+
+
+def _invoke_streaming(model_id, body, keys=(), on_item=None):
+    """Invoke Bedrock with a streamed response and return the full text.
+
+    If on_item is given, each object inside the top-level arrays named in keys is handed to it as soon as it closes.
+    """
+    stream = JsonItemStream(keys, on_item) if on_item else None
+    parts = []
+    bedrock_resp = bedrock.invoke_model_with_response_stream(modelId=model_id, body=body, contentType='application/json')
+    for event in bedrock_resp['body']:
+        if 'chunk' not in event:
+            continue
+        msg = json.loads(event['chunk']['bytes'])
+        if msg.get('type') == 'content_block_delta' and msg['delta'].get('type') == 'text_delta':
+            if stream:
+                stream.feed(msg['delta']['text'])
+            else:
+                parts.append(msg['delta']['text'])
+    return stream.text() if stream else ''.join(parts)
+
+
+def _invoke_document(src, size, prompt):
+    """Run one Bedrock extraction over a PDF stream and return the normalized extraction dict."""
+    bedrock_body = _stream_request_body(src, size, prompt)
+    src.close()
+    ai_text = _invoke_streaming(MODEL, bedrock_body)
+    del bedrock_body
+    parsed = _parse_model_json(ai_text)
+
+    # Tolerate a bare array of credit buckets
+    if isinstance(parsed, list):
+        return {'credit_buckets': parsed, 'attestations': [], 'commitment_summary': {}}
+    return {'credit_buckets': parsed.get('credit_buckets') or [], 'attestations': parsed.get('attestations') or [], 'commitment_summary': parsed.get('commitment_summary') or {}}
+
+
+def _invoke_text(prompt, max_tokens=8192, keys=(), on_item=None):
+    """Text-only Bedrock call (no document attached) on the scoring model, streamed."""
+    bedrock_body = json.dumps({"anthropic_version": "bedrock-2023-05-31", "max_tokens": max_tokens, "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}]})
+    return _parse_model_json(_invoke_streaming(SCORING_MODEL, bedrock_body, keys, on_item))
+
+
+def _bucket_key(rec):
+    return (rec.get('credit_type') or rec.get('title') or rec.get('id') or '').strip().lower()
+
+
+def _merge_analyses(parts):
+    """Reduce per-page-range extractions into one, deduplicating credit buckets."""
+    recs, atts, summary = {}, {}, {}
+    for part in parts:
+        for rec in part['credit_buckets']:
+            key = _bucket_key(rec)
+            prev = recs.get(key)
+            if prev is None:
+                recs[key] = rec
+                continue
+            # Keep the richer record (larger credit value) and fill its gaps from the other
+            base, other = (rec, prev) if number(rec.get('max_credit_value'), 0) > number(prev.get('max_credit_value'), 0) else (prev, rec)
+            recs[key] = {**{k: v for k, v in other.items() if v not in (None, '', [], {})}, **{k: v for k, v in base.items() if v not in (None, '', [], {})}}
+        for att in part['attestations']:
+            atts.setdefault((att.get('name') or att.get('id') or '').strip().lower(), att)
+        cs = part['commitment_summary'] if isinstance(part['commitment_summary'], dict) else {}
+        years = {y.get('year'): y for y in (summary.get('years') or []) + (cs.get('years') or []) if isinstance(y, dict)}
+        summary = {**{k: v for k, v in cs.items() if v not in (None, '', [], {})}, **{k: v for k, v in summary.items() if v not in (None, '', [], {})}}
+        if years:
+            summary['years'] = sorted(years.values(), key=lambda y: number(y.get('year'), 0))
+
+    # Page ranges are analyzed independently, so model-assigned ids can collide
+    seen = set()
+    for items in (recs.values(), atts.values()):
+        for i, item in enumerate(items):
+            if not item.get('id') or item['id'] in seen:
+                item['id'] = f"{item.get('id') or 'item'}-{i + 1}"
+            seen.add(item['id'])
+    return {'credit_buckets': list(recs.values()), 'attestations': list(atts.values()), 'commitment_summary': summary}
+
+
+def _analyze_chunks(chunks, pages, prompt):
+    """Map each page range to its own concurrent Bedrock call, then reduce the partial results.
+
+    Wall-clock time tracks the slowest page range rather than the total page count.
+    """
+    def run(chunk):
+        label, src, size = chunk
+        scoped = f"""This attachment is pages {label} of a {pages}-page PPA/EDP document. Report only what these pages contain; return empty arrays or an empty object for anything not covered here.
+
+{prompt}"""
+        return _invoke_document(src, size, scoped)
+
+    with ThreadPoolExecutor(max_workers=min(ANALYZE_CONCURRENCY, len(chunks))) as pool:
+        return _merge_analyses(list(pool.map(run, chunks)))
+
+
+# --- Two-stage analysis: static contract extraction (cached per PDF) + spend-dependent scoring ---
+EXTRACT_PROMPT = """You are an AWS PPA/EDP contract analyst. Extract the contract terms from the attached PPA/EDP document. Record only what the document says; do not assess the customer's usage.
+
+Look for these real-world PPA structures:
 
 1. CREDIT BUCKETS — PPA/EDP agreements typically have outcome-based credit programs such as:
    - GenAI POC/Adoption credits (Bedrock, SageMaker, GPU usage)
@@ -173,29 +619,19 @@ Analyze the PPA document for these real-world PPA structures:
 
 3. GOVERNANCE — Attestation requirements, compliance deadlines, case studies, executive engagements
 
-For each credit bucket found, think through what-if scenarios: if the customer shifted or increased spend, would they unlock or improve credit qualification?
+Return a JSON object with three keys: "credit_buckets", "attestations", and "commitment_summary".
 
-Return a JSON object with three keys: "recommendations", "attestations", and "commitment_summary".
-
-"recommendations" — array, one per credit bucket or opportunity found. Each has:
+"credit_buckets" — array, one per credit program found. Each has:
 - id: unique string
 - title: credit program name
 - credit_type: category (e.g. "GenAI POC", "GenAI Adoption", "Growth Investment", "Graviton Adoption", "Serverless", "New Region", "Savings Plan", "Security")
 - workload: AWS services involved
-- usage_pattern: what the live spend data shows for relevant services
-- qualification: "qualified", "partially_qualified", or "not_qualified"
-- max_credit_value: maximum credit amount available (number, from the PPA)
-- current_progress: estimated current progress toward qualification (number, dollar amount)
+- qualifying_services: array of AWS service names as Cost Explorer reports them (e.g. "Amazon Elastic Compute Cloud - Compute", "AWS Lambda") whose spend counts toward the credit
+- spend_threshold: spend required to qualify (number or null)
+- threshold_period: "monthly", "annual", "contract_year" or "term"
+- max_credit_value: maximum credit amount available (number)
 - attestation_window: start and end dates for claiming this credit (e.g. "Mar 2025 - Mar 2028")
-- potential_savings: estimated credit value achievable based on current trajectory (number)
-- confidence: "high", "medium", or "low"
-- reasoning: 2-3 sentences cross-referencing live spend against PPA requirements
-- what_if: object with:
-    - scenario: one sentence describing the change
-    - spend_change: object mapping service names to new monthly spend amounts
-    - new_qualification: resulting qualification status
-    - new_savings: estimated credit value after the change
-    - effort: "low", "medium", or "high"
+- requirements: 1-2 sentences summarizing the qualification terms
 
 "attestations" — array of governance/compliance requirements. Each has:
 - id: unique string
@@ -222,79 +658,226 @@ Return a JSON object with three keys: "recommendations", "attestations", and "co
 
 Return ONLY the JSON object, no other text."""
 
-        bedrock_body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 16384,
-            "messages": [
-                {"role": "user", "content": [
-                    {"type": "document", "source": {"type": "base64", "media_type": "application/pdf", "data": pdf_b64}},
-                    {"type": "text", "text": prompt}
-                ]}
-            ]
-        })
 
-        bedrock_resp = bedrock.invoke_model(modelId=MODEL, body=bedrock_body, contentType='application/json')
-        result = json.loads(bedrock_resp['body'].read())
-        ai_text = result['content'][0]['text']
-
-        # Parse response
-        cleaned = ai_text.strip()
-        if cleaned.startswith('```'):
-            cleaned = cleaned.split('\n', 1)[1] if '\n' in cleaned else cleaned[3:]
-            if cleaned.endswith('```'):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-        parsed = _repair_json(cleaned)
-
-        # Support both old (array) and new (object) response formats
-        if isinstance(parsed, list):
-            recommendations, attestations, commitment_summary = parsed, [], {}
-        else:
-            recommendations = parsed.get('recommendations', [])
-            attestations = parsed.get('attestations', [])
-            commitment_summary = parsed.get('commitment_summary', {})
-
-        # Store in DynamoDB
-        now = datetime.utcnow().isoformat()
+def _extract_contract(spool, size, pdf_sha256):
+    """Stage 1: the contract facts for a PDF, extracted once per (hash, model, EXTRACT_VERSION).
 
-        for rec in recommendations:
-            rec_id = rec.get('id', str(uuid.uuid4()))
-            # Convert all nested dicts/lists to JSON strings and numbers to strings for DynamoDB
-            item = {'PK': f'ANALYSIS#{analysis_id}', 'SK': f'REC#{rec_id}', 'doc_id': doc_id, 'status': 'pending', 'created_at': now}
-            for k, v in rec.items():
-                if isinstance(v, (dict, list)):
-                    item[k] = json.dumps(v)
-                elif isinstance(v, (int, float)):
-                    item[k] = str(v)
-                else:
-                    item[k] = v
-            table.put_item(Item=item)
+    Returns (extraction, cached). On a miss the PDF is sent to Bedrock, fanning out per page range for long documents.
+    """
+    key = {'PK': f'EXTRACT#{pdf_sha256}', 'SK': f'{MODEL}#{EXTRACT_VERSION}'}
+    cached = table.get_item(Key=key).get('Item')
+    if cached:
+        spool.close()
+        return decode_item(cached)['data'], True
+
+    pages, chunks = _split_pdf(spool, size)
+    if len(chunks) > 1:
+        extraction = _analyze_chunks(chunks, pages, EXTRACT_PROMPT)
+    else:
+        _, src, chunk_size = chunks[0]
+        extraction = _invoke_document(src, chunk_size, EXTRACT_PROMPT)
+    table.put_item(Item=encode_item({**key, 'data': extraction, 'pdf_bytes': size, 'pages': pages, 'created_at': datetime.utcnow().isoformat()}))
+    return extraction, False
+
+
+def _scoring_prompt(extraction, spend, history_ctx):
+    """Stage 2 prompt: score extracted credit buckets against live spend, with no document attached."""
+    terms = {'credit_buckets': extraction['credit_buckets'], 'commitment_summary': extraction['commitment_summary']}
+    return f"""You are an AWS PPA/EDP commitment tracking expert. The contract terms below were extracted from the customer's PPA/EDP document. Score each credit bucket against the customer's live AWS spend data.
+
+The spend data uses amortized cost, excluding tax/credits/refunds. Marketplace purchases are included.{history_ctx}
+
+LIVE AWS SPEND DATA:
+- YTD Spend: ${spend['ytd_spend']}
+- Current month by service: {json.dumps(spend['current_month_by_service'], indent=2)}
+
+CONTRACT TERMS:
+{json.dumps(terms, indent=1)}
+
+For each credit bucket, think through what-if scenarios: if the customer shifted or increased spend, would they unlock or improve credit qualification?
+
+Return a JSON object with one key, "recommendations" — array, one per credit bucket. Each has:
+- id: the credit bucket's id
+- title: credit program name
+- credit_type: the credit bucket's credit_type
+- workload: AWS services involved
+- usage_pattern: what the live spend data shows for relevant services
+- qualification: "qualified", "partially_qualified", or "not_qualified"
+- max_credit_value: maximum credit amount available (number, from the contract terms)
+- current_progress: estimated current progress toward qualification (number, dollar amount)
+- attestation_window: the credit bucket's attestation_window
+- potential_savings: estimated credit value achievable based on current trajectory (number)
+- confidence: "high", "medium", or "low"
+- reasoning: 2-3 sentences cross-referencing live spend against PPA requirements
+- what_if: object with:
+    - scenario: one sentence describing the change
+    - spend_change: object mapping service names to new monthly spend amounts
+    - new_qualification: resulting qualification status
+    - new_savings: estimated credit value after the change
+    - effort: "low", "medium", or "high"
+
+Return ONLY the JSON object, no other text."""
 
-        for att in attestations:
-            att_id = att.get('id', str(uuid.uuid4()))
-            table.put_item(Item={
-                'PK': f'ATTESTATION#{analysis_id}', 'SK': f'ATT#{att_id}',
-                'doc_id': doc_id, 'status': 'pending', 'created_at': now,
-                **{k: json.dumps(v) if isinstance(v, (list, dict)) else str(v) if isinstance(v, (int, float)) else v for k, v in att.items()}
-            })
 
-        # Store commitment summary
+# --- Content-addressed analysis cache ---
+def _query_all(**kwargs):
+    """Run a table query to completion, following LastEvaluatedKey."""
+    items = []
+    while True:
+        page = table.query(**kwargs)
+        items.extend(page['Items'])
+        if 'LastEvaluatedKey' not in page:
+            return items
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def _analysis_cache_key(pdf_sha256):
+    """Cache key over (pdf hash, model, prompt version, spend snapshot bucket)."""
+    spend_bucket = int(datetime.utcnow().timestamp() // SPEND_TTL)
+    return hashlib.sha256(f'{pdf_sha256}|{MODEL}|{PROMPT_VERSION}|{spend_bucket}'.encode()).hexdigest()
+
+
+def _count_cache(outcome, pdf_size):
+    table.update_item(Key={'PK': 'CACHE', 'SK': 'STATS'}, UpdateExpression='ADD #o :one, #b :b', ExpressionAttributeNames={'#o': outcome, '#b': f'{outcome}_pdf_bytes'}, ExpressionAttributeValues={':one': 1, ':b': pdf_size})
+
+
+def _clone_analysis(src_id, analysis_id, doc_id, pdf_sha256):
+    """Copy a cached analysis's REC#/COMMITMENT_SUMMARY items under a new analysis_id.
+
+    Attestations are rebuilt from the PDF's extraction rather than copied, so occurrences that recurrence
+    added to the source analysis, and its completions, do not come back as new pending reminders.
+    Returns (recommendations, attestations) counts, or None if the source items or the extraction are gone.
+    """
+    items = _query_all(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq(f'ANALYSIS#{src_id}'))
+    extraction = table.get_item(Key={'PK': f'EXTRACT#{pdf_sha256}', 'SK': f'{MODEL}#{EXTRACT_VERSION}'}).get('Item')
+    if not extraction or not any(i['SK'].startswith('REC#') for i in items):
+        return None
+
+    now = datetime.utcnow().isoformat()
+    clones = []
+    for item in items:
+        if item['SK'] == 'DOC':
+            continue
+        clone = {k: v for k, v in item.items() if k not in ('decision_notes', 'decided_at', 'filled_fields', 'notes', 'updated_at')}
+        clone['PK'] = f'ANALYSIS#{analysis_id}'
+        clone.update(doc_id=doc_id, created_at=now)
+        if 'status' in clone:
+            clone['status'] = 'pending'
+        clones.append(clone)
+    attestations = (decode_item(extraction).get('data') or {}).get('attestations') or []
+    clones += [_att_item(analysis_id, doc_id, att, now) for att in attestations]
+    _batch_put(clones)
+    return sum(c['SK'].startswith('REC#') for c in clones), len(attestations)
+
+
+def handle_cache_stats(event, context):
+    try:
+        stats = table.get_item(Key={'PK': 'CACHE', 'SK': 'STATS'}).get('Item', {})
+        hits, misses = int(stats.get('hit', 0)), int(stats.get('miss', 0))
+        return resp(200, {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+                          'bedrock_calls_avoided': hits, 'pdf_bytes_avoided': int(stats.get('hit_pdf_bytes', 0))})
+    except Exception as e:
+        return resp(500, {'error': str(e)})
+
+
+def _att_item(analysis_id, doc_id, att, now):
+    att_id = att.get('id', str(uuid.uuid4()))
+    item = encode_item({'PK': f'ATTESTATION#{analysis_id}', 'SK': f'ATT#{att_id}', 'doc_id': doc_id, 'status': 'pending', 'created_at': now, **att})
+    if item.get('next_due') and isinstance(item['next_due'], str):
+        item['due_status'] = 'pending'  # DueIndex is sparse: only pending attestations carry due_status
+    else:
+        item.pop('next_due', None)  # index key attributes must be non-empty strings
+    return item
+
+
+def _rec_item(analysis_id, doc_id, rec, now):
+    rec_id = rec.get('id', str(uuid.uuid4()))
+    return encode_item({'PK': f'ANALYSIS#{analysis_id}', 'SK': f'REC#{rec_id}', 'doc_id': doc_id, 'status': 'pending', 'created_at': now, **rec})
+
+
+# --- Analyze: worker (invoked async) ---
+def handle_analyze_worker(event, context):
+    try:
+        doc_id = event['doc_id']
+        s3_key = event['s3_key']
+        analysis_id = event['analysis_id']
+
+        _reset_peak_rss()
+
+        # Same PDF, model, prompts and spend snapshot as an earlier run: reuse it without calling Bedrock
+        spool, pdf_size, pdf_sha256 = _spool_pdf(s3_key)
+        cache_key = _analysis_cache_key(pdf_sha256)
+        cached = table.get_item(Key={'PK': f'CACHE#{cache_key}', 'SK': 'ANALYSIS'}).get('Item')
+        counts = _clone_analysis(cached['analysis_id'], analysis_id, doc_id, pdf_sha256) if cached else None
+        if counts:
+            spool.close()
+            _count_cache('hit', pdf_size)
+            peak_rss = _peak_rss_mb()
+            _set_status(doc_id, analysis_id, 'analyzed', pdf_sha256=pdf_sha256, pdf_bytes=pdf_size, peak_rss_mb=peak_rss, cache_hit=True)
+            _notify(analysis_id, {'type': 'complete', 'analysis_id': analysis_id})
+            return {'analysis_id': analysis_id, 'status': 'complete', 'recommendations': counts[0], 'attestations': counts[1], 'pdf_bytes': pdf_size, 'peak_rss_mb': peak_rss, 'cache_hit': True}
+
+        # Get live spend from Cost Explorer
+        spend = _get_spend_summary()
+
+        # Learning loop: aggregated decision feedback per credit type, a fixed-size summary however long the history
+        decisions = feedback.summary(_query_all(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('FEEDBACK')), time.time())
+        history_ctx = ''
+        if decisions:
+            history_ctx = f"""
+
+PAST USER DECISIONS by credit type (score +1 = always accepted, -1 = always rejected, recent decisions weigh most; prioritize credit types the user accepted, deprioritize rejected ones):
+{chr(10).join(decisions)}"""
+
+        # Stage 1: contract facts, extracted from the PDF once per document
+        extraction, extract_cached = _extract_contract(spool, pdf_size, pdf_sha256)
+
+        # Store contract facts first so GET /recommendations can show a partial analysis
+        now = datetime.utcnow().isoformat()
+        attestations = extraction['attestations']
+        commitment_summary = extraction['commitment_summary']
+
+        items = [_att_item(analysis_id, doc_id, att, now) for att in attestations]
         if commitment_summary:
-            table.put_item(Item={
+            items.append(encode_item({
                 'PK': f'ANALYSIS#{analysis_id}', 'SK': 'COMMITMENT_SUMMARY',
                 'doc_id': doc_id, 'created_at': now,
-                'data': json.dumps(commitment_summary)
-            })
+                'data': commitment_summary
+            }))
+        write_stats = _batch_put(items)
+
+        # Stage 2: spend-dependent scoring, a text-only call that never resends the PDF.
+        # Each recommendation is stored the moment its object closes in the response stream.
+        streamed = []
+        def store_rec(key, rec):
+            item = _rec_item(analysis_id, doc_id, rec, now)
+            table.put_item(Item=item)
+            streamed.append(rec)
+            _notify(analysis_id, {'type': 'rec', 'analysis_id': analysis_id, 'rec': decode_item(item)})
+
+        scored = _invoke_text(_scoring_prompt(extraction, spend, history_ctx), keys=('recommendations',), on_item=store_rec)
+        recommendations = scored if isinstance(scored, list) else scored.get('recommendations') or []
+        # Whole recommendations the stream did not emit (e.g. a non-object root); repair drops a cut-off last element
+        rest = [rec for rec in recommendations[len(streamed):] if isinstance(rec, dict) and rec]
+        if rest:
+            _batch_put([_rec_item(analysis_id, doc_id, rec, now) for rec in rest])
 
         # Update doc status
-        table.update_item(Key={'PK': 'DOC', 'SK': doc_id}, UpdateExpression='SET #s = :s, analysis_id = :a', ExpressionAttributeNames={'#s': 'status'}, ExpressionAttributeValues={':s': 'analyzed', ':a': analysis_id})
+        peak_rss = _peak_rss_mb()
+        _set_status(doc_id, analysis_id, 'analyzed', pdf_sha256=pdf_sha256, pdf_bytes=pdf_size, peak_rss_mb=peak_rss, cache_hit=False, write_items_per_sec=write_stats['items_per_sec'])
+        _notify(analysis_id, {'type': 'complete', 'analysis_id': analysis_id})
 
-        return {'analysis_id': analysis_id, 'status': 'complete', 'recommendations': len(recommendations), 'attestations': len(attestations)}
+        # Register this analysis as the cached result for the content hash
+        table.put_item(Item={'PK': f'CACHE#{cache_key}', 'SK': 'ANALYSIS', 'analysis_id': analysis_id, 'pdf_sha256': pdf_sha256, 'model': MODEL, 'prompt_version': PROMPT_VERSION, 'created_at': now})
+        _count_cache('miss', pdf_size)
+
+        return {'analysis_id': analysis_id, 'status': 'complete', 'recommendations': len(recommendations), 'attestations': len(attestations), 'pdf_bytes': pdf_size, 'peak_rss_mb': peak_rss, 'cache_hit': False, 'extract_cached': extract_cached, 'writes': write_stats}
     except Exception as e:
         # Mark doc as failed
         try:
-            if event.get('doc_id'):
-                table.update_item(Key={'PK': 'DOC', 'SK': event['doc_id']}, UpdateExpression='SET #s = :s, #e = :e', ExpressionAttributeNames={'#s': 'status', '#e': 'error'}, ExpressionAttributeValues={':s': 'error', ':e': str(e)[:500]})
+            if event.get('doc_id') and event.get('analysis_id'):
+                _set_status(event['doc_id'], event['analysis_id'], 'error', error=str(e)[:500])
+                _notify(event['analysis_id'], {'type': 'error', 'analysis_id': event['analysis_id'], 'error': str(e)[:500]})
         except: pass
         raise
 
@@ -303,45 +886,38 @@ Return ONLY the JSON object, no other text."""
 def handle_recommendations(event, context):
     try:
         params = event.get('queryStringParameters') or {}
-        analysis_id = params.get('analysis_id')
-
-        # If checking status of an analysis
+        analysis_id = params.get('analysis_id') or _latest_analysis_id()
         if not analysis_id:
-            docs = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('DOC'), ScanIndexForward=False)
-            analyzed = [d for d in docs['Items'] if d.get('analysis_id')]
-            if not analyzed:
-                return resp(200, {'recommendations': []})
-            doc = analyzed[-1]
-            analysis_id = doc['analysis_id']
-        else:
-            # Find the doc for this analysis
-            docs = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('DOC'))
-            doc = next((d for d in docs['Items'] if d.get('analysis_id') == analysis_id), {})
+            return resp(200, {'recommendations': []})
+
+        # Find the doc for this analysis
+        doc = table.get_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'DOC'}).get('Item', {})
 
         status = doc.get('status', 'unknown')
-        if status == 'processing':
-            return resp(200, {'status': 'processing', 'analysis_id': analysis_id})
         if status == 'error':
             return resp(200, {'status': 'error', 'error': doc.get('error', 'Analysis failed'), 'analysis_id': analysis_id})
 
-        result = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq(f'ANALYSIS#{analysis_id}') & boto3.dynamodb.conditions.Key('SK').begins_with('REC#'))
-        recs = result['Items']
-        # Parse JSON fields back
-        for r in recs:
-            for k in ('what_if', 'spend_change'):
-                if isinstance(r.get(k), str):
-                    try: r[k] = json.loads(r[k])
-                    except: pass
+        # The worker stores recommendations as they stream in, so a running analysis may already have some.
+        # min_savings filters server-side on the numeric potential_savings attribute.
+        query = {'KeyConditionExpression': boto3.dynamodb.conditions.Key('PK').eq(f'ANALYSIS#{analysis_id}') & boto3.dynamodb.conditions.Key('SK').begins_with('REC#')}
+        if params.get('min_savings'):
+            try:
+                min_savings = Decimal(params['min_savings'])
+            except ArithmeticError:
+                min_savings = None
+            if min_savings is None or not min_savings.is_finite():
+                return resp(400, {'error': 'min_savings must be a number'})
+            # Legacy items hold potential_savings as a string and never match; backfill_indexes.py --migrate-schema converts them
+            query['FilterExpression'] = boto3.dynamodb.conditions.Attr('potential_savings').attribute_type('N') & boto3.dynamodb.conditions.Attr('potential_savings').gte(min_savings)
+        recs = [decode_item(r) for r in _query_all(**query)]
+        if status == 'processing' and not recs and 'FilterExpression' not in query:
+            return resp(200, {'status': 'processing', 'analysis_id': analysis_id})
 
         # Get commitment summary if available
-        commitment = {}
-        try:
-            cs = table.get_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'COMMITMENT_SUMMARY'})
-            if 'Item' in cs:
-                commitment = json.loads(cs['Item'].get('data', '{}'))
-        except: pass
+        cs = table.get_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'COMMITMENT_SUMMARY'}).get('Item')
+        commitment = (decode_item(cs).get('data') or {}) if cs else {}
 
-        return resp(200, {'status': 'complete', 'analysis_id': analysis_id, 'recommendations': recs, 'commitment_summary': commitment})
+        return resp(200, {'status': 'partial' if status == 'processing' else 'complete', 'analysis_id': analysis_id, 'recommendations': recs, 'commitment_summary': commitment})
     except Exception as e:
         return resp(500, {'error': str(e)})
 
@@ -356,29 +932,199 @@ def handle_decision(event, context):
         notes = body.get('notes', '')
 
         # Update recommendation status
-        table.update_item(
+        rec = table.update_item(
             Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': f'REC#{rec_id}'},
             UpdateExpression='SET #s = :s, decision_notes = :n, decided_at = :d',
             ExpressionAttributeNames={'#s': 'status'},
-            ExpressionAttributeValues={':s': action, ':n': notes, ':d': datetime.utcnow().isoformat()}
-        )
+            ExpressionAttributeValues={':s': action, ':n': notes, ':d': datetime.utcnow().isoformat()},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+        credit_type = rec.get('credit_type') or rec.get('title') or 'unknown'
 
         # Log to history
         table.put_item(Item={
             'PK': 'HISTORY', 'SK': f'{datetime.utcnow().isoformat()}#{rec_id}',
-            'analysis_id': analysis_id, 'rec_id': rec_id, 'action': action, 'notes': notes
+            'analysis_id': analysis_id, 'rec_id': rec_id, 'action': action, 'notes': notes, 'credit_type': credit_type
         })
+        _record_feedback(credit_type, [(action, notes)])
 
         return resp(200, {'status': action, 'rec_id': rec_id})
     except Exception as e:
         return resp(500, {'error': str(e)})
 
 
+def _transact_decisions(analysis_id, chunk, now, attempts=4):
+    """Apply one chunk of decisions [(rec_id, action, notes, credit_type)] in a single transaction.
+
+    Returns {rec_id: error} for decisions that were not applied. A rec deleted since it was read fails its
+    condition and is dropped, and the rest is resubmitted without using an attempt; conflicts and throttling
+    back off and retry the chunk up to `attempts` times; any other error fails the chunk at once.
+    """
+    errors, code, attempt = {}, 'TransactionConflict', 0
+    while chunk and attempt < attempts:
+        ops = []
+        for rec_id, action, notes, credit_type in chunk:
+            ops.append({'Update': {'TableName': TABLE, 'Key': {'PK': f'ANALYSIS#{analysis_id}', 'SK': f'REC#{rec_id}'},
+                                   'UpdateExpression': 'SET #s = :s, decision_notes = :n, decided_at = :d', 'ConditionExpression': 'attribute_exists(PK)',
+                                   'ExpressionAttributeNames': {'#s': 'status'}, 'ExpressionAttributeValues': {':s': action, ':n': notes, ':d': now}}})
+            ops.append({'Put': {'TableName': TABLE, 'Item': {'PK': 'HISTORY', 'SK': f'{now}#{rec_id}', 'analysis_id': analysis_id, 'rec_id': rec_id,
+                                                             'action': action, 'notes': notes, 'credit_type': credit_type}}})
+        try:
+            ddb.meta.client.transact_write_items(TransactItems=ops)
+            return errors
+        except ddb.meta.client.exceptions.TransactionCanceledException as e:
+            codes = [r.get('Code') for r in e.response.get('CancellationReasons') or []]
+            missing = {chunk[i // 2][0] for i, c in enumerate(codes) if c == 'ConditionalCheckFailed'}
+            if missing:
+                errors.update(dict.fromkeys(missing, 'not_found'))
+                chunk = [d for d in chunk if d[0] not in missing]
+                continue  # the chunk shrank, so this terminates
+            code = next((c for c in codes if c not in (None, 'None')), code)
+        except ddb.meta.client.exceptions.ClientError as e:
+            code = e.response.get('Error', {}).get('Code', 'ClientError')
+        if code not in RETRYABLE_TRANSACTION_CODES:
+            break
+        time.sleep(min(0.05 * 2 ** attempt, 1) * random.uniform(0.5, 1))
+        attempt += 1
+    errors.update(dict.fromkeys((d[0] for d in chunk), code))
+    return errors
+
+
+def handle_decisions(event, context):
+    """POST /decisions {analysis_id, decisions: [{rec_id, action, notes?}]}: accept/reject many recommendations at once.
+
+    Each rec update and its history row are written together in TransactWriteItems chunks of
+    DECISIONS_PER_TRANSACTION. Returns one result per decision, in request order.
+    """
+    try:
+        body = json.loads(event.get('body') or '{}')
+        analysis_id, decisions = body.get('analysis_id'), body.get('decisions')
+        if not analysis_id or not isinstance(decisions, list) or not 0 < len(decisions) <= DECISIONS_MAX:
+            return resp(400, {'error': f'analysis_id and 1 to {DECISIONS_MAX} decisions are required'})
+
+        errors, valid, index = {}, [], {}
+        for i, d in enumerate(decisions):
+            rec_id = d.get('rec_id') if isinstance(d, dict) else None
+            if not isinstance(rec_id, str) or not rec_id or d.get('action') not in DECISION_ACTIONS:
+                errors[i] = 'rec_id and an action of accepted or rejected are required'
+            elif rec_id in index:
+                errors[i] = 'duplicate rec_id'  # a transaction cannot touch the same item twice
+            else:
+                valid.append(i)
+                index[rec_id] = i
+
+        # One BatchGetItem: which recs exist, and their credit types for the feedback aggregates
+        keys = [{'PK': f'ANALYSIS#{analysis_id}', 'SK': f'REC#{decisions[i]["rec_id"]}'} for i in valid]
+        found = _batch_get(keys, ProjectionExpression='SK, credit_type, #t', ExpressionAttributeNames={'#t': 'title'}) if keys else []
+        recs = {r['SK'][len('REC#'):]: r.get('credit_type') or r.get('title') or 'unknown' for r in found}
+        todo = []
+        for i in valid:
+            d = decisions[i]
+            if d['rec_id'] in recs:
+                todo.append((d['rec_id'], d['action'], d.get('notes', ''), recs[d['rec_id']]))
+            else:
+                errors[i] = 'not_found'
+
+        now = datetime.utcnow().isoformat()
+        failed = {}
+        for lo in range(0, len(todo), DECISIONS_PER_TRANSACTION):
+            failed.update(_transact_decisions(analysis_id, todo[lo:lo + DECISIONS_PER_TRANSACTION], now))
+
+        applied = {}
+        for rec_id, action, notes, credit_type in todo:
+            if rec_id not in failed:
+                applied.setdefault(credit_type, []).append((action, notes))
+        for credit_type, decided in applied.items():
+            _record_feedback(credit_type, decided)
+
+        errors.update({index[rec_id]: e for rec_id, e in failed.items()})
+        results = [{'rec_id': d.get('rec_id') if isinstance(d, dict) else None, 'error': errors[i]} if i in errors
+                   else {'rec_id': d['rec_id'], 'status': d['action']} for i, d in enumerate(decisions)]
+        return resp(200, {'analysis_id': analysis_id, 'applied': len(decisions) - len(errors), 'failed': len(errors), 'results': results})
+    except json.JSONDecodeError:
+        return resp(400, {'error': 'body must be JSON'})
+    except Exception as e:
+        return resp(500, {'error': str(e)})
+
+
+def _record_feedback(credit_type, decisions):
+    """Fold decisions [(action, notes)] on one credit type into its FEEDBACK item: counts, growth-form weights (see feedback.weight) and recent notes."""
+    decisions = [(a, n) for a, n in decisions if a in DECISION_ACTIONS]
+    if not decisions:
+        return
+    key = {'PK': 'FEEDBACK', 'SK': f'TYPE#{credit_type}'}
+    w = Decimal(f'{feedback.weight(time.time()):.12g}')
+    expr, names, values, adds = 'SET credit_type = :t, updated_at = :u', {}, {':t': credit_type, ':u': datetime.utcnow().isoformat()}, []
+    for action in DECISION_ACTIONS:
+        n = sum(a == action for a, _ in decisions)
+        if n:
+            names.update({f'#{action}_c': f'{action}_count', f'#{action}_w': f'{action}_weight'})
+            values.update({f':{action}_c': n, f':{action}_w': w * n})
+            adds.append(f'#{action}_c :{action}_c, #{action}_w :{action}_w')
+    notes = [feedback.note(n) for a, n in reversed(decisions) if a == 'rejected' and feedback.note(n)]
+    if notes:
+        expr += ', recent_notes = list_append(:notes, if_not_exists(recent_notes, :empty))'
+        values.update({':notes': notes[:feedback.RECENT_NOTES], ':empty': []})
+    new = table.update_item(Key=key, UpdateExpression=f'{expr} ADD {", ".join(adds)}', ExpressionAttributeNames=names,
+                            ExpressionAttributeValues=values, ReturnValues='UPDATED_NEW')['Attributes']
+    # Newest notes come first; trim the tail once it is twice the kept length, so the item stays bounded
+    kept = len(new.get('recent_notes') or [])
+    if kept > 2 * feedback.RECENT_NOTES:
+        table.update_item(Key=key, UpdateExpression='REMOVE ' + ', '.join(f'recent_notes[{i}]' for i in range(feedback.RECENT_NOTES, kept)))
+
+
 # --- Get History ---
+HISTORY_PAGE = 25
+HISTORY_MAX_PAGE = 100
+
+
+def _encode_token(key):
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode() if key else None
+
+
+def _decode_token(token, pk):
+    """ExclusiveStartKey from a next_token; ValueError unless it is a {PK: pk, SK: str} key."""
+    if not token:
+        return None
+    key = json.loads(base64.urlsafe_b64decode(token.encode()))
+    if not isinstance(key, dict) or set(key) != {'PK', 'SK'} or key['PK'] != pk or not isinstance(key['SK'], str):
+        raise ValueError('next_token is not a key of this query')
+    return key
+
+
 def handle_history(event, context):
+    """Newest-first decision history, one page at a time.
+
+    Query params: limit (default 25, max 100), next_token (from the previous page), and
+    from/to ISO timestamp prefixes (inclusive, e.g. from=2026-01-01&to=2026-03-31) matched against the SK.
+    """
     try:
-        result = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('HISTORY'), ScanIndexForward=False)
-        return resp(200, {'history': result['Items']})
+        params = event.get('queryStringParameters') or {}
+        Key = boto3.dynamodb.conditions.Key
+        try:
+            limit = min(max(int(params.get('limit') or HISTORY_PAGE), 1), HISTORY_MAX_PAGE)
+            start_key = _decode_token(params.get('next_token'), 'HISTORY')
+        except ValueError:
+            return resp(400, {'error': 'Invalid limit or next_token'})
+        # SK is '<iso timestamp>#<rec_id>', so a timestamp prefix bounds it; '\uffff' makes `to` inclusive of that whole prefix
+        lo, hi = params.get('from'), params.get('to') and params['to'] + '\uffff'
+        if lo and hi and lo > hi:
+            return resp(400, {'error': 'from must not be after to'})
+
+        cond = Key('PK').eq('HISTORY')
+        if lo and hi:
+            cond &= Key('SK').between(lo, hi)
+        elif lo:
+            cond &= Key('SK').gte(lo)
+        elif hi:
+            cond &= Key('SK').lte(hi)
+
+        query = {'KeyConditionExpression': cond, 'ScanIndexForward': False, 'Limit': limit,
+                 'ProjectionExpression': 'SK, rec_id, analysis_id, #a', 'ExpressionAttributeNames': {'#a': 'action'}}
+        if start_key:
+            query['ExclusiveStartKey'] = start_key
+        result = table.query(**query)
+        return resp(200, {'history': result['Items'], 'next_token': _encode_token(result.get('LastEvaluatedKey'))})
     except Exception as e:
         return resp(500, {'error': str(e)})
 
@@ -428,25 +1174,18 @@ def handle_attestations(event, context):
         params = event.get('queryStringParameters') or {}
 
         if method == 'GET':
-            analysis_id = params.get('analysis_id')
+            analysis_id = params.get('analysis_id') or _latest_analysis_id()
             if not analysis_id:
-                docs = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq('DOC'), ScanIndexForward=False)
-                analyzed = [d for d in docs['Items'] if d.get('analysis_id')]
-                if not analyzed:
-                    return resp(200, {'attestations': []})
-                analysis_id = analyzed[-1]['analysis_id']
+                return resp(200, {'attestations': []})
 
             result = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq(f'ATTESTATION#{analysis_id}') & boto3.dynamodb.conditions.Key('SK').begins_with('ATT#'))
-            atts = result['Items']
+            atts = [decode_item(a) for a in result['Items']]
 
             # Fetch live spend for auto-population
             spend = _get_spend_summary()
+            by_key = service_resolver.index(spend.get('current_month_by_service', {}))
 
             for a in atts:
-                for k in ('fields',):
-                    if isinstance(a.get(k), str):
-                        try: a[k] = json.loads(a[k])
-                        except: pass
                 # Auto-populate fields with auto_source
                 for f in (a.get('fields') or []):
                     src = f.get('auto_source')
@@ -457,9 +1196,8 @@ def handle_attestations(event, context):
                     elif src == 'ce_service_count':
                         f['auto_value'] = len(spend.get('current_month_by_service', {}))
                     elif src.startswith('ce_service:'):
-                        svc_name = src.split(':', 1)[1]
-                        svcs = spend.get('current_month_by_service', {})
-                        f['auto_value'] = next((v for k, v in svcs.items() if svc_name.lower() in k.lower()), '')
+                        cost = by_key.get(service_resolver.resolve(src.split(':', 1)[1]))
+                        f['auto_value'] = '' if cost is None else round(cost, 2)
 
             return resp(200, {'attestations': atts, 'analysis_id': analysis_id})
 
@@ -475,12 +1213,15 @@ def handle_attestations(event, context):
 
         if body.get('filled_fields'):
             update_expr += ', filled_fields = :f'
-            expr_vals[':f'] = json.dumps(body['filled_fields'])
+            expr_vals[':f'] = to_dynamo(body['filled_fields'])
 
         if body.get('notes'):
             update_expr += ', notes = :n'
             expr_vals[':n'] = body['notes']
 
+        # No longer pending, so drop it from DueIndex
+        update_expr += ' REMOVE due_status'
+
         table.update_item(
             Key={'PK': f'ATTESTATION#{analysis_id}', 'SK': f'ATT#{att_id}'},
             UpdateExpression=update_expr,
@@ -512,6 +1253,7 @@ def handle_attestations(event, context):
                         new_item['id'] = new_id
                         new_item['next_due'] = next_due
                         new_item['status'] = 'pending'
+                        new_item['due_status'] = 'pending'
                         new_item['created_at'] = datetime.utcnow().isoformat()
                         table.put_item(Item=new_item)
 
@@ -524,13 +1266,12 @@ def handle_attestations(event, context):
 def handle_reminder(event, context):
     try:
         now = datetime.utcnow()
-        week_from_now = (now.replace(day=now.day) + __import__('datetime').timedelta(days=7)).strftime('%Y-%m-%d')
+        week_from_now = (now + timedelta(days=7)).strftime('%Y-%m-%d')
         today_str = now.strftime('%Y-%m-%d')
 
-        # Scan for pending attestations — small table so scan is fine
-        result = table.scan(FilterExpression=boto3.dynamodb.conditions.Attr('PK').begins_with('ATTESTATION#') & boto3.dynamodb.conditions.Attr('status').eq('pending'))
-
-        due_soon = [a for a in result['Items'] if a.get('next_due', '') <= week_from_now and a.get('next_due', '') >= today_str]
+        # Pending attestations due in [today, today+7] straight from the sparse DueIndex
+        Key = boto3.dynamodb.conditions.Key
+        due_soon = _query_all(IndexName='DueIndex', KeyConditionExpression=Key('due_status').eq('pending') & Key('next_due').between(today_str, week_from_now))
         if not due_soon:
             return {'sent': 0}
 
@@ -558,54 +1299,146 @@ def handle_reminder(event, context):
 
 
 # --- Live Spend Data from Cost Explorer ---
+def _coupling(r):
+    c = CREDIT_OFFERINGS[r['credit_name']]
+    return {'credit_name': r['credit_name'], 'discount': c['discount'], 'status': r['status'], 'matched_spend': round(r['matched_spend'], 2),
+            'min_spend': c['min_spend'], 'potential_savings': round(r['potential_savings'], 2), 'matched_services': r['matched_services']}
+
+
+def _org_spend():
+    """/spend?scope=org: current month per linked account, with credit coupling per account and for the whole org."""
+    org = _get_org_cube()
+    cube = org['cube']
+    per_account = credit_engine.evaluate_accounts(cube)
+    accounts = sorted(({'account_id': a, 'name': org['accounts'].get(a, ''), 'total': round(sum(svcs.values()), 2), 'services': svcs,
+                        'credit_couplings': [{k: round(v, 2) if isinstance(v, float) else v for k, v in r.items()} for r in per_account[a]]}
+                       for a, svcs in cube.items()), key=lambda x: -x['total'])
+    services = spend_cube.merge(cube)
+    return resp(200, {'scope': 'org', 'period': datetime.utcnow().strftime('%Y-%m'), 'accounts': accounts, 'total_spend': round(sum(services.values()), 2),
+                      'current_month_services': services, 'credit_couplings': [_coupling(r) for r in credit_engine.evaluate(services)], 'ce_calls': org['calls']})
+
+
 def handle_spend(event, context):
     try:
-        ce = boto3.client('ce', region_name='us-east-1')
-        now = datetime.utcnow()
-        year_start = f'{now.year}-01-01'
-        today = now.strftime('%Y-%m-%d')
-        month_start = f'{now.year}-{now.month:02d}-01'
+        if (event.get('queryStringParameters') or {}).get('scope') == 'org':
+            return _org_spend()
+        daily = _get_daily_spend()
+        snapshot = _monthly_spend(daily)
+        months = [{'period': p, 'spend': snapshot[p]['total']} for p in sorted(snapshot)]
+        total_spend = sum(m['spend'] for m in months)
+        services = snapshot.get(datetime.utcnow().strftime('%Y-%m'), {}).get('services', {})
 
-        # Exclude tax, credits, refunds — amortized cost (PPA standard)
-        ce_filter = {'Not': {'Dimensions': {'Key': 'RECORD_TYPE', 'Values': ['Credit', 'Refund', 'Tax']}}}
+        # Credit coupling analysis against services
+        couplings = [_coupling(r) for r in credit_engine.evaluate(services)]
 
-        # Monthly spend breakdown for the year
-        monthly = ce.get_cost_and_usage(
-            TimePeriod={'Start': year_start, 'End': today},
-            Granularity='MONTHLY', Metrics=['AmortizedCost'], Filter=ce_filter
-        )
-        months = [{'period': r['TimePeriod']['Start'][:7], 'spend': float(r['Total']['AmortizedCost']['Amount'])} for r in monthly['ResultsByTime']]
-        total_spend = sum(m['spend'] for m in months)
+        daily_series = [{'date': d, 'spend': round(sum(daily[d].values()), 2)} for d in sorted(daily)]
+        return resp(200, {'months': months, 'total_spend_ytd': round(total_spend, 2), 'daily': daily_series, 'current_month_services': services, 'credit_couplings': couplings})
+    except Exception as e:
+        return resp(500, {'error': str(e)})
 
-        # Spend by service (current month)
-        by_service = ce.get_cost_and_usage(
-            TimePeriod={'Start': month_start, 'End': today},
-            Granularity='MONTHLY', Metrics=['AmortizedCost'], Filter=ce_filter,
-            GroupBy=[{'Type': 'DIMENSION', 'Key': 'SERVICE'}]
-        )
-        services = {}
-        for r in by_service['ResultsByTime']:
-            for g in r['Groups']:
-                cost = float(g['Metrics']['AmortizedCost']['Amount'])
-                if cost > 0.01:
-                    services[g['Keys'][0]] = round(cost, 2)
 
-        # Credit coupling analysis against services
-        credit_offerings = {
-            'Generative AI Credit': {'discount': '25%', 'primary': ['SageMaker', 'Bedrock', 'Lambda'], 'supporting': ['EC2', 'S3'], 'min_spend': 1000},
-            'Graviton Optimization Credit': {'discount': '31%', 'primary': ['EC2'], 'supporting': ['RDS', 'ElastiCache'], 'min_spend': 500},
-            'Data Analytics Credit': {'discount': '22%', 'primary': ['Redshift', 'EMR', 'Glue'], 'supporting': ['S3', 'Kinesis'], 'min_spend': 800},
-            'Serverless Credit': {'discount': '18%', 'primary': ['Lambda', 'API Gateway'], 'supporting': ['DynamoDB', 'S3'], 'min_spend': 300},
-        }
-        couplings = []
-        for name, c in credit_offerings.items():
-            matched = {svc: cost for svc, cost in services.items() if any(p.lower() in svc.lower() for p in c['primary'] + c['supporting'])}
-            matched_spend = sum(matched.values())
-            has_primary = any(any(p.lower() in svc.lower() for p in c['primary']) for svc in services)
-            status = 'qualified' if has_primary and matched_spend >= c['min_spend'] else 'partially_qualified' if has_primary else 'opportunity'
-            disc = float(c['discount'].rstrip('%')) / 100
-            couplings.append({'credit_name': name, 'discount': c['discount'], 'status': status, 'matched_spend': round(matched_spend, 2), 'min_spend': c['min_spend'], 'potential_savings': round(matched_spend * disc, 2), 'matched_services': matched})
-
-        return resp(200, {'months': months, 'total_spend_ytd': round(total_spend, 2), 'current_month_services': services, 'credit_couplings': couplings})
+# --- Commitment forecast: trend fit on daily spend plus Monte Carlo what-if ---
+def _spend_changes(body, max_count):
+    """spend_change and scenarios[] from a request body -> [{service: new monthly spend}], or None if malformed."""
+    raw = ([body['spend_change']] if body.get('spend_change') else []) + list(body.get('scenarios') or [])
+    if len(raw) > max_count or not all(isinstance(sc, dict) for sc in raw):
+        return None
+    try:
+        out = [{str(k): float(v) for k, v in sc.items()} for sc in raw]
+    except (TypeError, ValueError):
+        return None
+    return out if all(math.isfinite(v) and v >= 0 for sc in out for v in sc.values()) else None
+
+
+def _history_since(today):
+    """A year of daily history covers the forecast fit window and the current contract year, within CE's daily retention."""
+    return today.replace(year=today.year - 1, day=1)
+
+
+def _credit_buckets(lookup):
+    """Extracted credit buckets (qualifying_services, spend_threshold, threshold_period) behind an analysis lookup item."""
+    if not (lookup or {}).get('pdf_sha256'):
+        return []
+    item = table.get_item(Key={'PK': f'EXTRACT#{lookup["pdf_sha256"]}', 'SK': f'{MODEL}#{EXTRACT_VERSION}'}).get('Item')
+    return ((decode_item(item).get('data') or {}).get('credit_buckets') or []) if item else []
+
+
+def handle_forecast(event, context):
+    """POST /forecast {analysis_id?, spend_change?, scenarios?, simulations?, seed?}: shortfall probabilities per commitment year and credit bucket."""
+    try:
+        body = json.loads(event.get('body') or '{}')
+        analysis_id = body.get('analysis_id') or _latest_analysis_id()
+        if not analysis_id:
+            return resp(404, {'error': 'no analysis yet'})
+        sims = body.get('simulations', FORECAST_SIMULATIONS)
+        if not isinstance(sims, int) or not 100 <= sims <= FORECAST_MAX_SIMULATIONS:
+            return resp(400, {'error': f'simulations must be an integer between 100 and {FORECAST_MAX_SIMULATIONS}'})
+        if not isinstance(body.get('seed', 0), int):
+            return resp(400, {'error': 'seed must be an integer'})
+        scenarios = _spend_changes(body, FORECAST_MAX_SCENARIOS)
+        if scenarios is None:
+            return resp(400, {'error': f'spend_change/scenarios must be up to {FORECAST_MAX_SCENARIOS} maps of service name to a non-negative monthly spend'})
+
+        lookup = table.get_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'DOC'}).get('Item')
+        cs = table.get_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'COMMITMENT_SUMMARY'}).get('Item')
+        commitment = (decode_item(cs).get('data') or {}) if cs else {}
+        today = datetime.utcnow().date()
+        daily = _get_daily_spend(since=_history_since(today))
+
+        started = time.perf_counter()
+        result = forecast.project(daily, commitment, _credit_buckets(lookup), today, scenarios, sims, body.get('seed'))
+        return resp(200, {'analysis_id': analysis_id, **result, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)})
+    except json.JSONDecodeError:
+        return resp(400, {'error': 'body must be JSON'})
+    except Exception as e:
+        return resp(500, {'error': str(e)})
+
+
+# --- What-if: exact credit and commitment outcomes for spend_change maps ---
+def handle_what_if(event, context):
+    """POST /what-if {analysis_id?, spend_change?, scenarios?}: evaluate spend_change maps against the credit rules locally.
+
+    Credits are the analysis's extracted credit buckets (what_if.bucket_rules: credit_buckets rows whose
+    credit_value is the contract credit earned, the unit of the model's new_savings), or CREDIT_OFFERINGS
+    when it has none (credit_couplings rows with monthly potential_savings); credit_rules says which.
+    With no spend_change/scenarios, evaluates every recommendation's what_if.spend_change for the analysis
+    and returns the model's new_qualification/new_savings alongside the computed outcome.
+    """
+    try:
+        body = json.loads(event.get('body') or '{}')
+        scenarios = _spend_changes(body, WHAT_IF_MAX_SCENARIOS)
+        if scenarios is None:
+            return resp(400, {'error': f'spend_change/scenarios must be up to {WHAT_IF_MAX_SCENARIOS} maps of service name to a non-negative monthly spend'})
+        analysis_id = body.get('analysis_id') or _latest_analysis_id()
+        recs = []
+        if not scenarios:
+            if not analysis_id:
+                return resp(404, {'error': 'no analysis yet'})
+            items = _query_all(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq(f'ANALYSIS#{analysis_id}') & boto3.dynamodb.conditions.Key('SK').begins_with('REC#'))
+            for r in map(decode_item, items):
+                change = _spend_changes({'spend_change': (r.get('what_if') or {}).get('spend_change')}, 1)
+                if change:  # skip recommendations without a usable spend_change
+                    recs.append(r)
+                    scenarios.append(change[0])
+
+        commitment, buckets = {}, []
+        if analysis_id:
+            cs = table.get_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'COMMITMENT_SUMMARY'}).get('Item')
+            commitment = (decode_item(cs).get('data') or {}) if cs else {}
+            buckets = _credit_buckets(table.get_item(Key={'PK': f'ANALYSIS#{analysis_id}', 'SK': 'DOC'}).get('Item'))
+        today = datetime.utcnow().date()
+        daily = _get_daily_spend(since=_history_since(today))
+
+        started = time.perf_counter()
+        # The contract's own credit buckets when it has any; the generic offerings otherwise
+        rules = what_if.bucket_rules(buckets, commitment)
+        result = what_if.evaluate(credit_engine, daily, commitment, today, scenarios, rules)
+        result['credit_rules'] = 'credit_buckets' if rules else 'offerings'
+        for r, sc in zip(recs, result['scenarios']):
+            w = r.get('what_if') or {}
+            sc.update({'recommendation_id': r.get('id'), 'model_estimate': {'new_qualification': w.get('new_qualification'), 'new_savings': w.get('new_savings')}})
+        return resp(200, {'analysis_id': analysis_id, **result, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)})
+    except json.JSONDecodeError:
+        return resp(400, {'error': 'body must be JSON'})
     except Exception as e:
         return resp(500, {'error': str(e)})
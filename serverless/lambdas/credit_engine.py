@@ -0,0 +1,146 @@
+"""Credit-coupling evaluation compiled to a service x credit membership matrix"""
+from functools import lru_cache
+
+from service_resolver import resolve as service_key
+
+try:  # optional: vectorized evaluation (package numpy with the lambdas to use it)
+    import numpy as np
+except ImportError:
+    np = None
+
+STATUSES = ('opportunity', 'partially_qualified', 'qualified')
+
+
+class CreditEngine:
+    """Evaluates credit offerings against billed CE services.
+
+    offerings: {name: {'discount': '25%', 'primary': [...], 'supporting': [...], 'min_spend': n, ...}}, where
+    primary/supporting entries are service names or aliases. Requirements and billed CE service names are
+    both resolved through service_resolver, so a billed service satisfies a requirement exactly when they
+    name the same canonical service; each billed name is resolved once per process. Evaluating
+    then costs one matrix product per batch of accounts: spend (accounts x services) against
+    membership (services x credits). evaluate() handles one account with per-credit detail over the
+    precomputed index lists; evaluate_accounts()/evaluate_matrix() batch accounts through numpy when it is
+    packaged, and fall back to evaluate() per account otherwise.
+    """
+
+    def __init__(self, offerings):
+        self.names = list(offerings)
+        self.offerings = [offerings[n] for n in self.names]
+        self.vocab = sorted({service_key(p) for c in self.offerings for p in c['primary'] + c['supporting']})
+        self._ids = ids = {k: i for i, k in enumerate(self.vocab)}
+        self.primary = [frozenset(ids[service_key(p)] for p in c['primary']) for c in self.offerings]
+        self.anyreq = [frozenset(ids[service_key(p)] for p in c['primary'] + c['supporting']) for c in self.offerings]
+        self.min_spend = [float(c['min_spend']) for c in self.offerings]
+        self.discount = [float(str(c['discount']).rstrip('%')) / 100 for c in self.offerings]
+        self._resolve = lru_cache(maxsize=None)(self.resolve)
+        self._membership = lru_cache(maxsize=64)(self._membership_uncached)
+        if np is not None:
+            P = np.zeros((len(self.vocab), len(self.names)), dtype=np.float64)
+            A = np.zeros_like(P)
+            for c, (prim, req) in enumerate(zip(self.primary, self.anyreq)):
+                P[list(prim), c] = 1
+                A[list(req), c] = 1
+            self._P, self._A = P, A
+            self._min = np.array(self.min_spend)
+            self._disc = np.array(self.discount)
+
+    def resolve(self, service):
+        """Vocabulary ids a billed CE service name satisfies: its canonical service, if any credit requires it."""
+        i = self._ids.get(service_key(service))
+        return frozenset() if i is None else frozenset((i,))
+
+    def _membership_uncached(self, services):
+        # services x vocabulary, then services x credits: does the service count toward / is it primary for the credit
+        R = np.zeros((len(services), len(self.vocab)), dtype=np.float64)
+        for j, s in enumerate(services):
+            R[j, list(self._resolve(s))] = 1
+        return (R @ self._A) > 0, (R @ self._P) > 0
+
+    def evaluate_matrix(self, services, spend):
+        """Vectorized core. services: S billed names; spend: accounts x S array (0 where not billed).
+
+        Returns dict of accounts x credits arrays: matched_spend, has_primary (bool), status (index into
+        STATUSES) and potential_savings. Requires numpy.
+        """
+        in_credit, is_primary = self._membership(tuple(services))
+        spend = np.asarray(spend, dtype=np.float64).reshape(-1, len(services)) if services else np.zeros((len(spend), 0))
+        matched = spend @ in_credit
+        has_primary = ((spend != 0) @ is_primary) > 0
+        status = np.where(has_primary, np.where(matched >= self._min, 2, 1), 0)
+        return {'matched_spend': matched, 'has_primary': has_primary, 'status': status, 'potential_savings': matched * self._disc}
+
+    def evaluate(self, services):
+        """One account: {billed service: cost} -> one result dict per credit offering, in definition order."""
+        names = tuple(services)
+        by_id = {}  # vocabulary id -> positions of the billed services resolving to it, in billing order
+        for j, s in enumerate(names):
+            for i in self._resolve(s):
+                by_id.setdefault(i, []).append(j)
+        pick = lambda ids: {names[j]: services[names[j]] for j in sorted(j for i in ids for j in by_id.get(i, ()))}
+        results = []
+        for c, name in enumerate(self.names):
+            req, prim = self.anyreq[c], self.primary[c]
+            matched = pick(req)
+            matched_spend = sum(matched.values())
+            primary_matched = pick(prim)
+            has_primary = any(primary_matched.values())
+            results.append({
+                'credit_name': name, 'status': STATUSES[2 if has_primary and matched_spend >= self.min_spend[c] else 1 if has_primary else 0],
+                'matched_spend': matched_spend, 'has_primary': has_primary, 'potential_savings': matched_spend * self.discount[c],
+                'matched_services': matched,
+                'primary_matched': primary_matched,
+                'supporting_matched': pick(req - prim),
+                'missing_primary': [p for p in self.offerings[c]['primary'] if self._ids[service_key(p)] not in by_id],
+                'missing_supporting': [p for p in self.offerings[c]['supporting'] if self._ids[service_key(p)] not in by_id],
+            })
+        return results
+
+    def evaluate_keys(self, rows):
+        """Batch over canonical spend: [{canonical service key: cost}] -> per row [{credit_name, status, matched_spend, potential_savings}].
+
+        Skips name resolution entirely; keys outside the vocabulary count toward no credit. With numpy the
+        rows become one rows x vocabulary array multiplied against the membership matrices.
+        """
+        if np is None:
+            out = []
+            for row in rows:
+                spend = {self._ids[k]: c for k, c in row.items() if k in self._ids}
+                results = []
+                for c, name in enumerate(self.names):
+                    matched = sum(spend.get(i, 0.0) for i in self.anyreq[c])
+                    has_primary = any(spend.get(i) for i in self.primary[c])
+                    results.append({'credit_name': name, 'status': STATUSES[2 if has_primary and matched >= self.min_spend[c] else 1 if has_primary else 0],
+                                    'matched_spend': matched, 'potential_savings': matched * self.discount[c]})
+                out.append(results)
+            return out
+        spend = np.zeros((len(rows), len(self.vocab)))
+        for r, row in enumerate(rows):
+            for k, c in row.items():
+                i = self._ids.get(k)
+                if i is not None:
+                    spend[r, i] += c
+        matched = spend @ self._A
+        status = np.where(((spend != 0) @ self._P) > 0, np.where(matched >= self._min, 2, 1), 0)
+        savings = matched * self._disc
+        return [[{'credit_name': n, 'status': STATUSES[status[r, c]], 'matched_spend': float(matched[r, c]), 'potential_savings': float(savings[r, c])}
+                 for c, n in enumerate(self.names)] for r in range(len(rows))]
+
+    def evaluate_accounts(self, accounts):
+        """Many accounts: {account: {billed service: cost}} -> {account: [{credit_name, status, matched_spend, potential_savings}]}.
+
+        With numpy this is a single evaluate_matrix call over the union of billed services.
+        """
+        if np is None:
+            return {a: [{k: r[k] for k in ('credit_name', 'status', 'matched_spend', 'potential_savings')} for r in self.evaluate(svcs)]
+                    for a, svcs in accounts.items()}
+        names = tuple(sorted({s for svcs in accounts.values() for s in svcs}))
+        col = {s: j for j, s in enumerate(names)}
+        spend = np.zeros((len(accounts), len(names)))
+        for i, svcs in enumerate(accounts.values()):
+            for s, cost in svcs.items():
+                spend[i, col[s]] = cost
+        m = self.evaluate_matrix(names, spend)
+        return {a: [{'credit_name': n, 'status': STATUSES[m['status'][i, c]], 'matched_spend': float(m['matched_spend'][i, c]), 'potential_savings': float(m['potential_savings'][i, c])}
+                    for c, n in enumerate(self.names)]
+                for i, a in enumerate(accounts)}
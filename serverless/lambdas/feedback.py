@@ -0,0 +1,51 @@
+"""Decision feedback aggregated per credit type: counts, decayed acceptance scores and recent rejection notes"""
+
+EPOCH = 1704067200       # 2024-01-01T00:00:00Z, origin of the growth-form weights
+HALF_LIFE_DAYS = 90      # a decision counts half as much after this many days
+RECENT_NOTES = 5         # rejection notes kept per credit type
+NOTE_CHARS = 160         # stored note length
+PROMPT_TYPES = 8         # credit types in the prompt summary, by decayed weight
+PROMPT_NOTES = 2         # rejection notes per credit type in the prompt
+PROMPT_NOTE_CHARS = 80
+
+
+def weight(ts):
+    """A decision's weight at epoch time ts, in growth form: 2 ** (half-lives since EPOCH).
+
+    Decisions ADD their weight to a running sum; dividing the sum by weight(now) gives the exponentially
+    decayed total. So each update is one atomic ADD with no read, and the decay is applied when reading.
+    """
+    return 2 ** ((ts - EPOCH) / 86400 / HALF_LIFE_DAYS)
+
+
+def scores(item, now):
+    """(decayed accepted weight, decayed rejected weight, score in [-1, 1]) of a FEEDBACK item at epoch time now."""
+    scale = weight(now)
+    acc, rej = float(item.get('accepted_weight', 0)) / scale, float(item.get('rejected_weight', 0)) / scale
+    return acc, rej, (acc - rej) / (acc + rej) if acc + rej > 0 else 0.0
+
+
+def _clip(text, n):
+    text = ' '.join(str(text).split())
+    return text if len(text) <= n else text[:n - 1] + '…'
+
+
+def summary(items, now):
+    """Prompt lines for the PROMPT_TYPES credit types with the most decayed weight; its size does not grow with history."""
+    ranked = sorted(((scores(i, now), i) for i in items), key=lambda r: -(r[0][0] + r[0][1]))
+    lines = []
+    for (acc, rej, score), i in ranked[:PROMPT_TYPES]:
+        if acc + rej < 1e-3:
+            continue  # nothing decided for about two and a half years
+        notes = '; '.join(f'"{_clip(n, PROMPT_NOTE_CHARS)}"' for n in (i.get('recent_notes') or [])[:PROMPT_NOTES])
+        lines.append(f"- {_clip(i.get('credit_type', ''), 60)}: {int(i.get('accepted_count', 0))} accepted / {int(i.get('rejected_count', 0))} rejected, "
+                     f"recent-weighted score {score:+.2f}" + (f", recent rejection notes: {notes}" if notes else ''))
+    if len(ranked) > PROMPT_TYPES:
+        lines.append(f'- ({len(ranked) - PROMPT_TYPES} more credit types with less recent feedback)')
+    return lines
+
+
+def note(notes):
+    """Stored form of a rejection note, or None if empty."""
+    return _clip(notes, NOTE_CHARS) if notes and str(notes).strip() else None
+
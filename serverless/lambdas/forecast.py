@@ -0,0 +1,236 @@
+"""Commitment trajectory forecasting: a trend + weekday fit on daily spend, projected by Monte Carlo simulation"""
+import math
+from bisect import bisect_left
+from datetime import date, timedelta
+from statistics import NormalDist, fmean, pstdev
+
+from schema import number
+from service_resolver import resolve as service_key
+
+try:  # optional: Monte Carlo over the fitted model (package numpy with the lambdas); without it, a run-rate normal approximation
+    import numpy as np
+except ImportError:
+    np = None
+
+HISTORY_DAYS = 365
+MIN_FIT_DAYS = 28       # with less history only the level is fit, no growth or weekday terms
+RUN_RATE_DAYS = 28
+SHARE_DAYS = 90         # a credit bucket's share of total spend is taken over this many days
+MAX_HORIZON_DAYS = 5 * 366
+BLOCK_DAYS = 128
+DAYS_PER_MONTH = 365.25 / 12
+TARGET_SHORTFALL = 0.10  # required_monthly_uplift brings the shortfall probability down to this
+
+
+def daily_totals(daily, keys=None):
+    """{'YYYY-MM-DD': {service: cost}} -> {date: total}, over services whose canonical key is in keys (all if None)."""
+    return {date.fromisoformat(d): sum(c for s, c in svcs.items() if keys is None or service_key(s) in keys) for d, svcs in daily.items()}
+
+
+def run_rates(daily, last, days=RUN_RATE_DAYS):
+    """{canonical service key: mean daily spend} over the `days` days ending at last."""
+    lo, out = (last - timedelta(days=days - 1)).isoformat(), {}
+    for d, svcs in daily.items():
+        if d >= lo:
+            for s, c in svcs.items():
+                out[service_key(s)] = out.get(service_key(s), 0.0) + c / days
+    return out
+
+
+class SpendModel:
+    """log(daily spend) = level + growth * years + weekday effects + AR(1) noise, fit by least squares.
+
+    simulate() draws the coefficients from their (autocorrelation-inflated) sampling distribution and
+    the noise as an AR(1) path continuing from the last residual, so each simulated path carries both
+    trend uncertainty and persistent day-to-day deviations. Needs numpy.
+    """
+
+    def __init__(self, totals):
+        self.last = max(totals)
+        days = [d for d in sorted(totals) if (self.last - d).days < HISTORY_DAYS]
+        self.origin, self.full = days[0], len(days) >= MIN_FIT_DAYS
+        y = np.log(np.maximum([totals[d] for d in days], 0.01))
+        X = self.design(days)
+        XtX_inv = np.linalg.pinv(X.T @ X)
+        self.beta = XtX_inv @ X.T @ y
+        resid = y - X @ self.beta
+        s2 = float(resid @ resid) / max(len(days) - X.shape[1], 1)
+        self.rho = float(np.clip(np.corrcoef(resid[:-1], resid[1:])[0, 1], 0, 0.95)) if len(days) > 2 and resid.std() > 0 else 0.0
+        self.sigma = math.sqrt(s2)
+        self.cov = XtX_inv * s2 * (1 + self.rho) / (1 - self.rho)
+        self.last_resid = float(resid[-1])
+        self.history_days = len(days)
+        self.annual_growth = math.expm1(self.beta[1]) if self.full else None
+
+    def design(self, days):
+        t = np.array([(d - self.origin).days / 365.25 for d in days])
+        if not self.full:
+            return np.ones((len(days), 1))
+        return np.column_stack([np.ones_like(t), t] + [np.array([d.weekday() == w for d in days], dtype=float) for w in range(1, 7)])
+
+    def simulate(self, windows, sims, rng):
+        """windows: [(start, end)] inclusive dates -> windows x sims array of simulated spend after self.last."""
+        first = self.last + timedelta(days=1)
+        m = min((max(e for _, e in windows) - first).days + 1, MAX_HORIZON_DAYS) if windows else 0
+        sums = np.zeros((len(windows), sims))
+        if m <= 0:
+            return sums
+        B = rng.multivariate_normal(self.beta, self.cov, size=sims, method='eigh')
+        e, innov = np.full(sims, self.last_resid), self.sigma * math.sqrt(1 - self.rho ** 2)
+        for lo in range(0, m, BLOCK_DAYS):
+            days = [first + timedelta(days=i) for i in range(lo, min(lo + BLOCK_DAYS, m))]
+            noise = rng.standard_normal((len(days), sims)) * innov
+            for i in range(len(days)):
+                e = self.rho * e + noise[i]
+                noise[i] = e
+            W = np.array([[s <= d <= end for d in days] for s, end in windows], dtype=float)
+            sums += W @ np.exp(self.design(days) @ B.T + noise)
+        return sums
+
+
+def _sorted_samples(totals, windows, sims, seed):
+    """Per window, the sorted simulated future spend; plus a model summary."""
+    if np is not None:
+        model = SpendModel(totals)
+        sums = model.simulate(windows, sims, np.random.default_rng(seed))
+        summary = {'method': 'monte_carlo', 'history_days': model.history_days, 'annual_growth': model.annual_growth, 'autocorrelation': round(model.rho, 3)}
+        return [np.sort(row) for row in sums], summary
+    last = max(totals)
+    recent = [totals[d] for d in sorted(totals)[-RUN_RATE_DAYS:]]
+    mean, sd = fmean(recent), pstdev(recent) if len(recent) > 1 else 0.0
+    out = []
+    for i, (start, end) in enumerate(windows):
+        f = max(0, (end - max(start, last + timedelta(days=1))).days + 1)
+        out.append(sorted(max(0.0, x) for x in NormalDist(mean * f, max(sd * math.sqrt(f), 1e-9)).samples(sims, seed=None if seed is None else seed + i)))
+    return out, {'method': 'normal', 'history_days': len(recent), 'annual_growth': None, 'autocorrelation': None}
+
+
+def _below(samples, xs):
+    """Fraction of sorted samples strictly below each of xs."""
+    if np is not None:
+        return (np.searchsorted(samples, xs) / len(samples)).tolist()
+    return [bisect_left(samples, x) / len(samples) for x in xs]
+
+
+def _quantile(samples, q):
+    return float(samples[min(int(q * len(samples)), len(samples) - 1)])
+
+
+def _parse(d):
+    try:
+        return date.fromisoformat(str(d)[:10])
+    except ValueError:
+        return None
+
+
+def _period_window(period, first, years, term):
+    """Inclusive window a credit bucket's threshold applies to, for the period containing `first`."""
+    period = (period or '').lower()
+    if period == 'monthly':
+        return first.replace(day=1), (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    current = next(((s, e) for s, e in years if s <= first <= e), None)
+    if period == 'term' and term:
+        return term
+    if current:
+        return current
+    return term or (date(first.year, 1, 1), date(first.year, 12, 31))
+
+
+def commitment_years(commitment):
+    """[(year, (start, end), minimum_commitment)] for each stored contract year with valid inclusive dates."""
+    out = []
+    for y in (commitment or {}).get('years') or []:
+        s, e = _parse(y.get('start')), _parse(y.get('end'))
+        if s and e and s <= e:
+            out.append((y, (s, e), number(y.get('minimum_commitment'))))
+    return out
+
+
+def project(daily, commitment, buckets, today, scenarios=(), sims=2000, seed=None):
+    """Project commitment years and credit bucket thresholds from the daily spend series.
+
+    daily: {'YYYY-MM-DD': {service: cost}} through yesterday. commitment: the stored commitment_summary
+    (years[].start/end/minimum_commitment). buckets: extracted credit buckets (qualifying_services,
+    spend_threshold, threshold_period). A bucket's spend is simulated as its recent share of total spend.
+    scenarios: spend_change maps ({service: new monthly spend}) applied from the first projected day and
+    evaluated against the same simulated paths, so each one costs a few sorted-array lookups.
+    Windows that start before the series does have complete_history false and no shortfall_probability.
+    """
+    totals = daily_totals(daily) or {today - timedelta(days=1): 0.0}
+    history_from, last = min(totals), max(totals)
+    first = last + timedelta(days=1)
+
+    def window(w, t, target):
+        """(target, spend to date, days still to project, history covers the window) for an inclusive window."""
+        s, e = w
+        return {'target': number(target), 'actual': sum(v for d, v in t.items() if s <= d <= e),
+                'future': max(0, (e - max(s, first)).days + 1), 'complete': s >= history_from}
+
+    years = [(y, w, window(w, totals, target)) for y, w, target in commitment_years(commitment)]
+    cs, ce = _parse((commitment or {}).get('contract_start')), _parse((commitment or {}).get('contract_end'))
+    term = (cs, ce) if cs and ce and cs <= ce else None
+
+    rows = []
+    share_lo = last - timedelta(days=SHARE_DAYS - 1)
+    recent_total = sum(v for d, v in totals.items() if d >= share_lo)
+    for b in buckets or []:
+        keys = frozenset(service_key(s) for s in b.get('qualifying_services') or [])
+        btotals = daily_totals(daily, keys)
+        share = sum(v for d, v in btotals.items() if d >= share_lo) / recent_total if recent_total > 0 else 0.0
+        w = _period_window(b.get('threshold_period'), first, [w for _, w, _ in years], term)
+        rows.append((b, keys, share, w, window(w, btotals, b.get('spend_threshold'))))
+
+    windows = sorted({w for _, w, _ in years} | {r[3] for r in rows})
+    samples, summary = _sorted_samples(totals, windows, sims, seed)
+    S = dict(zip(windows, samples))
+
+    def shortfall(w, x, share=1.0, shifts=(0.0,)):
+        """Per shift, P(spend to date + share * simulated future + shift < target) for window w, or None."""
+        if x['target'] is None or not x['complete']:
+            return [None] * len(shifts)
+        need = [x['target'] - x['actual'] - shift for shift in shifts]
+        ps = _below(S[w], [n / share for n in need]) if share > 0 else [float(n > 0) for n in need]
+        return [round(p, 4) for p in ps]
+
+    def projected(w, x, share=1.0):
+        return {k: round(x['actual'] + share * _quantile(S[w], q), 2) for k, q in (('p10', 0.1), ('p50', 0.5), ('p90', 0.9))}
+
+    out_years = []
+    for y, w, x in years:
+        uplift = None
+        if x['target'] is not None and x['complete'] and x['future']:
+            uplift = round(max(0.0, x['target'] - x['actual'] - _quantile(S[w], TARGET_SHORTFALL)) / (x['future'] / DAYS_PER_MONTH), 2)
+        out_years.append({'year': y.get('year'), 'label': y.get('label'), 'start': w[0].isoformat(), 'end': w[1].isoformat(),
+                          'minimum_commitment': x['target'], 'actual_to_date': round(x['actual'], 2), 'days_remaining': x['future'],
+                          'complete_history': x['complete'], 'projected': projected(w, x), 'shortfall_probability': shortfall(w, x)[0],
+                          'required_monthly_uplift': uplift})
+
+    out_buckets = [{'id': b.get('id'), 'title': b.get('title'), 'credit_type': b.get('credit_type'), 'spend_threshold': x['target'],
+                    'threshold_period': b.get('threshold_period'), 'start': w[0].isoformat(), 'end': w[1].isoformat(),
+                    'share_of_spend': round(share, 4), 'actual_to_date': round(x['actual'], 2), 'days_remaining': x['future'],
+                    'complete_history': x['complete'], 'projected': projected(w, x, share), 'shortfall_probability': shortfall(w, x, share)[0]}
+                   for b, _, share, w, x in rows]
+
+    # Scenarios: the change in daily spend per canonical service, then one batched lookup per window
+    rates, deltas = run_rates(daily, last), []
+    for sc in scenarios:
+        new = {}
+        for svc, monthly in (sc or {}).items():
+            new[service_key(svc)] = new.get(service_key(svc), 0.0) + float(monthly) / DAYS_PER_MONTH
+        deltas.append({k: v - rates.get(k, 0.0) for k, v in new.items()})
+    year_cols = []
+    for y, w, x in years:
+        shifts = [sum(d.values()) * x['future'] for d in deltas]
+        year_cols.append((y, shifts, shortfall(w, x, shifts=shifts)))
+    bucket_cols = []
+    for b, keys, share, w, x in rows:
+        shifts = [sum(v for k, v in d.items() if k in keys) * x['future'] for d in deltas]
+        bucket_cols.append((b, shifts, shortfall(w, x, share, shifts)))
+    out_scenarios = [{'spend_change': sc,
+                      'commitment': [{'year': y.get('year'), 'added_spend': round(shifts[i], 2), 'shortfall_probability': ps[i]} for y, shifts, ps in year_cols],
+                      'buckets': [{'id': b.get('id'), 'added_spend': round(shifts[i], 2), 'shortfall_probability': ps[i]} for b, shifts, ps in bucket_cols]}
+                     for i, sc in enumerate(scenarios)]
+
+    recent = [totals[d] for d in sorted(totals)[-RUN_RATE_DAYS:]]
+    return {'as_of': last.isoformat(), 'history_from': history_from.isoformat(), 'simulations': sims,
+            'model': {**summary, 'run_rate_daily': round(fmean(recent), 2)}, 'commitment': out_years, 'buckets': out_buckets, 'scenarios': out_scenarios}
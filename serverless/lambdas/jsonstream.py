@@ -0,0 +1,168 @@
+"""Incremental JSON scanning and truncation repair for Bedrock responses"""
+import json
+
+
+class JsonItemStream:
+    """Feed model output as it streams; completed objects inside watched top-level arrays are emitted as soon as they close.
+
+    For {"recommendations": [{...}, {...}], ...} with keys=('recommendations',), each recommendation
+    object is passed to on_item('recommendations', obj) the moment its closing brace arrives.
+    Every character is scanned exactly once, tracking string/escape state and a container stack.
+    """
+
+    def __init__(self, keys, on_item):
+        self.keys = set(keys)
+        self.on_item = on_item
+        self.counts = {k: 0 for k in self.keys}
+        self._chunks = []
+        self._stack = []        # [(bracket, key_in_parent)]
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key_chars = None  # chars of the object key being read, or None
+        self._key = None        # last completed object key
+        self._capture = None    # text pieces of the watched element being read
+        self._capture_from = 0
+
+    def feed(self, delta):
+        self._chunks.append(delta)
+        if self._capture is not None:
+            self._capture_from = 0
+        for i, c in enumerate(delta):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_chars is not None:
+                        self._key, self._key_chars = ''.join(self._key_chars), None
+                        continue
+                if self._key_chars is not None:
+                    self._key_chars.append(c)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._stack and self._stack[-1][0] == '{' and self._expect_key:
+                    self._key_chars = []
+            elif c == ':':
+                self._expect_key = False
+            elif c == ',':
+                self._expect_key = bool(self._stack) and self._stack[-1][0] == '{'
+            elif c in '{[':
+                parent = self._stack[-1] if self._stack else None
+                key = self._key if parent and parent[0] == '{' else None
+                self._stack.append((c, key))
+                self._expect_key = c == '{'
+                if c == '{' and self._watched_element_depth():
+                    self._capture, self._capture_from = [], i
+            elif c in '}]':
+                if not self._stack:
+                    continue
+                closing_element = c == '}' and self._capture is not None and self._watched_element_depth()
+                self._stack.pop()
+                self._expect_key = False
+                if closing_element:
+                    self._capture.append(delta[self._capture_from:i + 1])
+                    text, self._capture = ''.join(self._capture), None
+                    key = self._stack[-1][1]
+                    self.counts[key] += 1
+                    self.on_item(key, json.loads(text))
+        if self._capture is not None:
+            self._capture.append(delta[self._capture_from:])
+
+    def _watched_element_depth(self):
+        # root object -> watched array -> element object
+        return len(self._stack) == 3 and self._stack[0][0] == '{' and self._stack[1][0] == '[' and self._stack[1][1] in self.keys
+
+    def text(self):
+        return ''.join(self._chunks)
+
+
+def repair_json(text):
+    """Parse JSON, recovering the longest valid prefix of a truncated document in one linear scan.
+
+    The scan tracks string/escape state and a bracket stack, and remembers the last point where a
+    value completed. A cut-off array element is dropped whole: a point inside an open element of any
+    array is never a safe end, and an element only becomes safe once it closes, so truncation never
+    leaves a partial or empty {} / [] at the end of a list. Containers that are object values may still
+    close early ({"summary": {"total": 5, "n": 2 -> {"summary": {"total": 5}}). A number with nothing after
+    it may itself be cut off (5 of 50), so it is dropped: {"summary": {"total": 5 -> {"summary": {}} and
+    [1, 2, 3 -> [1, 2]. An open string value is kept as far as it goes. At most three json.loads calls
+    follow: the text as-is, the text with an open string value closed, and the text cut at the last
+    safe end, each with the stack closed.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    start = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError(f"Cannot parse Bedrock response (length {len(text)})")
+
+    stack = []              # closers for the open containers
+    elements = []           # per open container: is it an element of an array
+    partial = 0             # open containers that are array elements; nothing inside them is a safe end
+    in_string = escape = string_is_key = expect_key = scalar = False
+    safe_end, safe_closers = None, ''
+    end = len(text)
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                in_string = False
+                if not string_is_key and not partial:
+                    safe_end, safe_closers = i + 1, ''.join(reversed(stack))
+            continue
+        if scalar and (c in ',]}' or c.isspace()):
+            scalar = False
+            if not partial:
+                safe_end, safe_closers = i, ''.join(reversed(stack))
+        if c == '"':
+            in_string = True
+            string_is_key = expect_key and stack[-1] == '}'
+        elif c in '{[':
+            element = bool(stack) and stack[-1] == ']'
+            stack.append('}' if c == '{' else ']')
+            elements.append(element)
+            partial += element
+            expect_key = c == '{'
+            if not partial:  # an empty object value or root ({"recs": [ -> {"recs": []}), never an array element
+                safe_end, safe_closers = i + 1, ''.join(reversed(stack))
+        elif c in '}]':
+            if stack:
+                stack.pop()
+                partial -= elements.pop()
+            expect_key = False
+            if not stack:
+                end = i + 1  # root closed; anything after it is trailing noise
+                break
+            if not partial:
+                safe_end, safe_closers = i + 1, ''.join(reversed(stack))
+        elif c == ':':
+            expect_key = False
+        elif c == ',':
+            expect_key = bool(stack) and stack[-1] == '}'
+        elif not c.isspace():
+            scalar = True
+
+    candidates = []
+    if not stack:
+        candidates.append(text[start:end])
+    if in_string and not string_is_key and not partial and stack[-1] == '}':
+        candidates.append(text[start:end - 1 if escape else end] + '"' + ''.join(reversed(stack)))
+    if safe_end is not None:
+        candidates.append(text[start:safe_end] + safe_closers)
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    raise ValueError(f"Cannot parse Bedrock response (length {len(text)})")
@@ -0,0 +1,79 @@
+"""DynamoDB item encoding: native Number/Map/List attributes, plus a reader for legacy string-encoded items"""
+import json
+import math
+import re
+from decimal import Decimal
+
+# Version 1 items (no schema_version attribute) stored dicts/lists as json.dumps text and numbers as strings
+SCHEMA_VERSION = 2
+LEGACY_NUMBER_FIELDS = frozenset((
+    'max_credit_value', 'current_progress', 'potential_savings', 'spend_threshold', 'new_savings',
+    'pdf_bytes', 'peak_rss_mb', 'write_items_per_sec', 'total', 'fetched_at', 'pages',
+))
+
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def number(value, default=None):
+    """Finite float from a number or a model-written string ('50000', '$50,000', 'Year 1'), else default."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, Decimal, str)):
+        return default
+    try:
+        v = float(value)
+    except ValueError:
+        m = _NUMBER.search(value.replace(',', ''))
+        if not m:
+            return default
+        v = float(m.group())
+    return v if math.isfinite(v) else default
+
+
+def to_dynamo(value):
+    """Python value -> DynamoDB value: floats become Decimal (non-finite ones None), recursively."""
+    if isinstance(value, float):
+        return Decimal(repr(value)) if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {str(k): to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(v) for v in value]
+    return value
+
+
+def from_dynamo(value):
+    """DynamoDB value -> Python value: Decimal becomes int or float, sets become lists, recursively."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: from_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, set)):
+        return [from_dynamo(v) for v in value]
+    return value
+
+
+def encode_item(item):
+    """Item dict -> put_item-ready item tagged with the current schema_version."""
+    return {**to_dynamo(item), 'schema_version': SCHEMA_VERSION}
+
+
+def decode_item(item):
+    """Stored item -> plain Python dict. Version 1 items get their JSON text and number strings decoded."""
+    out = from_dynamo(item)
+    if out.get('schema_version', 1) >= SCHEMA_VERSION:
+        return out
+    for k, v in out.items():
+        if not isinstance(v, str):
+            continue
+        if v[:1] in '{[':
+            try:
+                out[k] = json.loads(v)
+            except ValueError:
+                pass
+        elif k in LEGACY_NUMBER_FIELDS:
+            try:
+                n = float(v)
+                if math.isfinite(n):
+                    out[k] = int(n) if n.is_integer() else n
+            except ValueError:
+                pass
+    return out
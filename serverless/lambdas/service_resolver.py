@@ -0,0 +1,116 @@
+"""Resolution of Cost Explorer SERVICE names and requirement patterns to canonical service keys"""
+import re
+from functools import lru_cache
+
+# Canonical key -> (CE SERVICE dimension value(s), aliases). Every name or alias resolves to exactly one key,
+# so "EC2 - Other", "Amazon Elastic Container Service" and "Amazon EC2" no longer match each other.
+# Former names stay listed: a renamed service whose old name leads with another service's brand
+# ("Amazon EC2 Container Service", "Amazon Kinesis Data Firehose") would otherwise resolve by that token.
+CATALOG = {
+    'EC2': (['Amazon Elastic Compute Cloud - Compute'], ['EC2', 'Amazon EC2', 'Elastic Compute Cloud', 'Amazon Elastic Compute Cloud']),
+    'EC2_OTHER': (['EC2 - Other'], ['EC2 Other']),
+    'ECS': (['Amazon Elastic Container Service', 'Amazon EC2 Container Service'], ['ECS', 'Amazon ECS', 'Fargate']),
+    'EKS': (['Amazon Elastic Kubernetes Service', 'Amazon Elastic Container Service for Kubernetes'], ['EKS', 'Amazon EKS', 'Kubernetes']),
+    'ECR': (['Amazon EC2 Container Registry (ECR)', 'Amazon Elastic Container Registry'], ['ECR', 'Amazon ECR', 'Container Registry', 'Amazon EC2 Container Registry']),
+    'LAMBDA': (['AWS Lambda'], ['Lambda']),
+    'S3': (['Amazon Simple Storage Service'], ['S3', 'Amazon S3', 'Simple Storage Service']),
+    'EFS': (['Amazon Elastic File System'], ['EFS', 'Amazon EFS']),
+    'FSX': (['Amazon FSx'], ['FSx']),
+    'BACKUP': (['AWS Backup'], ['Backup']),
+    'RDS': (['Amazon Relational Database Service'], ['RDS', 'Amazon RDS', 'Aurora', 'Amazon Aurora']),
+    'DYNAMODB': (['Amazon DynamoDB'], ['DynamoDB']),
+    'ELASTICACHE': (['Amazon ElastiCache'], ['ElastiCache']),
+    'REDSHIFT': (['Amazon Redshift'], ['Redshift']),
+    'EMR': (['Amazon Elastic MapReduce', 'Amazon EMR'], ['EMR', 'Elastic MapReduce']),
+    'GLUE': (['AWS Glue'], ['Glue']),
+    'ATHENA': (['Amazon Athena'], ['Athena']),
+    'KINESIS': (['Amazon Kinesis'], ['Kinesis', 'Kinesis Data Streams']),
+    'FIREHOSE': (['Amazon Kinesis Firehose', 'Amazon Data Firehose'], ['Firehose', 'Kinesis Firehose', 'Kinesis Data Firehose']),
+    'KINESIS_ANALYTICS': (['Amazon Kinesis Analytics', 'Amazon Managed Service for Apache Flink'], ['Kinesis Analytics', 'Kinesis Data Analytics', 'Flink']),
+    'KINESIS_VIDEO': (['Amazon Kinesis Video Streams'], ['Kinesis Video Streams', 'Kinesis Video']),
+    'MSK': (['Amazon Managed Streaming for Apache Kafka'], ['MSK', 'Amazon MSK', 'Kafka']),
+    'OPENSEARCH': (['Amazon OpenSearch Service', 'Amazon Elasticsearch Service'], ['OpenSearch', 'Elasticsearch']),
+    'QUICKSIGHT': (['Amazon QuickSight'], ['QuickSight']),
+    'SAGEMAKER': (['Amazon SageMaker'], ['SageMaker']),
+    'BEDROCK': (['Amazon Bedrock'], ['Bedrock']),
+    'TEXTRACT': (['Amazon Textract'], ['Textract']),
+    'COMPREHEND': (['Amazon Comprehend'], ['Comprehend']),
+    'REKOGNITION': (['Amazon Rekognition'], ['Rekognition']),
+    'TRANSCRIBE': (['Amazon Transcribe'], ['Transcribe']),
+    'API_GATEWAY': (['Amazon API Gateway'], ['API Gateway', 'APIGateway']),
+    'STEP_FUNCTIONS': (['AWS Step Functions'], ['Step Functions', 'SFN']),
+    'SQS': (['Amazon Simple Queue Service'], ['SQS', 'Amazon SQS', 'Simple Queue Service']),
+    'SNS': (['Amazon Simple Notification Service'], ['SNS', 'Amazon SNS', 'Simple Notification Service']),
+    'SES': (['Amazon Simple Email Service'], ['SES', 'Amazon SES', 'Simple Email Service']),
+    'EVENTBRIDGE': (['Amazon EventBridge', 'CloudWatch Events'], ['EventBridge']),
+    'MQ': (['Amazon MQ'], []),
+    'CLOUDWATCH': (['AmazonCloudWatch', 'Amazon CloudWatch'], ['CloudWatch']),
+    'CLOUDTRAIL': (['AWS CloudTrail'], ['CloudTrail']),
+    'CONFIG': (['AWS Config'], []),
+    'GUARDDUTY': (['Amazon GuardDuty'], ['GuardDuty']),
+    'KMS': (['AWS Key Management Service'], ['KMS', 'AWS KMS', 'Key Management Service']),
+    'SECRETS_MANAGER': (['AWS Secrets Manager'], ['Secrets Manager']),
+    'SYSTEMS_MANAGER': (['AWS Systems Manager'], ['Systems Manager', 'SSM', 'Amazon EC2 Systems Manager', 'Amazon EC2 Simple Systems Manager']),
+    'VPC': (['Amazon Virtual Private Cloud'], ['VPC', 'Amazon VPC']),
+    'ELB': (['Amazon Elastic Load Balancing', 'Elastic Load Balancing'], ['ELB', 'Load Balancing', 'ALB', 'NLB']),
+    'ROUTE53': (['Amazon Route 53'], ['Route 53', 'Route53']),
+    'CLOUDFRONT': (['Amazon CloudFront'], ['CloudFront']),
+    'TRANSFER': (['AWS Transfer Family'], ['Transfer Family']),
+    'LIGHTSAIL': (['Amazon Lightsail'], ['Lightsail']),
+}
+
+VENDOR = ('amazon', 'aws')
+
+
+def normalize(name):
+    """'Amazon EC2 Container Registry (ECR)' -> 'amazon ec2 container registry ecr'"""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name.lower()).split())
+
+
+def _strip_vendor(norm):
+    head, _, rest = norm.partition(' ')
+    return rest if head in VENDOR and rest else norm
+
+
+def _build():
+    exact, alias, tokens = {}, {}, {}
+    for key, (ce_names, aliases) in CATALOG.items():
+        for n in ce_names:
+            exact[normalize(n)] = key
+        for n in ce_names + aliases:
+            stripped = _strip_vendor(normalize(n))
+            alias[stripped] = key
+            if ' ' not in stripped:  # one-word brand names ('sagemaker', 'glue') can identify a service inside a longer name
+                tokens.setdefault(stripped, set()).add(key)
+    # Only tokens that point at a single service can decide a match
+    return exact, alias, {t: next(iter(keys)) for t, keys in tokens.items() if len(keys) == 1}
+
+
+EXACT, ALIASES, TOKENS = _build()
+
+
+@lru_cache(maxsize=4096)
+def resolve(name):
+    """Canonical key for a CE SERVICE name, credit requirement or auto_source service.
+
+    Exact CE names, then aliases (vendor prefix ignored), then a token that identifies one service only
+    ('Amazon SageMaker Studio' -> SAGEMAKER). Anything else resolves to its normalized name, so unknown
+    services (Marketplace products, new AWS services) still match themselves and nothing else.
+    """
+    norm = normalize(name)
+    if norm in EXACT:
+        return EXACT[norm]
+    stripped = _strip_vendor(norm)
+    if stripped in ALIASES:
+        return ALIASES[stripped]
+    hits = {TOKENS[t] for t in stripped.split() if t in TOKENS}
+    return hits.pop() if len(hits) == 1 else norm
+
+
+def index(by_service):
+    """{CE service name: cost} -> {canonical key: summed cost}, for O(1) lookups by any spelling."""
+    out = {}
+    for name, cost in by_service.items():
+        key = resolve(name)
+        out[key] = out.get(key, 0) + cost
+    return out
@@ -0,0 +1,131 @@
+"""Deterministic what-if evaluation: spend_change maps against the credit rules and commitment years at run rate"""
+from datetime import timedelta
+
+from forecast import DAYS_PER_MONTH, RUN_RATE_DAYS, commitment_years, daily_totals
+from schema import number
+from service_resolver import resolve as service_key
+
+PERIOD_MONTHS = {'monthly': 1, 'annual': 12, 'contract_year': 12}
+
+
+def bucket_rules(buckets, commitment):
+    """[(bucket, canonical service keys, months in its threshold period)] for buckets with qualifying_services.
+
+    annual and contract_year thresholds span 12 months, term thresholds the commitment years (12 months
+    when there are none).
+    """
+    years = commitment_years(commitment)
+    term_months = sum((e - s).days + 1 for _, (s, e), _ in years) / DAYS_PER_MONTH if years else 12
+    rules = []
+    for b in buckets or []:
+        keys = frozenset(service_key(s) for s in b.get('qualifying_services') or [] if isinstance(s, str) and s.strip())
+        if keys:
+            period = str(b.get('threshold_period') or '').lower()
+            rules.append((b, keys, PERIOD_MONTHS.get(period, term_months if period == 'term' else 12)))
+    return rules
+
+
+def score_buckets(rules, spend):
+    """Credit bucket outcomes for {canonical key: monthly spend}, on the contract's own terms.
+
+    A bucket is qualified when its qualifying spend at this monthly rate, over its threshold period
+    (period_spend), reaches spend_threshold, and then earns its max_credit_value, never more; with
+    qualifying spend below the threshold it is partially_qualified and earns nothing.
+    """
+    out = []
+    for b, keys, months in rules:
+        matched = sum(spend.get(k, 0.0) for k in keys)
+        threshold, value = number(b.get('spend_threshold')), number(b.get('max_credit_value'), 0.0)
+        period_spend = matched * months
+        status = 'opportunity' if matched <= 0 else 'qualified' if period_spend >= (threshold or 0.0) else 'partially_qualified'
+        out.append({'credit_name': b.get('title') or b.get('credit_type') or b.get('id'), 'bucket_id': b.get('id'), 'status': status,
+                    'matched_spend': matched, 'period_spend': period_spend, 'spend_threshold': threshold,
+                    'threshold_period': b.get('threshold_period'), 'credit_value': max(0.0, value) if status == 'qualified' else 0.0})
+    return out
+
+
+def monthly_run_rate(daily, last, days=RUN_RATE_DAYS):
+    """{CE service name: monthly spend} at the mean daily rate of the `days` days ending at last."""
+    lo, out = (last - timedelta(days=days - 1)).isoformat(), {}
+    for d, svcs in daily.items():
+        if d >= lo:
+            for s, c in svcs.items():
+                out[s] = out.get(s, 0.0) + c * DAYS_PER_MONTH / days
+    return {s: c for s, c in out.items() if c > 0}
+
+
+def evaluate(engine, daily, commitment, today, scenarios, rules=None):
+    """Evaluate spend_change maps ({service: new monthly spend}) exactly, without a model call.
+
+    A change names a service in any spelling ('Lambda', 'AWS Lambda') and sets that canonical service's
+    total monthly spend. Credits: the billed services at their 28-day monthly run rate, summed per
+    canonical service, with each scenario's changes applied. With bucket_rules (the contract's credit
+    buckets), each scenario gets credit_buckets rows from score_buckets: credit_value and credit_change
+    are contract credit values, the unit of the model's max_credit_value and new_savings. Otherwise the
+    spend goes through engine.evaluate_keys as one batch (a single matrix product with numpy) and each
+    scenario gets credit_couplings rows following the /spend rules: potential_savings and savings_change
+    are monthly discount amounts. Commitment years: spend to date
+    plus the remaining days at the run rate, shifted by the scenario's change in daily spend from the
+    first unbilled day. Years that start before the daily series have no projection.
+    """
+    totals = daily_totals(daily) or {today - timedelta(days=1): 0.0}
+    history_from, last = min(totals), max(totals)
+    first = last + timedelta(days=1)
+    base = monthly_run_rate(daily, last)
+    base_keys = {}
+    for s, c in base.items():
+        base_keys[service_key(s)] = base_keys.get(service_key(s), 0.0) + c
+    rate = sum(base.values()) / DAYS_PER_MONTH
+
+    years = []
+    for y, (s, e), target in commitment_years(commitment):
+        actual = sum(v for d, v in totals.items() if s <= d <= e)
+        years.append((y, target, actual, max(0, (e - max(s, first)).days + 1), s >= history_from))
+
+    def commitment_rows(delta):
+        """Per year: projected year-end spend with the daily rate shifted by delta, its status and the remaining gap."""
+        rows = []
+        for y, target, actual, future, complete in years:
+            projected = actual + future * max(0.0, rate + delta) if complete else None
+            status = None
+            if target is not None and projected is not None:
+                status = 'met' if actual >= target else 'on_track' if projected >= target else 'shortfall'
+            rows.append({'year': y.get('year'), 'projected': None if projected is None else round(projected, 2), 'status': status,
+                         'gap': None if status is None else round(max(0.0, target - projected), 2)})
+        return rows
+
+    news = []
+    for sc in scenarios:
+        new = {}
+        for s, c in sc.items():
+            new[service_key(s)] = new.get(service_key(s), 0.0) + c
+        news.append(new)
+    if rules:
+        field, value, change = 'credit_buckets', 'credit_value', 'credit_change'
+        results = [score_buckets(rules, base_keys)] + [score_buckets(rules, {**base_keys, **new}) for new in news]
+        row = lambda r: {'credit_name': r['credit_name'], 'bucket_id': r['bucket_id'], 'status': r['status'], 'matched_spend': round(r['matched_spend'], 2),
+                         'period_spend': round(r['period_spend'], 2), 'spend_threshold': r['spend_threshold'], 'threshold_period': r['threshold_period'],
+                         'credit_value': round(r['credit_value'], 2)}
+    else:
+        field, value, change = 'credit_couplings', 'potential_savings', 'savings_change'
+        vocab = set(engine.vocab)
+        base_v = {k: c for k, c in base_keys.items() if k in vocab}  # services no credit requires cannot change an outcome
+        results = engine.evaluate_keys([base_v] + [{**base_v, **new} for new in news])
+        row = lambda r: {'credit_name': r['credit_name'], 'status': r['status'], 'matched_spend': round(r['matched_spend'], 2),
+                         'potential_savings': round(r['potential_savings'], 2)}
+    baseline = results[0]
+
+    out = []
+    for i, (sc, new) in enumerate(zip(scenarios, news)):
+        delta = sum(c - base_keys.get(k, 0.0) for k, c in new.items()) / DAYS_PER_MONTH
+        credits = [{**row(r), 'baseline_status': b['status'], change: round(r[value] - b[value], 2)} for r, b in zip(results[i + 1], baseline)]
+        out.append({'spend_change': sc, 'monthly_spend': round(sum(base.values()) + delta * DAYS_PER_MONTH, 2), 'monthly_change': round(delta * DAYS_PER_MONTH, 2),
+                    field: credits, 'newly_qualified': [c['credit_name'] for c in credits if c['status'] == 'qualified' and c['baseline_status'] != 'qualified'],
+                    'commitment': commitment_rows(delta)})
+
+    return {'as_of': last.isoformat(), 'history_from': history_from.isoformat(), 'run_rate_days': RUN_RATE_DAYS,
+            'baseline': {'monthly_spend': round(sum(base.values()), 2), 'services': {s: round(c, 2) for s, c in base.items()},
+                         field: [row(r) for r in baseline],
+                         'commitment': [{**row, 'minimum_commitment': target, 'actual_to_date': round(actual, 2), 'days_remaining': future}
+                                        for row, (_, target, actual, future, _) in zip(commitment_rows(0.0), years)]},
+            'scenarios': out}
@@ -0,0 +1,62 @@
+import pytest
+
+import credit_engine
+from credit_engine import CreditEngine
+
+OFFERINGS = {
+    'Generative AI Credit': {'discount': '25%', 'primary': ['SageMaker', 'Bedrock', 'Lambda'], 'supporting': ['EC2', 'S3'], 'min_spend': 1000},
+    'Graviton Optimization Credit': {'discount': '31%', 'primary': ['EC2'], 'supporting': ['RDS', 'ElastiCache'], 'min_spend': 500},
+    'Serverless Credit': {'discount': '18%', 'primary': ['Lambda', 'API Gateway'], 'supporting': ['DynamoDB', 'S3'], 'min_spend': 300},
+}
+
+
+@pytest.fixture
+def engine():
+    return CreditEngine(OFFERINGS)
+
+
+def by_name(results):
+    return {r['credit_name']: r for r in results}
+
+
+def rounded(results):
+    return [(r['credit_name'], r['status'], round(r['matched_spend'], 6), round(r['potential_savings'], 6)) for r in results]
+
+
+def test_statuses_follow_primary_and_min_spend(engine):
+    r = by_name(engine.evaluate({'AWS Lambda': 200.0, 'Amazon Simple Storage Service': 900.0, 'Amazon Relational Database Service': 50.0}))
+    assert r['Generative AI Credit']['status'] == 'qualified'           # 200 + 900 >= 1000 with a primary service
+    assert r['Generative AI Credit']['matched_spend'] == pytest.approx(1100.0)
+    assert r['Generative AI Credit']['potential_savings'] == pytest.approx(275.0)
+    assert r['Serverless Credit']['status'] == 'qualified'
+    # supporting spend alone never qualifies
+    assert r['Graviton Optimization Credit']['status'] == 'opportunity'
+    assert r['Graviton Optimization Credit']['missing_primary'] == ['EC2']
+
+
+def test_primary_below_min_spend_is_partial(engine):
+    r = by_name(engine.evaluate({'Amazon Elastic Compute Cloud - Compute': 100.0}))
+    assert r['Graviton Optimization Credit']['status'] == 'partially_qualified'
+
+
+def test_ec2_other_does_not_count_as_ec2(engine):
+    r = by_name(engine.evaluate({'EC2 - Other': 5000.0}))
+    assert r['Graviton Optimization Credit']['status'] == 'opportunity'
+    assert r['Graviton Optimization Credit']['matched_spend'] == 0
+
+
+def test_batch_paths_match_single_account(engine, monkeypatch):
+    accounts = {'a': {'AWS Lambda': 200.0, 'Amazon Simple Storage Service': 900.0}, 'b': {'Amazon Elastic Compute Cloud - Compute': 700.0}, 'c': {}}
+    expected = {a: rounded(engine.evaluate(s)) for a, s in accounts.items()}
+    assert {a: rounded(r) for a, r in engine.evaluate_accounts(accounts).items()} == expected
+    monkeypatch.setattr(credit_engine, 'np', None)
+    assert {a: rounded(r) for a, r in engine.evaluate_accounts(accounts).items()} == expected
+
+
+def test_evaluate_keys_with_and_without_numpy(engine, monkeypatch):
+    rows = [{'LAMBDA': 400.0}, {'EC2': 600.0, 'RDS': 10.0}, {'unknown service': 1e6}]
+    vectorized = engine.evaluate_keys(rows)
+    monkeypatch.setattr(credit_engine, 'np', None)
+    assert [rounded(r) for r in engine.evaluate_keys(rows)] == [rounded(r) for r in vectorized]
+    assert by_name(vectorized[1])['Graviton Optimization Credit']['status'] == 'qualified'
+    assert all(r['status'] == 'opportunity' for r in vectorized[2])
@@ -0,0 +1,104 @@
+"""POST /decisions against a moto-backed table (skipped without moto)."""
+import importlib
+import json
+
+import pytest
+
+moto = pytest.importorskip('moto')
+import boto3  # noqa: E402
+from boto3.dynamodb.conditions import Key  # noqa: E402
+from botocore.exceptions import ClientError  # noqa: E402
+
+
+@pytest.fixture
+def api(monkeypatch):
+    for k, v in dict(TABLE_NAME='cip-test', DOCUMENTS_BUCKET='docs', SENDER_EMAIL='a@example.com', BEDROCK_MODEL_ID='model',
+                     AWS_DEFAULT_REGION='us-east-1', AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing').items():
+        monkeypatch.setenv(k, v)
+    with moto.mock_aws():
+        boto3.client('dynamodb').create_table(
+            TableName='cip-test', BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': a, 'AttributeType': 'S'} for a in ('PK', 'SK')],
+            KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}, {'AttributeName': 'SK', 'KeyType': 'RANGE'}])
+        module = importlib.import_module('api')
+        monkeypatch.setattr(module.time, 'sleep', lambda s: None)
+        for i in range(4):
+            module.table.put_item(Item={'PK': 'ANALYSIS#A', 'SK': f'REC#r{i}', 'id': f'r{i}', 'credit_type': ['GenAI', 'Serverless'][i % 2], 'status': 'pending'})
+        yield module
+
+
+def decide(api, decisions, analysis_id='A'):
+    r = api.handle_decisions({'body': json.dumps({'analysis_id': analysis_id, 'decisions': decisions})}, None)
+    return r['statusCode'], json.loads(r['body'])
+
+
+def query(api, pk):
+    return api._query_all(KeyConditionExpression=Key('PK').eq(pk))
+
+
+def test_partial_failure_reports_each_decision_in_request_order(api):
+    status, body = decide(api, [{'rec_id': 'r0', 'action': 'accepted'}, {'rec_id': 'missing', 'action': 'accepted'},
+                                {'rec_id': 'r1', 'action': 'rejected', 'notes': 'not now'}, {'rec_id': 'r2', 'action': 'maybe'},
+                                {'rec_id': 'r0', 'action': 'rejected'}, 'junk'])
+    assert status == 200
+    assert (body['applied'], body['failed']) == (2, 4)
+    invalid = 'rec_id and an action of accepted or rejected are required'
+    assert body['results'] == [{'rec_id': 'r0', 'status': 'accepted'}, {'rec_id': 'missing', 'error': 'not_found'},
+                               {'rec_id': 'r1', 'status': 'rejected'}, {'rec_id': 'r2', 'error': invalid},
+                               {'rec_id': 'r0', 'error': 'duplicate rec_id'}, {'rec_id': None, 'error': invalid}]
+    recs = {i['id']: i for i in query(api, 'ANALYSIS#A')}
+    assert (recs['r0']['status'], recs['r1']['status'], recs['r2']['status']) == ('accepted', 'rejected', 'pending')
+    assert sorted(h['rec_id'] for h in query(api, 'HISTORY')) == ['r0', 'r1']
+    fb = {i['SK']: i for i in query(api, 'FEEDBACK')}
+    assert fb['TYPE#GenAI']['accepted_count'] == 1 and fb['TYPE#Serverless']['rejected_count'] == 1
+    assert fb['TYPE#Serverless']['recent_notes'] == ['not now']
+
+
+def test_rec_deleted_before_the_transaction_fails_alone(api, monkeypatch):
+    transact = api._transact_decisions
+
+    def racing(analysis_id, chunk, now, attempts=4):
+        api.table.delete_item(Key={'PK': 'ANALYSIS#A', 'SK': 'REC#r3'})
+        return transact(analysis_id, chunk, now, attempts)
+    monkeypatch.setattr(api, '_transact_decisions', racing)
+    _, body = decide(api, [{'rec_id': 'r3', 'action': 'accepted'}, {'rec_id': 'r2', 'action': 'accepted'}])
+    assert body['results'] == [{'rec_id': 'r3', 'error': 'not_found'}, {'rec_id': 'r2', 'status': 'accepted'}]
+    assert [h['rec_id'] for h in query(api, 'HISTORY')] == ['r2']
+
+
+def error_response(code, **extra):
+    return {'Error': {'Code': code, 'Message': code}, **extra}
+
+
+def cancelled(*codes):
+    return error_response('TransactionCanceledException', CancellationReasons=[{'Code': c} for c in codes])
+
+
+def test_transaction_retries_only_conflicts_and_resubmits_after_removals(api, monkeypatch):
+    client = api.ddb.meta.client
+    calls, script = [], []
+
+    def transact_write_items(TransactItems):
+        calls.append(len(TransactItems) // 2)
+        if script:
+            raise script.pop(0)(len(TransactItems) // 2)
+    monkeypatch.setattr(client, 'transact_write_items', transact_write_items)
+    chunk = [(f'r{i}', 'accepted', '', 'GenAI') for i in range(3)]
+    conflict = lambda n: client.exceptions.TransactionCanceledException(cancelled('TransactionConflict', *['None'] * (2 * n - 1)), 'TransactWriteItems')
+    removed = lambda n: client.exceptions.TransactionCanceledException(cancelled('ConditionalCheckFailed', *['None'] * (2 * n - 1)), 'TransactWriteItems')
+
+    # a removal on the last attempt still resubmits the rest, without using an attempt
+    script[:] = [conflict] * 3 + [removed]
+    assert api._transact_decisions('A', chunk, 'now') == {'r0': 'not_found'}
+    assert calls == [3, 3, 3, 3, 2]
+
+    # anything but conflicts and throttling fails at once
+    calls.clear()
+    script[:] = [lambda n: ClientError(error_response('ValidationException'), 'TransactWriteItems')] * 4
+    assert api._transact_decisions('A', chunk, 'now') == dict.fromkeys(('r0', 'r1', 'r2'), 'ValidationException')
+    assert calls == [3]
+
+
+@pytest.mark.parametrize('body', [{}, {'analysis_id': 'A', 'decisions': []}, {'analysis_id': 'A', 'decisions': [{}] * 101}])
+def test_invalid_requests_are_rejected(api, body):
+    assert api.handle_decisions({'body': json.dumps(body)}, None)['statusCode'] == 400
@@ -0,0 +1,41 @@
+import pytest
+
+import feedback
+
+DAY = 86400
+T0 = feedback.EPOCH + 400 * DAY
+
+
+def item(credit_type, accepted=(), rejected=(), notes=()):
+    """A FEEDBACK item as the decision handlers build it: one growth-form weight ADDed per decision."""
+    return {'credit_type': credit_type, 'accepted_count': len(accepted), 'rejected_count': len(rejected),
+            'accepted_weight': sum(feedback.weight(t) for t in accepted), 'rejected_weight': sum(feedback.weight(t) for t in rejected),
+            'recent_notes': list(notes)}
+
+
+def test_weights_halve_every_half_life():
+    assert feedback.weight(feedback.EPOCH) == 1
+    assert feedback.weight(feedback.EPOCH + feedback.HALF_LIFE_DAYS * DAY) == pytest.approx(2)
+    acc, rej, score = feedback.scores(item('GenAI', accepted=[T0], rejected=[T0 + 90 * DAY]), T0 + 90 * DAY)
+    assert (acc, rej) == (pytest.approx(0.5), pytest.approx(1.0))
+    assert score == pytest.approx(-1 / 3)
+    assert feedback.scores({}, T0) == (0.0, 0.0, 0.0)
+
+
+def test_summary_ranks_by_decayed_weight_and_stays_bounded():
+    items = [item(f'Old {i}', accepted=[T0] * 5) for i in range(feedback.PROMPT_TYPES)]
+    items.append(item('Recent', rejected=[T0 + 365 * DAY], notes=['Budget  freeze ' + 'x' * 200]))
+    lines = feedback.summary(items, T0 + 365 * DAY)
+    assert lines[0].startswith('- Recent: 0 accepted / 1 rejected, recent-weighted score -1.00')
+    assert len(lines[0]) < 300                                        # notes are clipped for the prompt
+    assert len(lines) == feedback.PROMPT_TYPES + 1 and lines[-1] == '- (1 more credit types with less recent feedback)'
+
+
+def test_summary_skips_long_decayed_types():
+    assert feedback.summary([item('Ancient', accepted=[T0])], T0 + 10 * 365 * DAY) == []
+
+
+def test_note_normalizes_and_clips():
+    assert feedback.note('  ') is None and feedback.note(None) is None
+    assert feedback.note('too   much\neffort') == 'too much effort'
+    assert len(feedback.note('x' * 500)) == feedback.NOTE_CHARS
@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+import pytest
+
+import forecast
+
+TODAY = date(2026, 10, 17)
+
+
+def flat_daily(days=200, per_day=100.0):
+    return {(TODAY - timedelta(days=i)).isoformat(): {'AWS Lambda': per_day * 0.4, 'Amazon Elastic Compute Cloud - Compute': per_day * 0.6} for i in range(1, days + 1)}
+
+
+def commitment(target):
+    return {'years': [{'year': 1, 'start': '2026-06-01', 'end': '2027-05-31', 'minimum_commitment': target},
+                      {'year': 0, 'start': '2025-06-01', 'end': '2026-05-31', 'minimum_commitment': target}]}
+
+
+@pytest.fixture(params=['numpy', 'fallback'])
+def numpy_mode(request, monkeypatch):
+    if request.param == 'fallback':
+        monkeypatch.setattr(forecast, 'np', None)
+    elif forecast.np is None:
+        pytest.skip('numpy not installed')
+
+
+def test_shortfall_probability_tracks_the_target(numpy_mode):
+    # about 100/day over a 365-day year
+    easy = forecast.project(flat_daily(), commitment(20000), [], TODAY, sims=500, seed=1)['commitment'][0]
+    hard = forecast.project(flat_daily(), commitment(80000), [], TODAY, sims=500, seed=1)['commitment'][0]
+    assert easy['shortfall_probability'] < 0.05 and easy['required_monthly_uplift'] == 0
+    assert hard['shortfall_probability'] > 0.95 and hard['required_monthly_uplift'] > 0
+    assert easy['projected']['p10'] <= easy['projected']['p50'] <= easy['projected']['p90']
+
+
+def test_years_before_history_have_no_probability(numpy_mode):
+    year0 = forecast.project(flat_daily(), commitment(20000), [], TODAY, sims=200, seed=1)['commitment'][1]
+    assert year0['complete_history'] is False and year0['shortfall_probability'] is None
+
+
+def test_scenarios_and_buckets_shift_the_same_paths(numpy_mode):
+    buckets = [{'id': 'b', 'qualifying_services': ['Lambda'], 'spend_threshold': 1500, 'threshold_period': 'monthly'}]
+    out = forecast.project(flat_daily(), commitment(36000), buckets, TODAY, scenarios=[{'Lambda': 3000}], sims=500, seed=3)
+    base_year, base_bucket = out['commitment'][0]['shortfall_probability'], out['buckets'][0]
+    sc = out['scenarios'][0]
+    assert base_bucket['share_of_spend'] == pytest.approx(0.4)
+    assert base_bucket['start'] == '2026-10-01' and base_bucket['end'] == '2026-10-31'
+    assert sc['commitment'][0]['added_spend'] > 0
+    assert sc['commitment'][0]['shortfall_probability'] <= base_year
+    assert sc['buckets'][0]['shortfall_probability'] <= base_bucket['shortfall_probability']
+
+
+def test_same_seed_same_projection():
+    a = forecast.project(flat_daily(), commitment(36000), [], TODAY, sims=300, seed=9)
+    b = forecast.project(flat_daily(), commitment(36000), [], TODAY, sims=300, seed=9)
+    assert a == b
+
+
+def test_no_history_does_not_fail():
+    out = forecast.project({}, commitment(1000), [], TODAY, sims=100, seed=1)
+    assert out['commitment'][0]['actual_to_date'] == 0
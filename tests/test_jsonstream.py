@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from jsonstream import JsonItemStream, repair_json
+
+DOC = {'recommendations': [{'id': 'a', 'what_if': {'spend_change': {'Lambda': 10}}, 'tags': ['x', 'y"z']}, {'id': 'b', 'savings': 12.5}],
+       'attestations': [{'id': 'att', 'fields': [{'label': 'YTD', 'auto_source': None}]}], 'commitment_summary': {'years': [{'year': 1}]}}
+
+
+def is_prefix(original, repaired):
+    """Lists keep only whole leading elements, objects a subset of keys, strings a prefix."""
+    if isinstance(original, list):
+        return isinstance(repaired, list) and len(repaired) <= len(original) and \
+            all(r == o for r, o in zip(repaired[:-1], original)) and (not repaired or is_prefix(original[len(repaired) - 1], repaired[-1]))
+    if isinstance(original, dict):
+        return isinstance(repaired, dict) and all(k in original and is_prefix(original[k], v) for k, v in repaired.items())
+    if isinstance(original, str):
+        return isinstance(repaired, str) and original.startswith(repaired)
+    return repaired == original
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"recs": [{"x": 1}, {"y"', {'recs': [{'x': 1}]}),
+    ('{"recs": [{"x": 1}, {', {'recs': [{'x': 1}]}),
+    ('{"recs": [{"x": "}]"}, {"x": "ab', {'recs': [{'x': '}]'}]}),
+    ('{"r": [[1, 2], [3', {'r': [[1, 2]]}),
+    ('{"tags": ["a", 12, 3', {'tags': ['a', 12]}),
+    ('{"recs": [', {'recs': []}),
+    ('{"summary": {"total": 5', {'summary': {}}),
+    ('{"summary": {"total": 5, "n": 2', {'summary': {'total': 5}}),
+    ('{"s": {"t": "ab', {'s': {'t': 'ab'}}),
+    ('[1, 2, 3', [1, 2]),
+    ('{', {}),
+])
+def test_repair_json_truncation(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_repair_json_every_cut_is_a_prefix_without_phantom_elements():
+    text = json.dumps(DOC)
+    for cut in range(1, len(text)):
+        repaired = repair_json(text[:cut])
+        assert is_prefix(DOC, repaired), text[:cut]
+        # a cut-off array element is dropped, never closed as an empty object
+        assert {} not in repaired.get('recommendations', []), text[:cut]
+
+
+def test_repair_json_complete_and_unparseable():
+    assert repair_json(json.dumps(DOC)) == DOC
+    assert repair_json('Here you go: ' + json.dumps(DOC)) == DOC
+    with pytest.raises(ValueError):
+        repair_json('no json here')
+
+
+def test_item_stream_emits_each_element_once_as_it_closes():
+    seen = []
+    stream = JsonItemStream(('recommendations',), lambda key, item: seen.append((key, item)))
+    text = json.dumps(DOC)
+    for i in range(0, len(text), 7):
+        stream.feed(text[i:i + 7])
+    assert seen == [('recommendations', r) for r in DOC['recommendations']]
+    assert stream.text() == text
@@ -0,0 +1,51 @@
+import pytest
+
+from attestation_calendar_system import MAX_REASONS, AttestationCalendarSystem, FeedbackStore
+
+DAY = 86400
+
+
+def test_feedback_decays_with_the_half_life():
+    store = FeedbackStore(half_life_days=90)
+    store.record('Serverless Credit', 'accepted', now=0)
+    store.record('Serverless Credit', 'rejected', now=90 * DAY)
+    prefs = store.preferences('Serverless Credit', now=90 * DAY)
+    # the acceptance is a half-life old, so it weighs 0.5 against the fresh rejection's 1
+    assert prefs['acceptance_rate'] == pytest.approx(1 / 3)
+    assert prefs['accepted_count'] == 1 and prefs['rejected_count'] == 1
+    assert store.preferences('Serverless Credit', now=180 * DAY)['feedback_weight'] == pytest.approx(0.75)
+    assert store.preferences('Unknown', now=0) is None
+
+
+def test_recent_rejection_reasons_outrank_old_frequent_ones():
+    store = FeedbackStore(half_life_days=90)
+    for _ in range(3):
+        store.record('GenAI', 'rejected', 'Budget freeze', now=0)
+    store.record('GenAI', 'rejected', '  Not   a priority ', now=365 * DAY)
+    assert store.preferences('GenAI', now=365 * DAY)['common_rejection_reasons'][:2] == ['Not a priority', 'Budget freeze']
+
+
+def test_reasons_are_capped_per_credit_type():
+    store = FeedbackStore()
+    for i in range(MAX_REASONS * 5):
+        store.record('GenAI', 'rejected', f'reason {i}', now=i)
+    reasons = store.types['GenAI']['reasons']
+    assert len(reasons) == MAX_REASONS
+    assert f'reason {MAX_REASONS * 5 - 1}' in reasons
+
+
+def test_store_round_trips_through_its_file(tmp_path):
+    path = str(tmp_path / 'learning_state.json')
+    store = FeedbackStore(path)
+    store.record('GenAI', 'accepted', now=0)
+    store.save()
+    assert FeedbackStore(path).preferences('GenAI', now=0) == store.preferences('GenAI', now=0)
+
+
+def test_user_preferences_keeps_its_shape():
+    system = AttestationCalendarSystem()
+    system.record_recommendation_feedback('r1', 'rejected', 'GenAI', 'Too much effort')
+    prefs = system.learning_data['user_preferences']['GenAI']
+    assert {'acceptance_rate', 'common_rejection_reasons', 'preferred_timing'} <= set(prefs)
+    assert prefs['common_rejection_reasons'] == ['Too much effort']
+    assert 'Serverless' not in system.learning_data['user_preferences']
@@ -0,0 +1,34 @@
+import pytest
+
+from service_resolver import index, resolve
+
+
+@pytest.mark.parametrize('name, key', [
+    ('Amazon Elastic Compute Cloud - Compute', 'EC2'),
+    ('EC2', 'EC2'),
+    ('Amazon EC2', 'EC2'),
+    ('Amazon EC2 instances', 'EC2'),
+    ('EC2 - Other', 'EC2_OTHER'),
+    ('EC2 Other', 'EC2_OTHER'),
+    ('Amazon Elastic Container Service', 'ECS'),
+    ('Amazon EC2 Container Service', 'ECS'),          # former name: must not fall through to the 'ec2' token
+    ('Fargate', 'ECS'),
+    ('Amazon EC2 Container Registry (ECR)', 'ECR'),
+    ('Amazon EC2 Container Registry', 'ECR'),
+    ('Amazon Elastic Container Service for Kubernetes', 'EKS'),
+    ('Amazon Kinesis Data Firehose', 'FIREHOSE'),
+    ('Amazon Kinesis', 'KINESIS'),
+    ('Amazon SageMaker Studio', 'SAGEMAKER'),
+    ('aws lambda', 'LAMBDA'),
+])
+def test_resolve_precedence(name, key):
+    assert resolve(name) == key
+
+
+def test_unknown_names_match_only_themselves():
+    assert resolve('Marketplace Product 3') == 'marketplace product 3'
+    assert resolve('Marketplace Product 3') != resolve('Marketplace Product 4')
+
+
+def test_index_sums_spellings_of_one_service():
+    assert index({'Amazon Elastic Compute Cloud - Compute': 10, 'EC2 - Other': 5, 'Amazon EC2 Container Service': 2}) == {'EC2': 10, 'EC2_OTHER': 5, 'ECS': 2}
@@ -0,0 +1,66 @@
+import pytest
+from botocore.exceptions import ClientError
+
+import spend_cube
+
+
+class FakeCE:
+    """Two pages of linked accounts, a cost page per account chunk, and one throttled call."""
+
+    def __init__(self, accounts, throttle_first=True):
+        self.accounts, self.throttle, self.filters = accounts, throttle_first, []
+
+    def get_dimension_values(self, **kwargs):
+        if self.throttle:
+            self.throttle = False
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'slow down'}}, 'GetDimensionValues')
+        ids = sorted(self.accounts)
+        half = len(ids) // 2
+        page = ids[half:] if kwargs.get('NextPageToken') else ids[:half]
+        return {'DimensionValues': [{'Value': a, 'Attributes': {'description': f'name {a}'}} for a in page], **({} if kwargs.get('NextPageToken') else {'NextPageToken': 't'})}
+
+    def get_cost_and_usage(self, **kwargs):
+        chunk = kwargs['Filter']['Dimensions']['Values'] if 'Dimensions' in kwargs['Filter'] else kwargs['Filter']['And'][1]['Dimensions']['Values']
+        self.filters.append(kwargs['Filter'])
+        groups = [{'Keys': [a, s], 'Metrics': {'AmortizedCost': {'Amount': str(c)}}} for a in chunk for s, c in self.accounts[a].items()]
+        return {'ResultsByTime': [{'Groups': groups}]}
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(spend_cube.time, 'sleep', lambda s: None)
+
+
+def test_fetch_cube_pages_chunks_and_retries_throttling():
+    accounts = {f'{i:012d}': {'AWS Lambda': 1.5 * i, 'Amazon S3': 0.001} for i in range(1, 8)}
+    ce = FakeCE(accounts)
+    out = spend_cube.fetch_cube(ce, '2026-10-01', '2026-10-17', accounts_per_query=3, tps=1000)
+    assert out['accounts'] == {a: f'name {a}' for a in accounts}
+    # costs under a cent are dropped
+    assert out['cube'] == {a: {'AWS Lambda': round(1.5 * int(a), 2)} for a in accounts}
+    assert len(ce.filters) == 3                     # ceil(7 / 3) account chunks
+    assert out['calls'] == 1 + 2 + 3                 # throttled call, two dimension pages, three cost queries
+
+
+def test_fetch_cube_combines_the_caller_filter():
+    ce = FakeCE({'000000000001': {'AWS Lambda': 2.0}}, throttle_first=False)
+    flt = {'Not': {'Dimensions': {'Key': 'RECORD_TYPE', 'Values': ['Credit']}}}
+    spend_cube.fetch_cube(ce, '2026-10-01', '2026-10-17', ce_filter=flt, tps=1000)
+    assert ce.filters[0]['And'][0] == flt
+
+
+def test_non_throttle_errors_are_not_retried():
+    class Denied:
+        calls = 0
+
+        def get_dimension_values(self, **kwargs):
+            Denied.calls += 1
+            raise ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'no'}}, 'GetDimensionValues')
+
+    with pytest.raises(ClientError):
+        spend_cube.fetch_cube(Denied(), '2026-10-01', '2026-10-17', tps=1000)
+    assert Denied.calls == 1
+
+
+def test_merge_sums_services_over_accounts():
+    assert spend_cube.merge({'a': {'AWS Lambda': 1.25, 'Amazon S3': 2}, 'b': {'AWS Lambda': 0.5}}) == {'AWS Lambda': 1.75, 'Amazon S3': 2}
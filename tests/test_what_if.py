@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import pytest
+
+import what_if
+from credit_engine import CreditEngine
+
+TODAY = date(2026, 10, 17)
+DAILY = {(TODAY - timedelta(days=i)).isoformat(): {'AWS Lambda': 10.0, 'Amazon Elastic Compute Cloud - Compute': 50.0} for i in range(1, 60)}
+COMMITMENT = {'years': [{'year': 1, 'start': '2026-03-01', 'end': '2027-02-28', 'minimum_commitment': 30000}]}
+ENGINE = CreditEngine({'Serverless Credit': {'discount': '18%', 'primary': ['Lambda'], 'supporting': [], 'min_spend': 300}})
+BUCKETS = [
+    {'id': 'b1', 'title': 'Serverless Adoption', 'qualifying_services': ['AWS Lambda'], 'spend_threshold': 12000, 'threshold_period': 'annual', 'max_credit_value': 25000},
+    {'id': 'b2', 'title': 'Compute', 'qualifying_services': ['Amazon EC2'], 'spend_threshold': '$1,000', 'threshold_period': 'monthly', 'max_credit_value': '$5,000'},
+    {'id': 'b3', 'title': 'No services', 'qualifying_services': [], 'spend_threshold': 1},
+]
+
+
+def buckets(result):
+    return {b['bucket_id']: b for b in result}
+
+
+def test_bucket_credit_is_capped_at_max_credit_value():
+    rules = what_if.bucket_rules(BUCKETS, COMMITMENT)
+    assert [b['id'] for b, _, _ in rules] == ['b1', 'b2']
+    out = what_if.evaluate(ENGINE, DAILY, COMMITMENT, TODAY, [{'Lambda': 6000}, {'Lambda': 600000}, {'Lambda': 900}], rules)
+    base = buckets(out['baseline']['credit_buckets'])
+    assert base['b1']['status'] == 'partially_qualified' and base['b1']['credit_value'] == 0
+    assert base['b2']['status'] == 'qualified' and base['b2']['credit_value'] == 5000
+    for sc in out['scenarios'][:2]:
+        b1 = buckets(sc['credit_buckets'])['b1']
+        assert b1['status'] == 'qualified'
+        assert b1['credit_value'] == 25000 and b1['credit_change'] == 25000   # never more than the contract credit
+        assert sc['newly_qualified'] == ['Serverless Adoption']
+    below = buckets(out['scenarios'][2]['credit_buckets'])['b1']    # 900/mo x 12 < 12000
+    assert below['period_spend'] == pytest.approx(10800) and below['credit_value'] == 0
+
+
+def test_term_threshold_spans_the_commitment_years():
+    commitment = {'years': [{'year': y, 'start': f'{2026 + y}-01-01', 'end': f'{2026 + y}-12-31'} for y in range(3)]}
+    (_, _, months), = what_if.bucket_rules([{'qualifying_services': ['Lambda'], 'threshold_period': 'term'}], commitment)
+    assert months == pytest.approx(36, abs=0.1)
+
+
+def test_without_buckets_the_generic_offerings_are_used():
+    out = what_if.evaluate(ENGINE, DAILY, COMMITMENT, TODAY, [{'AWS Lambda': 1000}])
+    row = out['scenarios'][0]['credit_couplings'][0]
+    assert 'credit_buckets' not in out['scenarios'][0]
+    assert row['status'] == 'qualified' and row['potential_savings'] == pytest.approx(180)
+
+
+def test_commitment_projection_shifts_with_the_change():
+    commitment = {'years': [{'year': 1, 'start': '2026-09-01', 'end': '2027-08-31', 'minimum_commitment': 30000}]}   # within the history
+    out = what_if.evaluate(ENGINE, DAILY, commitment, TODAY, [{'Lambda': 0}, {'Lambda': 10000}])
+    base = out['baseline']['commitment'][0]
+    cut, grow = (sc['commitment'][0] for sc in out['scenarios'])
+    assert cut['projected'] < base['projected'] < grow['projected']
+    assert grow['status'] in ('on_track', 'met')